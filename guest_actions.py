@@ -1,17 +1,44 @@
 from __future__ import annotations
 
+import asyncio
+import base64
+import csv
+import functools
+import hashlib
+import hmac
+import io
 import json
 import logging
+import time
 import uuid
-from datetime import datetime
-from typing import Any, Dict, List, Literal, Optional
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime, timezone
+from typing import Any, AsyncIterator, Awaitable, Callable, Dict, List, Literal, NamedTuple, Optional, Tuple, Union
 
 import httpx
-from fastapi import APIRouter, HTTPException
-from fastapi.responses import JSONResponse
-from pydantic import BaseModel, Field, validator
+from fastapi import APIRouter, HTTPException, Request, Response
+from fastapi.responses import JSONResponse, StreamingResponse
+from pydantic import BaseModel, Field, ValidationError, validator
+from starlette.requests import ClientDisconnect
+
+try:  # pragma: no cover - optional Stripe SDK
+    import stripe  # type: ignore
+except Exception:  # pragma: no cover - optional
+    stripe = None  # type: ignore
 
 from dependencies import app
+from routers.payment_http import (
+    CRYPTOMUS_API_BASE_URL,
+    PAYPAL_API_BASE_URL,
+    ProviderCircuitOpen,
+    close_provider_http,
+    open_provider_http,
+    provider_breakers,
+    provider_clients,
+    provider_health,
+)
+from routers.payments_dodo import DODO_PRODUCT_TAX_CATEGORY, DODO_PRODUCT_TAX_INCLUSIVE, resolve_dodo_product
 from routers.smm_panel import _load_services_settings, _build_exception_index, _compute_price
 
 # Bot pricing for Botagram
@@ -30,6 +57,70 @@ BOT_PRICES = {
     "Vinted": 19.99,
 }
 
+# Seconds a compiled pricing context is trusted before services settings are re-checked
+PRICING_CACHE_TTL_SECONDS = 60.0
+# Incremental smm_services catalog refresh interval, and the full reload interval that drops deleted rows
+CATALOG_REFRESH_SECONDS = 30.0
+CATALOG_FULL_RELOAD_SECONDS = 900.0
+# Upper bound on how long a newly written smm_service_flags row can go unseen by quotes
+FLAG_REFRESH_SECONDS = 15.0
+# Cap on (key, provider_rate) prices kept per pricing context; least recently used go first
+PRICE_MEMO_MAX_ENTRIES = 250_000
+# Quotes are reused by identical re-quotes and the checkout that follows them
+QUOTE_CACHE_TTL_SECONDS = 30.0
+QUOTE_CACHE_MAX_ENTRIES = 5_000
+# Lifetime of signed quote tokens (QUOTE_TOKEN_SECRET must be set on app.state to issue them)
+QUOTE_TOKEN_TTL_SECONDS = 900
+# Reserved guest orders without a payment reference after this long are treated as interrupted
+CHECKOUT_STALL_SECONDS = 900.0
+CHECKOUT_RECOVERY_INTERVAL_SECONDS = 300.0
+# PayPal access tokens are treated as expired this long before expires_in, and refreshed
+# in the background once they are within the refresh-ahead window of that point
+PAYPAL_TOKEN_EXPIRY_MARGIN_SECONDS = 60.0
+PAYPAL_TOKEN_REFRESH_AHEAD_SECONDS = 300.0
+# Threads available to the synchronous Stripe SDK
+STRIPE_MAX_WORKERS = 8
+# Background payment-link creation (async_payment_link checkouts)
+CHECKOUT_JOB_CONCURRENCY = 8
+CHECKOUT_JOB_MAX_ATTEMPTS = 5
+CHECKOUT_JOB_RETRY_BASE_SECONDS = 5.0
+CHECKOUT_JOB_LEASE_SECONDS = 120.0
+CHECKOUT_JOB_POLL_SECONDS = 2.0
+# Subscription deliveries: length of each renewal period, and scheduler batch/sleep bounds
+SUBSCRIPTION_PERIOD_MINUTES = {
+    "minutely": 1,
+    "hourly": 60,
+    "daily": 60 * 24,
+    "weekly": 60 * 24 * 7,
+    "bi-weekly": 60 * 24 * 14,
+    "monthly": 60 * 24 * 30,
+}
+SUBSCRIPTION_SCHEDULER_BATCH_SIZE = 1_000
+SUBSCRIPTION_SCHEDULER_MAX_SLEEP_SECONDS = 5.0
+# Emitted deliveries are announced on this LISTEN/NOTIFY channel
+SUBSCRIPTION_DELIVERY_CHANNEL = "guest_subscription_delivery"
+# Streaming mass quotes price this many lines per catalog lookup and pool acquisition
+MASS_STREAM_BATCH_SIZE = 500
+MASS_STREAM_MAX_LINES = 100_000
+MASS_STREAM_MAX_LINE_BYTES = 64 * 1024
+# Uploaded mass orders stay orderable this long; bodies above the byte cap are refused
+MASS_UPLOAD_TTL_SECONDS = 86_400
+MASS_UPLOAD_MAX_BYTES = 50 * 1024 * 1024
+MASS_UPLOAD_MAX_REPORTED_ERRORS = 100
+# Status responses for polled tokens are reused for this long unless a payment update invalidates them
+STATUS_CACHE_TTL_SECONDS = 2.0
+STATUS_CACHE_MAX_ENTRIES = 10_000
+# Upper bound on tokens accepted by one bulk status request
+STATUS_BATCH_MAX_TOKENS = 500
+# Order state changes are published on this LISTEN/NOTIFY channel for the status stream
+GUEST_STATUS_CHANNEL = "guest_order_status"
+STATUS_STREAM_KEEPALIVE_SECONDS = 15.0
+# Streams re-read the order this often while the listener connection is down
+STATUS_STREAM_FALLBACK_POLL_SECONDS = 5.0
+STATUS_STREAM_MAX_SUBSCRIBERS = 10_000
+STATUS_LISTENER_HEARTBEAT_SECONDS = 30.0
+STATUS_LISTENER_RETRY_SECONDS = 5.0
+
 logger = logging.getLogger(__name__)
 router = APIRouter(prefix="/api/guest", tags=["guest-actions"])
 
@@ -121,19 +212,42 @@ class GuestQuoteResponse(BaseModel):
     currency: str
     items: List[GuestQuoteLine]
     order_type: str
+    quote_token: Optional[str] = Field(None, description="Signed quote that /checkout accepts instead of re-pricing")
 
 
 class GuestCheckoutRequest(BaseModel):
-    order: GuestQuoteRequest
+    order: Optional[GuestQuoteRequest] = None
     payment_method: Literal["stripe", "paypal", "cryptomus", "wise", "dodo"]
     return_url: Optional[str] = None
     cancel_url: Optional[str] = None
     contact_email: Optional[str] = Field(None, description="Guest contact email for order tracking")
+    quote_token: Optional[str] = Field(None, description="quote_token returned by /quote for this exact order")
+    async_payment_link: bool = Field(
+        False,
+        description="Return immediately and create the payment link in the background (poll /status for it)",
+    )
+    upload_id: Optional[str] = Field(None, description="upload_id returned by /mass/upload, instead of order")
+
+    @validator("upload_id", always=True)
+    def validate_order_source(cls, value, values):
+        if (value is None) == (values.get("order") is None):
+            raise ValueError("exactly one of order or upload_id is required")
+        if value is not None and values.get("quote_token"):
+            raise ValueError("quote_token cannot be combined with upload_id")
+        return value
 
 
-async def _load_pricing() -> Dict[str, Any]:
-    """Load pricing context using the same logic as orders.py for consistency."""
-    settings = await _load_services_settings()
+class GuestStatusBatchRequest(BaseModel):
+    public_tokens: List[str] = Field(..., min_items=1)
+    include_service_payload: bool = True
+
+
+def _settings_fingerprint(settings: Dict[str, Any]) -> str:
+    canonical = json.dumps(settings, sort_keys=True, separators=(",", ":"), default=str)
+    return hashlib.sha256(canonical.encode()).hexdigest()[:16]
+
+
+def _compile_pricing(settings: Dict[str, Any], version: str) -> Dict[str, Any]:
     multiplier = float(settings.get("multiplier", 1.0) or 1.0)
     overrides = settings.get("overrides", {}) or {}
     exceptions = settings.get("exceptions", []) or []
@@ -144,15 +258,214 @@ async def _load_pricing() -> Dict[str, Any]:
         min_price_per_1k = 0.0
     min_price_excluded: List[str] = [str(k) for k in settings.get("min_price_excluded", []) or [] if k]
     return {
+        "version": version,
         "multiplier": multiplier,
         "overrides": overrides,
         "groups_by_key": groups_by_key,
         "min_price_per_1k": min_price_per_1k,
         "min_price_excluded": min_price_excluded,
+        "price_memo": OrderedDict(),
     }
 
 
-async def _resolve_service(conn, service_id: str, panel_id: Optional[int]) -> Optional[Dict[str, Any]]:
+class _PricingCache:
+    """Compiled pricing context shared by quote and checkout.
+
+    Settings are re-read at most once per TTL; the exception index is only
+    rebuilt when the settings fingerprint actually changes.
+    """
+
+    def __init__(self) -> None:
+        self.context: Optional[Dict[str, Any]] = None
+        self.checked_at = 0.0
+        self.lock = asyncio.Lock()
+        self.stats: Dict[str, float] = {
+            "hits": 0,
+            "refreshes": 0,
+            "rebuilds": 0,
+            "last_build_ms": 0.0,
+            "total_build_ms": 0.0,
+        }
+
+    def ttl(self) -> float:
+        return float(getattr(app.state, "PRICING_CACHE_TTL_SECONDS", PRICING_CACHE_TTL_SECONDS))
+
+    def fresh(self) -> bool:
+        return self.context is not None and (time.monotonic() - self.checked_at) < self.ttl()
+
+    async def get(self) -> Dict[str, Any]:
+        if self.fresh():
+            self.stats["hits"] += 1
+            return self.context  # type: ignore[return-value]
+        async with self.lock:
+            if self.fresh():
+                self.stats["hits"] += 1
+                return self.context  # type: ignore[return-value]
+            started = time.perf_counter()
+            settings = await _load_services_settings()
+            version = _settings_fingerprint(settings)
+            self.stats["refreshes"] += 1
+            if self.context is None or self.context["version"] != version:
+                self.context = _compile_pricing(settings, version)
+                elapsed_ms = (time.perf_counter() - started) * 1000
+                self.stats["rebuilds"] += 1
+                self.stats["last_build_ms"] = round(elapsed_ms, 3)
+                self.stats["total_build_ms"] = round(self.stats["total_build_ms"] + elapsed_ms, 3)
+                logger.info(f"Pricing context rebuilt: version={version} in {elapsed_ms:.1f}ms")
+            self.checked_at = time.monotonic()
+            return self.context
+
+    def invalidate(self) -> None:
+        self.checked_at = 0.0
+
+
+_pricing_cache = _PricingCache()
+
+
+async def _load_pricing() -> Dict[str, Any]:
+    """Load pricing context using the same logic as orders.py for consistency."""
+    return await _pricing_cache.get()
+
+
+def invalidate_pricing_cache() -> None:
+    """Force the next quote to re-read services settings (call after settings are saved)."""
+    _pricing_cache.invalidate()
+
+
+def pricing_cache_stats() -> Dict[str, Any]:
+    context = _pricing_cache.context
+    return {
+        **_pricing_cache.stats,
+        "version": context["version"] if context else None,
+        "ttl_seconds": _pricing_cache.ttl(),
+    }
+
+
+class _CatalogEntry(NamedTuple):
+    service_id: str
+    panel_id: int
+    name: Optional[str]
+    rate: float
+    min_quantity: Optional[int]
+    max_quantity: Optional[int]
+    updated_at: Optional[datetime]
+
+
+class _ServiceCatalog:
+    """In-process index of ``smm_services`` used by the quote paths.
+
+    Entries are keyed by ``(panel_id, service_id)``; ``latest`` points each
+    service_id at its most recently updated panel row, which is what a quote
+    without ``panel_id`` resolves to. Refreshes only pull rows changed since the
+    last ``updated_at`` watermark. Incremental refreshes cannot observe deletes,
+    so the whole table is reloaded every ``CATALOG_FULL_RELOAD_SECONDS``.
+    Refreshes run in a background task; until the first load completes every
+    lookup misses and callers query ``smm_services`` directly.
+    """
+
+    def __init__(self) -> None:
+        self.by_key: Dict[Tuple[int, str], _CatalogEntry] = {}
+        self.latest: Dict[str, Tuple[int, str]] = {}
+        self.watermark: Optional[datetime] = None
+        self.reloaded_at = 0.0
+
+    @staticmethod
+    def _upsert(
+        by_key: Dict[Tuple[int, str], _CatalogEntry],
+        latest: Dict[str, Tuple[int, str]],
+        entry: _CatalogEntry,
+    ) -> None:
+        key = (entry.panel_id, entry.service_id)
+        by_key[key] = entry
+        current_key = latest.get(entry.service_id)
+        current = by_key.get(current_key) if current_key else None
+        if (
+            current is None
+            or current_key == key
+            or current.updated_at is None
+            or (entry.updated_at is not None and entry.updated_at >= current.updated_at)
+        ):
+            latest[entry.service_id] = key
+
+    async def refresh(self, conn) -> None:
+        full_reload = self.watermark is None or (
+            time.monotonic() - self.reloaded_at
+        ) >= float(getattr(app.state, "CATALOG_FULL_RELOAD_SECONDS", CATALOG_FULL_RELOAD_SECONDS))
+        if full_reload:
+            rows = await conn.fetch(
+                """
+                SELECT service_id, panel_id, name, rate, min_quantity, max_quantity, updated_at
+                FROM smm_services
+                ORDER BY updated_at
+                """
+            )
+            # Built aside and swapped in, so lookups never see a half-loaded catalog
+            by_key: Dict[Tuple[int, str], _CatalogEntry] = {}
+            latest: Dict[str, Tuple[int, str]] = {}
+        else:
+            # >= so rows sharing the watermark timestamp are not missed; upserts are idempotent
+            rows = await conn.fetch(
+                """
+                SELECT service_id, panel_id, name, rate, min_quantity, max_quantity, updated_at
+                FROM smm_services
+                WHERE updated_at >= $1
+                ORDER BY updated_at
+                """,
+                self.watermark,
+            )
+            by_key, latest = self.by_key, self.latest
+        watermark = self.watermark
+        for row in rows:
+            self._upsert(
+                by_key,
+                latest,
+                _CatalogEntry(
+                    service_id=str(row["service_id"]),
+                    panel_id=int(row["panel_id"] or 0),
+                    name=row["name"],
+                    rate=float(row["rate"] or 0.0),
+                    min_quantity=row["min_quantity"],
+                    max_quantity=row["max_quantity"],
+                    updated_at=row["updated_at"],
+                ),
+            )
+            if row["updated_at"] is not None and (watermark is None or row["updated_at"] > watermark):
+                watermark = row["updated_at"]
+        self.by_key, self.latest, self.watermark = by_key, latest, watermark
+        if full_reload:
+            self.reloaded_at = time.monotonic()
+            logger.info(f"Service catalog loaded: {len(self.by_key)} services")
+
+    async def run(self) -> None:
+        """Keep the catalog fresh in the background; quotes only read it."""
+        while True:
+            try:
+                async with app.state.pool.acquire() as conn:
+                    await self.refresh(conn)
+            except asyncio.CancelledError:
+                raise
+            except Exception as exc:
+                logger.warning(f"Service catalog refresh failed, quotes fall back to direct lookups: {exc}")
+            await asyncio.sleep(float(getattr(app.state, "CATALOG_REFRESH_SECONDS", CATALOG_REFRESH_SECONDS)))
+
+    def lookup(self, service_id: str, panel_id: Optional[int]) -> Optional[Dict[str, Any]]:
+        key = (panel_id, service_id) if panel_id is not None else self.latest.get(service_id)
+        entry = self.by_key.get(key) if key else None
+        return entry._asdict() if entry else None
+
+    def stats(self) -> Dict[str, Any]:
+        return {
+            "services": len(self.by_key),
+            "service_ids": len(self.latest),
+            "loaded": self.watermark is not None,
+            "watermark": self.watermark.isoformat() if self.watermark else None,
+        }
+
+
+_service_catalog = _ServiceCatalog()
+
+
+async def _fetch_service(conn, service_id: str, panel_id: Optional[int]) -> Optional[Dict[str, Any]]:
     params: List[Any] = [service_id]
     clause = ""
     if panel_id is not None:
@@ -173,23 +486,193 @@ async def _resolve_service(conn, service_id: str, panel_id: Optional[int]) -> Op
     return dict(row)
 
 
+async def _resolve_service(conn, service_id: str, panel_id: Optional[int]) -> Optional[Dict[str, Any]]:
+    service = _service_catalog.lookup(service_id, panel_id)
+    if service is not None:
+        return service
+    # Services added since the last refresh are still found, just not from memory
+    return await _fetch_service(conn, service_id, panel_id)
+
+
+def service_catalog_stats() -> Dict[str, Any]:
+    return _service_catalog.stats()
+
+
+class _ServiceFlagIndex:
+    """Active ``smm_service_flags`` held in memory with their expiry.
+
+    Each entry keeps its ``flagged_until`` as an epoch timestamp, so flags lapse
+    on time between refreshes without a query. A background task started with
+    the router reloads the snapshot every ``FLAG_REFRESH_SECONDS``, or as soon
+    as ``invalidate_service_flags()`` is called; quotes only read it. If a
+    reload fails the previous snapshot keeps being served (see
+    ``service_flag_stats()['age_seconds']``); before the first snapshot a quote
+    loads it once itself, and if that fails the quote is refused rather than
+    silently skipping the check.
+    """
+
+    def __init__(self) -> None:
+        self.flags: Dict[Tuple[int, str], Optional[float]] = {}
+        self.loaded = False
+        self.loaded_at = 0.0
+        self.lock = asyncio.Lock()
+        self.wakeup = asyncio.Event()
+
+    async def refresh(self, conn) -> None:
+        rows = await conn.fetch(
+            """
+            SELECT panel_id, service_id, flagged_until
+            FROM smm_service_flags
+            WHERE flagged_until IS NULL OR flagged_until > NOW()
+            """
+        )
+        flags: Dict[Tuple[int, str], Optional[float]] = {}
+        for row in rows:
+            until = row["flagged_until"]
+            if until is not None and until.tzinfo is None:
+                until = until.replace(tzinfo=timezone.utc)
+            flags[(int(row["panel_id"] or 0), str(row["service_id"]))] = until.timestamp() if until else None
+        self.flags = flags
+        self.loaded = True
+        self.loaded_at = time.monotonic()
+
+    async def ensure_loaded(self, conn) -> None:
+        if self.loaded:
+            return
+        async with self.lock:
+            if self.loaded:
+                return
+            try:
+                await self.refresh(conn)
+            except Exception as exc:
+                logger.error(f"Service flag index unavailable: {exc}")
+                raise HTTPException(status_code=503, detail="Service availability check failed")
+
+    async def run(self) -> None:
+        """Keep the snapshot fresh in the background; quotes only read it."""
+        while True:
+            self.wakeup.clear()
+            try:
+                async with app.state.pool.acquire() as conn:
+                    await self.refresh(conn)
+            except asyncio.CancelledError:
+                raise
+            except Exception as exc:
+                logger.warning(f"Service flag refresh failed, serving snapshot from {self.age():.0f}s ago: {exc}")
+            refresh = float(getattr(app.state, "FLAG_REFRESH_SECONDS", FLAG_REFRESH_SECONDS))
+            try:
+                await asyncio.wait_for(self.wakeup.wait(), timeout=refresh)
+            except asyncio.TimeoutError:
+                pass
+
+    def is_flagged(self, panel_id: int, service_id: str) -> bool:
+        key = (panel_id, service_id)
+        if key not in self.flags:
+            return False
+        until = self.flags[key]
+        return until is None or until > time.time()
+
+    def age(self) -> float:
+        return time.monotonic() - self.loaded_at if self.loaded else float("inf")
+
+    def invalidate(self) -> None:
+        self.wakeup.set()
+
+
+_service_flags = _ServiceFlagIndex()
+
+
+def invalidate_service_flags() -> None:
+    """Reload flags now; for the code that writes smm_service_flags, which lives outside this module."""
+    _service_flags.invalidate()
+
+
+def service_flag_stats() -> Dict[str, Any]:
+    now = time.time()
+    return {
+        "loaded": _service_flags.loaded,
+        "age_seconds": round(_service_flags.age(), 3) if _service_flags.loaded else None,
+        "active_flags": sum(1 for until in _service_flags.flags.values() if until is None or until > now),
+    }
+
+
+def price_batch(keys: List[str], rates: List[float], pricing: Dict[str, Any]) -> List[float]:
+    """Price parallel arrays of ``"panel_id:service_id"`` keys and provider rates.
+
+    The pricing rules themselves stay in ``_compute_price`` so quotes, listings
+    and the admin panel can never disagree: each distinct ``(key, rate)`` pair
+    is evaluated once per pricing context and kept in the context's price
+    table, so a warm batch costs one table lookup per distinct pair.
+    """
+    table: "OrderedDict[Tuple[str, float], float]" = pricing["price_memo"]
+    slots: Dict[Tuple[str, float], int] = {}
+    inverse = [slots.setdefault((key, float(rate)), len(slots)) for key, rate in zip(keys, rates)]
+    unique_prices: List[float] = []
+    for pair in slots:
+        price = table.get(pair)
+        if price is None:
+            price = round(
+                float(
+                    _compute_price(
+                        pair[0],
+                        pair[1],
+                        pricing["overrides"],
+                        pricing["multiplier"],
+                        pricing["groups_by_key"],
+                        pricing["min_price_per_1k"],
+                        pricing["min_price_excluded"],
+                    )
+                ),
+                6,
+            )
+            table[pair] = price
+        else:
+            table.move_to_end(pair)
+        unique_prices.append(price)
+    max_entries = int(getattr(app.state, "PRICE_MEMO_MAX_ENTRIES", PRICE_MEMO_MAX_ENTRIES))
+    while len(table) > max_entries:
+        table.popitem(last=False)
+    return [unique_prices[slot] for slot in inverse]
+
+
+def _compute_unit_prices(
+    services: List[Dict[str, Any]],
+    pricing: Dict[str, Any],
+) -> List[float]:
+    """Price many services against one compiled pricing context (see ``price_batch``)."""
+    keys = [f"{service.get('panel_id') or 0}:{service.get('service_id')}" for service in services]
+    rates = [float(service.get("rate") or 0.0) for service in services]
+    return price_batch(keys, rates, pricing)
+
+
+async def catalog_price_listing() -> List[Dict[str, Any]]:
+    """Current guest price of every service in the in-process catalog."""
+    pricing = await _load_pricing()
+    entries = list(_service_catalog.by_key.values())
+    prices = _compute_unit_prices([entry._asdict() for entry in entries], pricing)
+    return [
+        {
+            "service_id": entry.service_id,
+            "panel_id": entry.panel_id,
+            "name": entry.name,
+            "rate": entry.rate,
+            "price": price,
+        }
+        for entry, price in zip(entries, prices)
+    ]
+
+
+async def reprice_catalog() -> int:
+    """Recompile pricing after an admin change and pre-price the whole catalog."""
+    invalidate_pricing_cache()
+    return len(await catalog_price_listing())
+
+
 def _compute_unit_price(
     service: Dict[str, Any],
     pricing: Dict[str, Any],
 ) -> float:
-    panel_id = service.get("panel_id") or 0
-    key = f"{panel_id}:{service.get('service_id')}"
-    provider_rate = float(service.get("rate") or 0.0)
-    price = _compute_price(
-        key,
-        provider_rate,
-        pricing["overrides"],
-        pricing["multiplier"],
-        pricing["groups_by_key"],
-        pricing["min_price_per_1k"],
-        pricing["min_price_excluded"],
-    )
-    return round(float(price), 6)
+    return _compute_unit_prices([service], pricing)[0]
 
 
 async def _quote_single(conn, payload: GuestSingleItem, pricing: Dict[str, Any]) -> GuestQuoteLine:
@@ -206,21 +689,10 @@ async def _quote_single(conn, payload: GuestSingleItem, pricing: Dict[str, Any])
         )
     
     # Original logic for real SMM services
-    try:
-        flag = await conn.fetchrow(
-            """
-            SELECT 1 FROM smm_service_flags 
-            WHERE panel_id = $1 AND service_id = $2 AND (flagged_until IS NULL OR flagged_until > NOW())
-            """,
-            payload.panel_id or 0, payload.service_id,
-        )
-        if flag:
-            raise HTTPException(status_code=400, detail="This service is temporarily unavailable")
-    except HTTPException:
-        raise
-    except Exception:
-        pass  # Continue if flag check fails
-    
+    await _service_flags.ensure_loaded(conn)
+    if _service_flags.is_flagged(payload.panel_id or 0, payload.service_id):
+        raise HTTPException(status_code=400, detail="This service is temporarily unavailable")
+
     service = await _resolve_service(conn, payload.service_id, payload.panel_id)
     if not service:
         raise HTTPException(status_code=404, detail="Service not found")
@@ -234,76 +706,103 @@ async def _quote_single(conn, payload: GuestSingleItem, pricing: Dict[str, Any])
     )
 
 
-async def _quote_mass(conn, payload: List[GuestMassItem], pricing: Dict[str, Any]) -> List[GuestQuoteLine]:
-    lines: List[GuestQuoteLine] = []
-    for item in payload:
-        # Check for flagged services (same logic as orders.py)
-        try:
-            flag = await conn.fetchrow(
-                """
-                SELECT 1 FROM smm_service_flags 
-                WHERE panel_id = $1 AND service_id = $2 AND (flagged_until IS NULL OR flagged_until > NOW())
-                """,
-                item.panel_id or 0, item.service_id,
-            )
-            if flag:
-                raise HTTPException(status_code=400, detail=f"Service {item.service_id} is temporarily unavailable")
-        except HTTPException:
-            raise
-        except Exception:
-            pass  # Continue if flag check fails
-            
-        service = await _resolve_service(conn, item.service_id, item.panel_id)
+async def _resolve_services_batch(conn, pairs: List[tuple]) -> Dict[tuple, Dict[str, Any]]:
+    """Resolve many ``(service_id, panel_id)`` pairs, querying only catalog misses.
+
+    Mirrors ``_resolve_service``: a ``None`` panel_id matches any panel and the
+    most recently updated row wins.
+    """
+    if not pairs:
+        return {}
+    resolved: Dict[tuple, Dict[str, Any]] = {}
+    for pair in pairs:
+        service = _service_catalog.lookup(*pair)
+        if service is not None:
+            resolved[pair] = service
+    pairs = [pair for pair in pairs if pair not in resolved]
+    if not pairs:
+        return resolved
+    rows = await conn.fetch(
+        """
+        SELECT DISTINCT ON (q.ord)
+               q.ord, s.service_id, s.panel_id, s.name, s.rate, s.min_quantity, s.max_quantity, s.description
+        FROM unnest($1::text[], $2::int[]) WITH ORDINALITY AS q(service_id, panel_id, ord)
+        JOIN smm_services s
+          ON s.service_id = q.service_id AND (q.panel_id IS NULL OR s.panel_id = q.panel_id)
+        ORDER BY q.ord, s.updated_at DESC
+        """,
+        [service_id for service_id, _ in pairs],
+        [panel_id for _, panel_id in pairs],
+    )
+    for row in rows:
+        service = dict(row)
+        ordinal = int(service.pop("ord"))
+        resolved[pairs[ordinal - 1]] = service
+    return resolved
+
+
+async def _price_mass_items(
+    conn,
+    items: List[GuestMassItem],
+    pricing: Dict[str, Any],
+) -> List[Union[GuestQuoteLine, HTTPException]]:
+    """Price mass items, returning each line's quote or the error that rejects it."""
+    await _service_flags.ensure_loaded(conn)
+    lookup_pairs = list(dict.fromkeys((item.service_id, item.panel_id) for item in items))
+    services = await _resolve_services_batch(conn, lookup_pairs)
+
+    results: List[Any] = [None] * len(items)
+    priced: List[Tuple[int, GuestMassItem, Dict[str, Any]]] = []
+    for index, item in enumerate(items):
+        if _service_flags.is_flagged(item.panel_id or 0, item.service_id):
+            results[index] = HTTPException(status_code=400, detail=f"Service {item.service_id} is temporarily unavailable")
+            continue
+        service = services.get((item.service_id, item.panel_id))
         if not service:
-            raise HTTPException(status_code=404, detail=f"Service not found for {item.service_id}")
-        unit_price = _compute_unit_price(service, pricing)
-        total = unit_price * item.quantity
-        lines.append(
-            GuestQuoteLine(
-                label=service.get("name") or item.service_id,
-                quantity=item.quantity,
-                unit_price=unit_price,
-                total=round(total, 2),
-            )
+            results[index] = HTTPException(status_code=404, detail=f"Service not found for {item.service_id}")
+            continue
+        priced.append((index, item, service))
+
+    unit_prices = _compute_unit_prices([service for _, _, service in priced], pricing)
+    for (index, item, service), unit_price in zip(priced, unit_prices):
+        results[index] = GuestQuoteLine(
+            label=service.get("name") or item.service_id,
+            quantity=item.quantity,
+            unit_price=unit_price,
+            total=round(unit_price * item.quantity, 2),
         )
+    return results
+
+
+async def _quote_mass(conn, payload: List[GuestMassItem], pricing: Dict[str, Any]) -> List[GuestQuoteLine]:
+    # Resolve services for the whole cart up front, then walk the items in order
+    # so the first failing line raises as before.
+    lines: List[GuestQuoteLine] = []
+    for result in await _price_mass_items(conn, payload, pricing):
+        if isinstance(result, HTTPException):
+            raise result
+        lines.append(result)
     return lines
 
 
+def _subscription_periods(renewal_period: str, duration_minutes: Optional[int]) -> int:
+    """Number of paid deliveries; the scheduler fires exactly this many."""
+    period_minutes = SUBSCRIPTION_PERIOD_MINUTES.get(renewal_period, SUBSCRIPTION_PERIOD_MINUTES["daily"])
+    return max(1, (duration_minutes or 60) // period_minutes)
+
+
 async def _quote_subscription(conn, payload: GuestSubscriptionPayload, pricing: Dict[str, Any]) -> GuestQuoteLine:
     # Check for flagged services (same logic as orders.py)
-    try:
-        flag = await conn.fetchrow(
-            """
-            SELECT 1 FROM smm_service_flags 
-            WHERE panel_id = $1 AND service_id = $2 AND (flagged_until IS NULL OR flagged_until > NOW())
-            """,
-            payload.panel_id or 0, payload.service_id,
-        )
-        if flag:
-            raise HTTPException(status_code=400, detail="This service is temporarily unavailable")
-    except HTTPException:
-        raise
-    except Exception:
-        pass  # Continue if flag check fails
-        
+    await _service_flags.ensure_loaded(conn)
+    if _service_flags.is_flagged(payload.panel_id or 0, payload.service_id):
+        raise HTTPException(status_code=400, detail="This service is temporarily unavailable")
+
     service = await _resolve_service(conn, payload.service_id, payload.panel_id)
     if not service:
         raise HTTPException(status_code=404, detail="Service not found")
     unit_price = _compute_unit_price(service, pricing)
-    duration_minutes = payload.duration_minutes or 60
-    if payload.renewal_period == "minutely":
-        periods = max(1, duration_minutes)
-    elif payload.renewal_period == "hourly":
-        periods = max(1, duration_minutes // 60)
-    elif payload.renewal_period == "weekly":
-        periods = max(1, duration_minutes // (60 * 24 * 7))
-    elif payload.renewal_period == "bi-weekly":
-        periods = max(1, duration_minutes // (60 * 24 * 14))
-    elif payload.renewal_period == "monthly":
-        periods = max(1, duration_minutes // (60 * 24 * 30))
-    else:
-        periods = max(1, duration_minutes // (60 * 24))
-    total_units = payload.quantity_per_period * max(1, periods)
+    periods = _subscription_periods(payload.renewal_period, payload.duration_minutes)
+    total_units = payload.quantity_per_period * periods
     total = unit_price * total_units
     return GuestQuoteLine(
         label=f"Subscription · {service.get('name') or payload.service_id}",
@@ -334,11 +833,121 @@ async def _quote_package(conn, payload: GuestPackagePayload) -> GuestQuoteLine:
     )
 
 
-@router.post("/quote", response_model=GuestQuoteResponse)
-async def guest_quote(request: GuestQuoteRequest):
+class _QuoteCache:
+    """Short-lived LRU of computed quotes.
+
+    Keys combine a canonical hash of the normalized request with the pricing
+    context version, so a settings change never serves a stale price.
+    """
+
+    def __init__(self) -> None:
+        self.entries: "OrderedDict[str, Tuple[float, GuestQuoteResponse]]" = OrderedDict()
+        self.stats: Dict[str, int] = {"hits": 0, "misses": 0, "expired": 0, "evictions": 0}
+
+    def ttl(self) -> float:
+        return float(getattr(app.state, "QUOTE_CACHE_TTL_SECONDS", QUOTE_CACHE_TTL_SECONDS))
+
+    def max_entries(self) -> int:
+        return int(getattr(app.state, "QUOTE_CACHE_MAX_ENTRIES", QUOTE_CACHE_MAX_ENTRIES))
+
+    def get(self, key: str) -> Optional[GuestQuoteResponse]:
+        entry = self.entries.get(key)
+        if entry is None:
+            self.stats["misses"] += 1
+            return None
+        expires_at, quote = entry
+        if expires_at <= time.monotonic():
+            del self.entries[key]
+            self.stats["expired"] += 1
+            self.stats["misses"] += 1
+            return None
+        self.entries.move_to_end(key)
+        self.stats["hits"] += 1
+        return quote
+
+    def put(self, key: str, quote: GuestQuoteResponse) -> None:
+        self.entries[key] = (time.monotonic() + self.ttl(), quote)
+        self.entries.move_to_end(key)
+        while len(self.entries) > self.max_entries():
+            self.entries.popitem(last=False)
+            self.stats["evictions"] += 1
+
+
+_quote_cache = _QuoteCache()
+
+
+def _canonical_quote_request(request: GuestQuoteRequest) -> str:
+    payload = json.loads(request.json())
+    payload["currency"] = _normalize_currency(request.currency)
+    return json.dumps(payload, sort_keys=True, separators=(",", ":"))
+
+
+def _quote_cache_key(request: GuestQuoteRequest, pricing_version: str) -> str:
+    return hashlib.sha256(f"{pricing_version}|{_canonical_quote_request(request)}".encode()).hexdigest()
+
+
+def _quote_token_secret() -> Optional[str]:
+    return getattr(app.state, "QUOTE_TOKEN_SECRET", None)
+
+
+def _sign_quote_token(request: GuestQuoteRequest, quote: GuestQuoteResponse, pricing_version: str) -> Optional[str]:
+    secret = _quote_token_secret()
+    if not secret:
+        return None
+    ttl = int(getattr(app.state, "QUOTE_TOKEN_TTL_SECONDS", QUOTE_TOKEN_TTL_SECONDS))
+    claims = {
+        "v": pricing_version,
+        "exp": int(time.time()) + ttl,
+        "order": hashlib.sha256(_canonical_quote_request(request).encode()).hexdigest(),
+        "quote": quote.dict(exclude={"quote_token"}),
+    }
+    body = base64.urlsafe_b64encode(json.dumps(claims, separators=(",", ":")).encode()).decode().rstrip("=")
+    signature = hmac.new(secret.encode(), body.encode(), hashlib.sha256).hexdigest()
+    return f"{body}.{signature}"
+
+
+def _verify_quote_token(token: str, request: GuestQuoteRequest, pricing_version: str) -> GuestQuoteResponse:
+    """Return the quote carried by ``token`` or raise if it no longer applies to ``request``."""
+    secret = _quote_token_secret()
+    if not secret:
+        raise HTTPException(status_code=400, detail="Quote tokens are not enabled")
+    try:
+        body, signature = token.rsplit(".", 1)
+    except ValueError:
+        raise HTTPException(status_code=400, detail="Invalid quote token")
+    expected = hmac.new(secret.encode(), body.encode(), hashlib.sha256).hexdigest()
+    if not hmac.compare_digest(signature, expected):
+        raise HTTPException(status_code=400, detail="Invalid quote token")
+    try:
+        claims = json.loads(base64.urlsafe_b64decode(body + "=" * (-len(body) % 4)))
+        quote = GuestQuoteResponse(**claims["quote"])
+    except Exception:
+        raise HTTPException(status_code=400, detail="Invalid quote token")
+    if claims.get("order") != hashlib.sha256(_canonical_quote_request(request).encode()).hexdigest():
+        raise HTTPException(status_code=400, detail="Quote token does not match this order")
+    if int(claims.get("exp", 0)) <= time.time() or claims.get("v") != pricing_version:
+        raise HTTPException(status_code=409, detail="Quote expired, please request a new quote")
+    return quote
+
+
+def quote_cache_stats() -> Dict[str, Any]:
+    stats = _quote_cache.stats
+    lookups = stats["hits"] + stats["misses"]
+    return {
+        **stats,
+        "size": len(_quote_cache.entries),
+        "hit_rate": round(stats["hits"] / lookups, 4) if lookups else 0.0,
+    }
+
+
+async def _compute_quote(request: GuestQuoteRequest, pricing: Dict[str, Any]) -> GuestQuoteResponse:
     currency = _normalize_currency(request.currency)
+    cache_key = _quote_cache_key(request, pricing["version"])
+    cached = _quote_cache.get(cache_key)
+    if cached is not None:
+        return cached
+
     async with app.state.pool.acquire() as conn:
-        pricing = await _load_pricing()
         if request.order_type == "single":
             line = await _quote_single(conn, request.single, pricing)  # type: ignore[arg-type]
             items = [line]
@@ -354,7 +963,443 @@ async def guest_quote(request: GuestQuoteRequest):
     amount = round(sum(item.total for item in items), 2)
     if amount <= 0:
         raise HTTPException(status_code=400, detail="Calculated amount invalid")
-    return GuestQuoteResponse(amount=amount, currency=currency, items=items, order_type=request.order_type)
+    quote = GuestQuoteResponse(amount=amount, currency=currency, items=items, order_type=request.order_type)
+    _quote_cache.put(cache_key, quote)
+    return quote
+
+
+@router.post("/quote", response_model=GuestQuoteResponse)
+async def guest_quote(request: GuestQuoteRequest):
+    pricing = await _load_pricing()
+    quote = await _compute_quote(request, pricing)
+    token = _sign_quote_token(request, quote, pricing["version"])
+    if token:
+        return quote.copy(update={"quote_token": token})
+    return quote
+
+
+async def _iter_body_lines(chunks: AsyncIterator[bytes]) -> AsyncIterator[Tuple[int, Optional[str]]]:
+    """Split a streamed body into non-blank ``(line_number, text)``; ``text`` is None for oversized lines."""
+    buffer = b""
+    line_number = 0
+    skipping = False
+    async for chunk in chunks:
+        lines = (buffer + chunk).split(b"\n")
+        buffer = lines.pop()
+        for raw in lines:
+            line_number += 1
+            if skipping:
+                skipping = False
+                yield line_number, None
+            elif raw.strip():
+                yield line_number, raw.decode("utf-8", errors="replace")
+        if len(buffer) > MASS_STREAM_MAX_LINE_BYTES:
+            # Drop the rest of this line instead of buffering it
+            buffer = b""
+            skipping = True
+    if skipping:
+        yield line_number + 1, None
+    elif buffer.strip():
+        yield line_number + 1, buffer.decode("utf-8", errors="replace")
+
+
+def _validation_message(exc: ValidationError) -> str:
+    return "; ".join(f"{'.'.join(map(str, err['loc'])) or 'line'}: {err['msg']}" for err in exc.errors())
+
+
+async def _limit_body(chunks: AsyncIterator[bytes], max_bytes: int) -> AsyncIterator[bytes]:
+    received = 0
+    async for chunk in chunks:
+        received += len(chunk)
+        if received > max_bytes:
+            raise HTTPException(status_code=413, detail=f"Upload larger than {max_bytes} bytes")
+        yield chunk
+
+
+class _BodyStreamingResponse(StreamingResponse):
+    """``StreamingResponse`` whose body is produced while the request body is still read.
+
+    Starlette's ``StreamingResponse`` also waits on ``receive()`` for a
+    disconnect while it streams; on servers older than ASGI spec 2.4 that
+    listener swallows ``http.request`` messages, so a generator reading
+    ``request.stream()`` loses chunks. Here the generator is the only reader
+    and notices a disconnect itself (``ClientDisconnect``).
+    """
+
+    async def __call__(self, scope, receive, send) -> None:
+        await self.stream_response(send)
+        if self.background is not None:
+            await self.background()
+
+
+async def _stream_mass_quote(request: Request, currency: str, pricing: Dict[str, Any]) -> AsyncIterator[str]:
+    running_total = 0.0
+    counts = {"lines": 0, "priced": 0, "errors": 0}
+    batch: List[Tuple[int, GuestMassItem]] = []
+
+    def emit(record: Dict[str, Any]) -> str:
+        return json.dumps(record, separators=(",", ":")) + "\n"
+
+    def error(line_number: int, detail: str) -> str:
+        counts["errors"] += 1
+        return emit({"line": line_number, "error": detail})
+
+    async def flush() -> List[str]:
+        nonlocal running_total
+        try:
+            async with app.state.pool.acquire() as conn:
+                results = await _price_mass_items(conn, [item for _, item in batch], pricing)
+        except HTTPException as exc:
+            # The response has already started, so a batch-wide failure (e.g. the
+            # flag catalog being unavailable) is reported on each of its lines
+            results = [exc] * len(batch)
+        records = []
+        for (line_number, _), result in zip(batch, results):
+            if isinstance(result, HTTPException):
+                records.append(error(line_number, str(result.detail)))
+                continue
+            counts["priced"] += 1
+            running_total = round(running_total + result.total, 2)
+            records.append(emit({"line": line_number, **result.dict(), "running_total": running_total}))
+        batch.clear()
+        return records
+
+    try:
+        async for line_number, text in _iter_body_lines(request.stream()):
+            counts["lines"] += 1
+            if counts["lines"] > MASS_STREAM_MAX_LINES:
+                yield error(line_number, f"Too many lines, at most {MASS_STREAM_MAX_LINES} are quoted")
+                break
+            if text is None:
+                yield error(line_number, f"Line longer than {MASS_STREAM_MAX_LINE_BYTES} bytes")
+                continue
+            try:
+                batch.append((line_number, GuestMassItem.parse_raw(text)))
+            except ValidationError as exc:
+                yield error(line_number, _validation_message(exc))
+                continue
+            if len(batch) >= MASS_STREAM_BATCH_SIZE:
+                for record in await flush():
+                    yield record
+        if batch:
+            for record in await flush():
+                yield record
+    except ClientDisconnect:
+        logger.info("Mass quote stream: client disconnected")
+        return
+    yield emit(
+        {
+            "summary": True,
+            "amount": running_total,
+            "currency": currency,
+            "order_type": "mass",
+            "lines": min(counts["lines"], MASS_STREAM_MAX_LINES),
+            "priced": counts["priced"],
+            "errors": counts["errors"],
+        }
+    )
+
+
+@router.post("/quote/mass/stream")
+async def guest_quote_mass_stream(request: Request, currency: Optional[str] = None):
+    """Quote a mass order sent as NDJSON, one ``GuestMassItem`` per line.
+
+    Lines are validated as they arrive and priced in batches, and answered as
+    NDJSON while the upload is still running: one record per input line (the
+    priced line with a running total, or an inline error) followed by a
+    summary record, so large carts run in bounded memory.
+    """
+    currency = _normalize_currency(currency)
+    pricing = await _load_pricing()
+    return _BodyStreamingResponse(
+        _stream_mass_quote(request, currency, pricing),
+        media_type="application/x-ndjson",
+    )
+
+
+async def _ensure_mass_upload_tables() -> None:
+    async with app.state.pool.acquire() as conn:
+        await conn.execute(
+            """
+            CREATE TABLE IF NOT EXISTS guest_mass_uploads (
+                upload_id UUID PRIMARY KEY,
+                currency TEXT NOT NULL,
+                pricing_version TEXT NOT NULL,
+                status TEXT NOT NULL DEFAULT 'receiving',
+                line_count INTEGER NOT NULL DEFAULT 0,
+                error_count INTEGER NOT NULL DEFAULT 0,
+                total_amount NUMERIC(12, 2) NOT NULL DEFAULT 0,
+                errors JSONB,
+                guest_order_id BIGINT,
+                created_at TIMESTAMPTZ NOT NULL DEFAULT NOW(),
+                expires_at TIMESTAMPTZ NOT NULL
+            )
+            """
+        )
+        await conn.execute(
+            """
+            CREATE TABLE IF NOT EXISTS guest_mass_upload_items (
+                upload_id UUID NOT NULL REFERENCES guest_mass_uploads (upload_id) ON DELETE CASCADE,
+                line_no INTEGER NOT NULL,
+                service_id TEXT NOT NULL,
+                panel_id INTEGER,
+                quantity INTEGER NOT NULL,
+                target_url TEXT NOT NULL,
+                comments TEXT,
+                label TEXT NOT NULL,
+                unit_price DOUBLE PRECISION NOT NULL,
+                total NUMERIC(12, 2) NOT NULL,
+                PRIMARY KEY (upload_id, line_no)
+            )
+            """
+        )
+
+
+async def purge_expired_mass_uploads() -> int:
+    """Drop uploads past their expiry; ordered ones were already copied into guest_orders."""
+    async with app.state.pool.acquire() as conn:
+        result = await conn.execute("DELETE FROM guest_mass_uploads WHERE expires_at < NOW()")
+    return int(result.split()[-1]) if result else 0
+
+
+_MASS_UPLOAD_COLUMNS = ("service_id", "panel_id", "quantity", "target_url", "comments")
+
+
+async def _iter_csv_rows(lines: AsyncIterator[Tuple[int, Optional[str]]]) -> AsyncIterator[Tuple[int, Any]]:
+    """Yield ``(line_number, dict | error string)`` for CSV rows after the header.
+
+    Quoted fields may span lines (``comments`` is newline separated); a
+    record is complete once its quotes are balanced.
+    """
+    header: Optional[List[str]] = None
+    pending = ""
+    start = 0
+    async for line_number, text in lines:
+        if text is None:
+            pending = ""
+            yield line_number, f"Line longer than {MASS_STREAM_MAX_LINE_BYTES} bytes"
+            continue
+        if not pending:
+            start = line_number
+        pending = f"{pending}\n{text}" if pending else text
+        if pending.count('"') % 2:
+            if len(pending) > MASS_STREAM_MAX_LINE_BYTES:
+                pending = ""
+                yield start, f"Record longer than {MASS_STREAM_MAX_LINE_BYTES} bytes"
+            continue
+        values = next(csv.reader(io.StringIO(pending)), [])
+        pending = ""
+        if header is None:
+            header = [value.strip().lower() for value in values]
+            missing = [column for column in ("service_id", "quantity", "target_url") if column not in header]
+            if missing:
+                raise HTTPException(status_code=400, detail=f"CSV header is missing {', '.join(missing)}")
+            continue
+        row = dict(zip(header, values))
+        yield start, {column: (row.get(column) or None) for column in _MASS_UPLOAD_COLUMNS}
+    if pending:
+        yield start, "Unterminated quoted field"
+
+
+async def _iter_ndjson_rows(lines: AsyncIterator[Tuple[int, Optional[str]]]) -> AsyncIterator[Tuple[int, Any]]:
+    async for line_number, text in lines:
+        if text is None:
+            yield line_number, f"Line longer than {MASS_STREAM_MAX_LINE_BYTES} bytes"
+            continue
+        try:
+            yield line_number, json.loads(text)
+        except ValueError:
+            yield line_number, "Invalid JSON"
+
+
+async def _store_mass_upload_batch(
+    upload_id: uuid.UUID,
+    batch: List[Tuple[int, GuestMassItem]],
+    pricing: Dict[str, Any],
+    errors: List[Dict[str, Any]],
+) -> Tuple[float, int]:
+    """Price one batch and append its valid rows; returns the batch total and its error count."""
+    async with app.state.pool.acquire() as conn:
+        results = await _price_mass_items(conn, [item for _, item in batch], pricing)
+        records = []
+        failed = 0
+        for (line_number, item), result in zip(batch, results):
+            if isinstance(result, HTTPException):
+                failed += 1
+                if len(errors) < MASS_UPLOAD_MAX_REPORTED_ERRORS:
+                    errors.append({"line": line_number, "error": str(result.detail)})
+                continue
+            records.append(
+                (
+                    upload_id,
+                    line_number,
+                    item.service_id,
+                    item.panel_id,
+                    item.quantity,
+                    item.target_url,
+                    item.comments,
+                    result.label,
+                    result.unit_price,
+                    result.total,
+                )
+            )
+        if records:
+            await conn.copy_records_to_table(
+                "guest_mass_upload_items",
+                records=records,
+                columns=[
+                    "upload_id",
+                    "line_no",
+                    "service_id",
+                    "panel_id",
+                    "quantity",
+                    "target_url",
+                    "comments",
+                    "label",
+                    "unit_price",
+                    "total",
+                ],
+            )
+    return sum(record[-1] for record in records), failed
+
+
+@router.post("/mass/upload")
+async def guest_mass_upload(
+    request: Request,
+    format: Optional[Literal["csv", "ndjson"]] = None,
+    currency: Optional[str] = None,
+):
+    """Upload a mass order as CSV (with a header row) or NDJSON, one ``GuestMassItem`` per row.
+
+    Rows are parsed and validated as the body streams in, priced in batches
+    and stored, so memory stays bounded whatever the row count. An upload
+    whose rows are all valid can be paid through ``/checkout`` with the
+    returned ``upload_id``.
+    """
+    if format is None:
+        format = "csv" if "csv" in request.headers.get("content-type", "") else "ndjson"
+    currency = _normalize_currency(currency)
+    pricing = await _load_pricing()
+    upload_id = uuid.uuid4()
+    ttl = float(getattr(app.state, "MASS_UPLOAD_TTL_SECONDS", MASS_UPLOAD_TTL_SECONDS))
+    max_bytes = int(getattr(app.state, "MASS_UPLOAD_MAX_BYTES", MASS_UPLOAD_MAX_BYTES))
+    async with app.state.pool.acquire() as conn:
+        await conn.execute(
+            """
+            INSERT INTO guest_mass_uploads (upload_id, currency, pricing_version, expires_at)
+            VALUES ($1, $2, $3, NOW() + make_interval(secs => $4))
+            """,
+            upload_id,
+            currency,
+            pricing["version"],
+            ttl,
+        )
+
+    lines = _iter_body_lines(_limit_body(request.stream(), max_bytes))
+    rows = _iter_csv_rows(lines) if format == "csv" else _iter_ndjson_rows(lines)
+    errors: List[Dict[str, Any]] = []
+    error_count = 0
+    line_count = 0
+    amount = 0.0
+    batch: List[Tuple[int, GuestMassItem]] = []
+    try:
+        async for line_number, row in rows:
+            line_count += 1
+            if line_count > MASS_STREAM_MAX_LINES:
+                raise HTTPException(status_code=413, detail=f"At most {MASS_STREAM_MAX_LINES} rows per upload")
+            if isinstance(row, str):
+                message = row
+            else:
+                try:
+                    batch.append((line_number, GuestMassItem.parse_obj(row)))
+                    message = None
+                except ValidationError as exc:
+                    message = _validation_message(exc)
+            if message is not None:
+                error_count += 1
+                if len(errors) < MASS_UPLOAD_MAX_REPORTED_ERRORS:
+                    errors.append({"line": line_number, "error": message})
+                continue
+            if len(batch) >= MASS_STREAM_BATCH_SIZE:
+                total, failed = await _store_mass_upload_batch(upload_id, batch, pricing, errors)
+                amount, error_count = amount + total, error_count + failed
+                batch.clear()
+        if batch:
+            total, failed = await _store_mass_upload_batch(upload_id, batch, pricing, errors)
+            amount, error_count = amount + total, error_count + failed
+    except BaseException:
+        try:
+            async with app.state.pool.acquire() as conn:
+                await conn.execute("DELETE FROM guest_mass_uploads WHERE upload_id = $1", upload_id)
+        except Exception as exc:
+            # Left as 'receiving'; the expiry sweep removes it
+            logger.error(f"Failed to discard mass upload {upload_id}: {exc}")
+        raise
+
+    amount = round(amount, 2)
+    status = "ready" if line_count and not error_count and amount > 0 else "rejected"
+    async with app.state.pool.acquire() as conn:
+        expires_at = await conn.fetchval(
+            """
+            UPDATE guest_mass_uploads
+            SET status = $2, line_count = $3, error_count = $4, total_amount = $5, errors = $6
+            WHERE upload_id = $1
+            RETURNING expires_at
+            """,
+            upload_id,
+            status,
+            line_count,
+            error_count,
+            amount,
+            json.dumps(errors),
+        )
+    return {
+        "upload_id": str(upload_id),
+        "status": status,
+        "amount": amount,
+        "currency": currency,
+        "lines": line_count,
+        "error_count": error_count,
+        "errors": errors,
+        "expires_at": expires_at.isoformat() if expires_at else None,
+    }
+
+
+async def _load_mass_upload_quote(upload_id: str, pricing_version: str) -> GuestQuoteResponse:
+    try:
+        key = uuid.UUID(upload_id)
+    except ValueError:
+        raise HTTPException(status_code=400, detail="Invalid upload_id")
+    async with app.state.pool.acquire() as conn:
+        upload = await conn.fetchrow(
+            """
+            SELECT status, currency, pricing_version, line_count, total_amount, expires_at > NOW() AS live
+            FROM guest_mass_uploads
+            WHERE upload_id = $1
+            """,
+            key,
+        )
+    if not upload:
+        raise HTTPException(status_code=404, detail="Upload not found")
+    if upload["status"] != "ready":
+        raise HTTPException(status_code=409, detail=f"Upload is {upload['status']}")
+    if not upload["live"] or upload["pricing_version"] != pricing_version:
+        raise HTTPException(status_code=409, detail="Upload expired, please upload the order again")
+    amount = float(upload["total_amount"])
+    lines = int(upload["line_count"])
+    return GuestQuoteResponse(
+        amount=amount,
+        currency=upload["currency"],
+        items=[
+            GuestQuoteLine(
+                label=f"Mass order upload ({lines} lines)",
+                quantity=lines,
+                unit_price=round(amount / lines, 6),
+                total=amount,
+            )
+        ],
+        order_type="mass",
+    )
 
 
 async def _ensure_guest_user(conn) -> int:
@@ -396,17 +1441,82 @@ async def _create_guest_order_record(conn, checkout: GuestCheckoutRequest, quote
     return {"guest_order_id": int(row["guest_order_id"]), "public_token": str(row["public_token"]) }
 
 
-async def _record_receipt(conn, guest_order_id: int, provider: str, amount: float, currency: str, reference: Optional[str], payload: Dict[str, Any]) -> None:
-    await conn.execute(
+async def _create_upload_order_record(conn, checkout: GuestCheckoutRequest, quote: GuestQuoteResponse) -> Dict[str, Any]:
+    """Turn a ready mass upload into a guest order; its items are copied inside the database."""
+    guest_user_id = await _ensure_guest_user(conn)
+    row = await conn.fetchrow(
         """
-        INSERT INTO guest_payment_receipts (guest_order_id, provider, provider_reference, amount, currency, status, payload)
-        VALUES ($1, $2, $3, $4, $5, 'pending', $6)
+        WITH claimed AS (
+            UPDATE guest_mass_uploads
+            SET status = 'ordered'
+            WHERE upload_id = $1 AND status = 'ready' AND expires_at > NOW()
+            RETURNING upload_id, currency
+        )
+        INSERT INTO guest_orders (
+            public_token,
+            user_id,
+            service_payload,
+            payment_method,
+            payment_state,
+            order_state,
+            total_amount,
+            currency
+        )
+        SELECT $2, $3,
+               json_build_object(
+                   'order_type', 'mass',
+                   'currency', c.currency,
+                   'single', NULL,
+                   'mass', (
+                       SELECT json_agg(
+                           json_build_object(
+                               'service_id', i.service_id,
+                               'panel_id', i.panel_id,
+                               'quantity', i.quantity,
+                               'target_url', i.target_url,
+                               'comments', i.comments
+                           )
+                           ORDER BY i.line_no
+                       )
+                       FROM guest_mass_upload_items i
+                       WHERE i.upload_id = c.upload_id
+                   ),
+                   'subscription', NULL,
+                   'package', NULL,
+                   'upload_id', c.upload_id
+               )::jsonb,
+               $4, 'pending', 'pending', $5, $6
+        FROM claimed c
+        RETURNING guest_order_id, public_token
         """,
-        guest_order_id,
-        provider,
-        reference,
-        amount,
-        currency,
+        uuid.UUID(checkout.upload_id),
+        uuid.uuid4(),
+        guest_user_id,
+        checkout.payment_method,
+        quote.amount,
+        quote.currency,
+    )
+    if not row:
+        raise HTTPException(status_code=409, detail="Upload was already ordered or has expired")
+    await conn.execute(
+        "UPDATE guest_mass_uploads SET guest_order_id = $2 WHERE upload_id = $1",
+        uuid.UUID(checkout.upload_id),
+        row["guest_order_id"],
+    )
+    return {"guest_order_id": int(row["guest_order_id"]), "public_token": str(row["public_token"]) }
+
+
+async def _record_receipt(conn, guest_order_id: int, provider: str, amount: float, currency: str, reference: Optional[str], payload: Dict[str, Any]) -> None:
+    await conn.execute(
+        """
+        INSERT INTO guest_payment_receipts (guest_order_id, provider, provider_reference, amount, currency, status, payload)
+        VALUES ($1, $2, $3, $4, $5, 'pending', $6)
+        """,
+        guest_order_id,
+        provider,
+        reference,
+        amount,
+        currency,
         json.dumps(payload),
     )
 
@@ -427,30 +1537,45 @@ async def _create_cryptomus_invoice(amount: float, order_ref: str, return_url: O
 
     payload_b64 = base64.b64encode(json.dumps(payload, separators=(",", ":")).encode()).decode()
     signature = hashlib.md5((payload_b64 + key).encode()).hexdigest()
-    async with httpx.AsyncClient(timeout=15.0) as client:
-        resp = await client.post(
-            "https://api.cryptomus.com/v1/payment",
-            headers={"merchant": merchant, "sign": signature, "Content-Type": "application/json"},
-            json=payload,
-        )
-        resp.raise_for_status()
-        data = resp.json().get("result") or {}
-        return {
-            "payment_url": data.get("url") or data.get("link"),
-            "payload": data,
-        }
+    client = provider_clients.get("cryptomus", CRYPTOMUS_API_BASE_URL)
+    resp = await client.post(
+        "/v1/payment",
+        headers={"merchant": merchant, "sign": signature, "Content-Type": "application/json"},
+        json=payload,
+    )
+    resp.raise_for_status()
+    data = resp.json().get("result") or {}
+    return {
+        "payment_url": data.get("url") or data.get("link"),
+        "payload": data,
+    }
+
+
+_stripe_executor: Optional[ThreadPoolExecutor] = None
+_stripe_api_key: Optional[str] = None
+
+
+def _configure_stripe() -> None:
+    """Resolve the Stripe key and worker pool once instead of on every checkout."""
+    global _stripe_executor, _stripe_api_key
+    _stripe_api_key = getattr(app.state, "STRIPE_SECRET_KEY", None) or getattr(app.state, "stripe_secret_key", None)
+    if _stripe_executor is None:
+        workers = int(getattr(app.state, "STRIPE_MAX_WORKERS", STRIPE_MAX_WORKERS))
+        _stripe_executor = ThreadPoolExecutor(max_workers=workers, thread_name_prefix="stripe")
 
 
 async def _create_stripe_checkout(amount: float, currency: str, public_token: str, return_url: Optional[str], cancel_url: Optional[str]) -> Dict[str, Any]:
-    try:
-        import stripe  # type: ignore
-    except Exception:
+    if stripe is None:
         raise HTTPException(status_code=503, detail="Stripe SDK not installed on server")
-    secret_key = getattr(app.state, "STRIPE_SECRET_KEY", None) or getattr(app.state, "stripe_secret_key", None)
-    if not secret_key:
+    if _stripe_executor is None or not _stripe_api_key:
+        _configure_stripe()
+    if not _stripe_api_key:
         raise HTTPException(status_code=503, detail="Stripe is not configured")
-    stripe.api_key = secret_key
-    session = stripe.checkout.Session.create(
+    # The SDK is synchronous: run it on a bounded pool so the event loop keeps serving,
+    # and pass the key per call rather than mutating the global stripe.api_key.
+    create_session = functools.partial(
+        stripe.checkout.Session.create,
+        api_key=_stripe_api_key,
         mode="payment",
         payment_method_types=["card"],
         line_items=[
@@ -467,6 +1592,19 @@ async def _create_stripe_checkout(amount: float, currency: str, public_token: st
         cancel_url=cancel_url or "https://paiement.botagram.fr/order-cancelled",
         metadata={"guest_token": public_token},
     )
+    # Stripe does not go through the shared httpx clients, so feed its breaker directly
+    breaker = provider_breakers.get("stripe")
+    breaker.before_call()
+    started = time.monotonic()
+    try:
+        session = await asyncio.get_running_loop().run_in_executor(_stripe_executor, create_session)
+    except asyncio.CancelledError:
+        breaker.release()
+        raise
+    except Exception:
+        breaker.record(False, time.monotonic() - started)
+        raise
+    breaker.record(True, time.monotonic() - started)
     return {"payment_url": session.get("url"), "session_id": session.get("id")}
 
 
@@ -492,92 +1630,152 @@ async def _create_wise_payment_link(amount: float, currency: str, public_token:
         }
         
         # Use Wise API to create a transfer (simplified for guest checkout)
-        async with httpx.AsyncClient(timeout=30.0) as client:
-            headers = {
-                "Authorization": f"Bearer {WiseSettings.api_key()}",
-                "Content-Type": "application/json",
-                "Accept": "application/json",
-            }
-            
-            # For guest checkout, we'll create a simplified transfer
-            # Note: This is a simplified implementation - in production you'd need proper recipient setup
-            transfer_data = {
-                "type": "BALANCE",
-                "profile": WiseSettings.profile_id(),
-                "targetAccount": "balance",  # Simplified for guest checkout
-                "quoteUuid": f"guest_{public_token}",
-                "customerTransactionId": f"guest_{public_token}",
-                "details": {
-                    "reference": wise_payload["description"],
-                    "transferPurpose": "OTHER",
-                    "sourceOfFunds": "OTHER"
-                },
-                "metadata": wise_payload["metadata"]
-            }
-            
-            # Create transfer
-            transfer_resp = await client.post(
-                f"{WiseSettings.api_base_url()}/v1/transfers",
-                headers=headers,
-                json=transfer_data,
-            )
-            transfer_resp.raise_for_status()
-            transfer_data = transfer_resp.json()
-            
-            # For guest checkout, return a payment URL that redirects to Wise's payment page
-            payment_url = f"https://wise.com/pay/{transfer_data.get('id', public_token)}"
-            
-            return {
-                "payment_url": payment_url,
-                "transfer_id": transfer_data.get("id"),
-                "transfer": transfer_data,
-            }
-            
+        client = provider_clients.get("wise", WiseSettings.api_base_url())
+        headers = {
+            "Authorization": f"Bearer {WiseSettings.api_key()}",
+            "Content-Type": "application/json",
+            "Accept": "application/json",
+        }
+        
+        # For guest checkout, we'll create a simplified transfer
+        # Note: This is a simplified implementation - in production you'd need proper recipient setup
+        transfer_data = {
+            "type": "BALANCE",
+            "profile": WiseSettings.profile_id(),
+            "targetAccount": "balance",  # Simplified for guest checkout
+            "quoteUuid": f"guest_{public_token}",
+            "customerTransactionId": f"guest_{public_token}",
+            "details": {
+                "reference": wise_payload["description"],
+                "transferPurpose": "OTHER",
+                "sourceOfFunds": "OTHER"
+            },
+            "metadata": wise_payload["metadata"]
+        }
+        
+        # Create transfer
+        transfer_resp = await client.post(
+            "/v1/transfers",
+            headers=headers,
+            json=transfer_data,
+        )
+        transfer_resp.raise_for_status()
+        transfer_data = transfer_resp.json()
+        
+        # For guest checkout, return a payment URL that redirects to Wise's payment page
+        payment_url = f"https://wise.com/pay/{transfer_data.get('id', public_token)}"
+        
+        return {
+            "payment_url": payment_url,
+            "transfer_id": transfer_data.get("id"),
+            "transfer": transfer_data,
+        }
+        
     except Exception as e:
         logger.error(f"Wise payment creation failed: {e}")
         raise HTTPException(status_code=503, detail="Wise payment service is temporarily unavailable")
 
 
+class _PayPalTokenCache:
+    """Shared PayPal OAuth access token.
+
+    The token is reused until ``PAYPAL_TOKEN_EXPIRY_MARGIN_SECONDS`` before its
+    ``expires_in``; inside ``PAYPAL_TOKEN_REFRESH_AHEAD_SECONDS`` of that point a
+    background refresh is started while callers keep using the current token.
+    Concurrent callers always share a single in-flight token request.
+    """
+
+    def __init__(self) -> None:
+        self.client_id: Optional[str] = None
+        self.token: Optional[str] = None
+        self.expires_at = 0.0
+        self.inflight: Optional[asyncio.Task] = None
+
+    async def _fetch(self, client_id: str, secret: str) -> str:
+        client = provider_clients.get("paypal", PAYPAL_API_BASE_URL)
+        token_resp = await client.post(
+            "/v1/oauth2/token",
+            auth=httpx.BasicAuth(client_id, secret),
+            data={"grant_type": "client_credentials"},
+        )
+        token_resp.raise_for_status()
+        data = token_resp.json()
+        self.client_id = client_id
+        self.token = data.get("access_token")
+        expires_in = float(data.get("expires_in") or 0)
+        self.expires_at = time.monotonic() + max(0.0, expires_in - PAYPAL_TOKEN_EXPIRY_MARGIN_SECONDS)
+        return self.token  # type: ignore[return-value]
+
+    def _refresh(self, client_id: str, secret: str) -> asyncio.Task:
+        if self.inflight is None or self.inflight.done():
+            self.inflight = asyncio.create_task(self._fetch(client_id, secret))
+            self.inflight.add_done_callback(self._log_failure)
+        return self.inflight
+
+    @staticmethod
+    def _log_failure(task: asyncio.Task) -> None:
+        if not task.cancelled() and task.exception() is not None:
+            logger.warning(f"PayPal access token refresh failed: {task.exception()}")
+
+    async def get(self, client_id: str, secret: str) -> str:
+        remaining = self.expires_at - time.monotonic()
+        if self.token and self.client_id == client_id and remaining > 0:
+            if remaining < PAYPAL_TOKEN_REFRESH_AHEAD_SECONDS:
+                self._refresh(client_id, secret)
+            return self.token
+        return await asyncio.shield(self._refresh(client_id, secret))
+
+    def invalidate(self, token: Optional[str]) -> None:
+        if token is not None and token == self.token:
+            self.token = None
+            self.expires_at = 0.0
+
+
+_paypal_tokens = _PayPalTokenCache()
+
+
 async def _create_paypal_order(amount: float, currency: str, public_token: str, return_url: Optional[str], cancel_url: Optional[str]) -> Dict[str, Any]:
     client_id = getattr(app.state, "PAYPAL_CLIENT_ID", None)
     secret = getattr(app.state, "PAYPAL_SECRET", None)
     if not client_id or not secret:
         raise HTTPException(status_code=503, detail="PayPal is not configured")
-    auth = httpx.BasicAuth(client_id, secret)
-    async with httpx.AsyncClient(timeout=15.0) as client:
-        token_resp = await client.post(
-            "https://api-m.paypal.com/v1/oauth2/token",
-            auth=auth,
-            data={"grant_type": "client_credentials"},
-        )
-        token_resp.raise_for_status()
-        access_token = token_resp.json().get("access_token")
-        order_payload = {
-            "intent": "CAPTURE",
-            "purchase_units": [
-                {
-                    "amount": {
-                        "currency_code": currency,
-                        "value": f"{amount:.2f}",
-                    },
-                    "custom_id": public_token,
-                }
-            ],
-            "application_context": {
-                "brand_name": "Botagram",
-                "return_url": return_url or "https://paiement.botagram.fr/order-success",
-                "cancel_url": cancel_url or "https://paiement.botagram.fr/order-cancelled",
-            },
-        }
+    client = provider_clients.get("paypal", PAYPAL_API_BASE_URL)
+    order_payload = {
+        "intent": "CAPTURE",
+        "purchase_units": [
+            {
+                "amount": {
+                    "currency_code": currency,
+                    "value": f"{amount:.2f}",
+                },
+                "custom_id": public_token,
+            }
+        ],
+        "application_context": {
+            "brand_name": "Botagram",
+            "return_url": return_url or "https://paiement.botagram.fr/order-success",
+            "cancel_url": cancel_url or "https://paiement.botagram.fr/order-cancelled",
+        },
+    }
+    access_token = await _paypal_tokens.get(client_id, secret)
+    order_resp = await client.post(
+        "/v2/checkout/orders",
+        headers={"Authorization": f"Bearer {access_token}", "Content-Type": "application/json"},
+        json=order_payload,
+    )
+    if order_resp.status_code == 401:
+        # Token revoked or rotated on PayPal's side: drop it and retry once with a fresh one
+        _paypal_tokens.invalidate(access_token)
+        access_token = await _paypal_tokens.get(client_id, secret)
         order_resp = await client.post(
-            "https://api-m.paypal.com/v2/checkout/orders",
+            "/v2/checkout/orders",
             headers={"Authorization": f"Bearer {access_token}", "Content-Type": "application/json"},
             json=order_payload,
         )
-        order_resp.raise_for_status()
-        data = order_resp.json()
-        approval_url = next((link["href"] for link in data.get("links", []) if link.get("rel") == "approve"), None)
-        return {"payment_url": approval_url, "order_id": data.get("id")}
+    order_resp.raise_for_status()
+    data = order_resp.json()
+    approval_url = next((link["href"] for link in data.get("links", []) if link.get("rel") == "approve"), None)
+    return {"payment_url": approval_url, "order_id": data.get("id")}
 
 
 async def _create_dodo_product_for_guest(
@@ -631,9 +1829,9 @@ async def _create_dodo_product_for_guest(
             "type": "one_time_price",
             "pay_what_you_want": False,  # Fixed price
             "purchasing_power_parity": False,  # Required field - no PPP for guest orders
-            "tax_inclusive": True,
+            "tax_inclusive": DODO_PRODUCT_TAX_INCLUSIVE,
         },
-        "tax_category": "digital_products",
+        "tax_category": DODO_PRODUCT_TAX_CATEGORY,
         "metadata": {
             "created_for": "guest_order",
             "amount": str(amount),
@@ -652,19 +1850,19 @@ async def _create_dodo_product_for_guest(
     }
     
     try:
-        async with httpx.AsyncClient(base_url=base_url, timeout=timeout) as client:
-            response = await client.post("/products", json=product_payload, headers=headers)
-            response.raise_for_status()
-            product_data = response.json()
-            
-            product_id = product_data.get("product_id")
-            if not product_id:
-                logger.error(f"Dodo product creation response missing product_id: {product_data}")
-                raise HTTPException(status_code=500, detail="Failed to create product - no product_id returned")
-            
-            logger.info(f"✓ Created Dodo product for guest: {product_id} - {name} - ${amount} {currency}")
-            return product_id
-            
+        client = provider_clients.get("dodo", base_url)
+        response = await client.post("/products", json=product_payload, headers=headers, timeout=timeout)
+        response.raise_for_status()
+        product_data = response.json()
+        
+        product_id = product_data.get("product_id")
+        if not product_id:
+            logger.error(f"Dodo product creation response missing product_id: {product_data}")
+            raise HTTPException(status_code=500, detail="Failed to create product - no product_id returned")
+        
+        logger.info(f"✓ Created Dodo product for guest: {product_id} - {name} - ${amount} {currency}")
+        return product_id
+        
     except httpx.HTTPStatusError as exc:
         logger.error(f"Dodo guest product creation API error: {exc.response.text}")
         raise HTTPException(status_code=503, detail="Failed to create payment product")
@@ -693,10 +1891,14 @@ async def _create_dodo_checkout(
     
     if not api_key:
         raise HTTPException(status_code=503, detail="Dodo Payments is not configured")
+    if provider_health.is_down("dodo"):
+        raise HTTPException(status_code=503, detail="Failed to reach Dodo Payments")
     
-    # Build order description from order details
+    # Build order description from order details. The product name must not carry
+    # the public token so identical price points reuse one Dodo product.
     description = f"Digital Software - {public_token}"
-    product_name = f"Digital Software - {public_token[:12]}"
+    product_name = "Digital Software"
+    product_description: Optional[str] = None
     
     if order_details.get("order_type") == "single":
         single = order_details.get("single", {})
@@ -707,21 +1909,28 @@ async def _create_dodo_checkout(
         if service_id in BOT_PRICES:
             description = f"Bot d'automatisation {service_id} - Fonctionnalités avancées"
             product_name = f"{service_id} Bot - Automatisation"
+            product_description = description
         else:
             description = f"Digital Software - {quantity} items"
             product_name = f"Digital Software - {quantity} items"
+            product_description = description
     
-    # Step 1: Create a unique product for this guest order with fixed price
+    # Step 1: Reuse (or create once) the product for this price point
     # Convert EUR to USD for Dodo (which only supports USD and INR)
     dodo_currency = "USD" if currency.upper() == "EUR" else currency
     dodo_amount = amount * 1.08 if currency.upper() == "EUR" else amount
     
     try:
-        product_id = await _create_dodo_product_for_guest(
-            amount=dodo_amount,
-            currency=dodo_currency,
-            name=product_name,
-            description=description,
+        product_id = await resolve_dodo_product(
+            dodo_amount,
+            dodo_currency,
+            product_name,
+            lambda: _create_dodo_product_for_guest(
+                amount=dodo_amount,
+                currency=dodo_currency,
+                name=product_name,
+                description=product_description,
+            ),
         )
     except HTTPException:
         raise
@@ -777,27 +1986,27 @@ async def _create_dodo_checkout(
     }
     
     try:
-        async with httpx.AsyncClient(base_url=base_url, timeout=timeout) as client:
-            response = await client.post("/checkouts", json=checkout_payload, headers=headers)
-            response.raise_for_status()
-            data = response.json()
-            
-            # Extract checkout URL from response
-            checkout_url = (
-                data.get("checkout_url") or 
-                data.get("url") or 
-                data.get("link") or 
-                data.get("payment_url") or
-                (data.get("data", {}).get("checkout_url") if isinstance(data.get("data"), dict) else None)
-            )
-            
-            return {
-                "payment_url": checkout_url,
-                "session_id": data.get("session_id"),
-                "checkout_id": data.get("id") or data.get("checkout_id"),
-                "product_id": product_id,
-                "dodo_response": data,
-            }
+        client = provider_clients.get("dodo", base_url)
+        response = await client.post("/checkouts", json=checkout_payload, headers=headers, timeout=timeout)
+        response.raise_for_status()
+        data = response.json()
+        
+        # Extract checkout URL from response
+        checkout_url = (
+            data.get("checkout_url") or 
+            data.get("url") or 
+            data.get("link") or 
+            data.get("payment_url") or
+            (data.get("data", {}).get("checkout_url") if isinstance(data.get("data"), dict) else None)
+        )
+        
+        return {
+            "payment_url": checkout_url,
+            "session_id": data.get("session_id"),
+            "checkout_id": data.get("id") or data.get("checkout_id"),
+            "product_id": product_id,
+            "dodo_response": data,
+        }
     except httpx.HTTPStatusError as exc:
         logger.error(f"Dodo Payments API error: {exc.response.text}")
         raise HTTPException(status_code=503, detail="Dodo Payments service error")
@@ -806,89 +2015,692 @@ async def _create_dodo_checkout(
         raise HTTPException(status_code=503, detail="Failed to reach Dodo Payments")
 
 
-@router.post("/checkout")
-async def guest_checkout(request: GuestCheckoutRequest):
-    quote = await guest_quote(request.order)  # type: ignore[arg-type]
+async def _create_provider_payment(
+    request: GuestCheckoutRequest,
+    quote: GuestQuoteResponse,
+    public_token: str,
+    order_ref: str,
+) -> Dict[str, Any]:
+    try:
+        return await _dispatch_provider_payment(request, quote, public_token, order_ref)
+    except ProviderCircuitOpen:
+        logger.warning(f"Guest checkout, {request.payment_method} circuit open, failing fast : order_ref: {order_ref}")
+        raise HTTPException(status_code=503, detail="Payment provider is temporarily unavailable")
+
+
+async def _dispatch_provider_payment(
+    request: GuestCheckoutRequest,
+    quote: GuestQuoteResponse,
+    public_token: str,
+    order_ref: str,
+) -> Dict[str, Any]:
+    if request.payment_method == "cryptomus":
+        logger.info(f"Guest checkout, using Cryptomus, order_ref: {order_ref} : payment_method: {request.payment_method}")
+        return await _create_cryptomus_invoice(quote.amount, order_ref, request.return_url)
+    if request.payment_method == "dodo":
+        logger.info(f"Guest checkout, using Dodo Payments, order_ref: {order_ref} : payment_method: {request.payment_method}")
+        return await _create_dodo_checkout(
+            quote.amount,
+            quote.currency,
+            public_token,
+            request.order.dict() if request.order else {"order_type": "mass"},
+            request.contact_email,
+            request.return_url,
+            request.cancel_url,
+        )
+    if request.payment_method == "stripe":
+        logger.info(f"Guest checkout, using Stripe, order_ref: {order_ref} : payment_method: {request.payment_method}")
+        return await _create_stripe_checkout(
+            quote.amount,
+            quote.currency.lower(),
+            public_token,
+            request.return_url,
+            request.cancel_url,
+        )
+    if request.payment_method == "wise":
+        logger.info(f"Guest checkout, using Wise, order_ref: {order_ref} : payment_method: {request.payment_method}")
+        return await _create_wise_payment_link(
+            quote.amount,
+            quote.currency,
+            public_token,
+            request.return_url,
+            request.cancel_url,
+        )
+    logger.info(f"Guest checkout, using PayPal, order_ref: {order_ref} : payment_method: {request.payment_method}")
+    return await _create_paypal_order(
+        quote.amount,
+        quote.currency,
+        public_token,
+        request.return_url,
+        request.cancel_url,
+    )
+
+
+def _provider_reference(provider_payload: Dict[str, Any], order_ref: str) -> str:
+    return (
+        provider_payload.get("session_id")
+        or provider_payload.get("order_id")
+        or provider_payload.get("transfer_id")
+        or provider_payload.get("payment_link_id")
+        or provider_payload.get("payment_url")
+        or order_ref
+    )
+
+
+async def _finalize_guest_checkout(
+    guest_order_id: int,
+    payment_method: str,
+    quote: GuestQuoteResponse,
+    provider_reference: str,
+    merged_payload: Dict[str, Any],
+    complete_job: bool = False,
+) -> None:
+    public_token = None
     async with app.state.pool.acquire() as conn:
         async with conn.transaction():
-            logger.info(f"Guest checkout, recording the order")
-            record = await _create_guest_order_record(conn, request, quote)
-            logger.info(f"Guest checkout, recording the receipt")
-            order_ref = f"{record['public_token']}|{uuid.uuid4().hex}"
-            logger.info(f"Guest checkout, creating the payment receipt")
-            if quote.currency.lower() != "usd" and request.payment_method == "cryptomus":
-                logger.info(f"Guest checkout, currency is not USD, using Cryptomus, order_ref: {order_ref} : payment_method: {request.payment_method}")
-                raise HTTPException(status_code=400, detail="Cryptomus currently supports USD only")
-            if request.payment_method == "cryptomus":
-                logger.info(f"Guest checkout, using Cryptomus, order_ref: {order_ref} : payment_method: {request.payment_method}")
-                provider_payload = await _create_cryptomus_invoice(quote.amount, order_ref, request.return_url)
-            elif request.payment_method == "dodo":
-                logger.info(f"Guest checkout, using Dodo Payments, order_ref: {order_ref} : payment_method: {request.payment_method}")
-                provider_payload = await _create_dodo_checkout(
-                    quote.amount,
-                    quote.currency,
-                    record["public_token"],
-                    request.order.dict(),
-                    request.contact_email,
-                    request.return_url,
-                    request.cancel_url,
-                )
-            elif request.payment_method == "stripe":
-                logger.info(f"Guest checkout, using Stripe, order_ref: {order_ref} : payment_method: {request.payment_method}")
-                provider_payload = await _create_stripe_checkout(
-                    quote.amount,
-                    quote.currency.lower(),
-                    record["public_token"],
-                    request.return_url,
-                    request.cancel_url,
-                )
-            elif request.payment_method == "wise":
-                logger.info(f"Guest checkout, using Wise, order_ref: {order_ref} : payment_method: {request.payment_method}")
-                provider_payload = await _create_wise_payment_link(
-                    quote.amount,
-                    quote.currency,
-                    record["public_token"],
-                    request.return_url,
-                    request.cancel_url,
-                )
-            else:
-                logger.info(f"Guest checkout, using PayPal, order_ref: {order_ref} : payment_method: {request.payment_method}")
-                provider_payload = await _create_paypal_order(
-                    quote.amount,
-                    quote.currency,
-                    record["public_token"],
-                    request.return_url,
-                    request.cancel_url,
-                )
-            logger.info(f"Guest checkout, payment receipt created : PROVIDER PAYLOAD: {provider_payload}")
-            provider_reference = (
-                provider_payload.get("session_id")
-                or provider_payload.get("order_id")
-                or provider_payload.get("transfer_id")
-                or provider_payload.get("payment_link_id")
-                or provider_payload.get("payment_url")
-                or order_ref
-            )
-            logger.info(f"Guest checkout, payment receipt created : PROVIDER REFERENCE: {provider_reference}")
-            merged_payload = dict(provider_payload)
-            merged_payload.setdefault("order_reference", order_ref)
-            logger.info(f"Guest checkout, payment receipt created : MERGED PAYLOAD: {merged_payload}")
             await conn.execute(
-                "UPDATE guest_orders SET payment_reference = $1 WHERE guest_order_id = $2",
+                "UPDATE guest_orders SET payment_reference = $1, updated_at = NOW() WHERE guest_order_id = $2",
                 provider_reference,
-                record["guest_order_id"],
+                guest_order_id,
             )
             logger.info(f"Guest checkout, recording the receipt")
             await _record_receipt(
                 conn,
-                record["guest_order_id"],
-                request.payment_method,
+                guest_order_id,
+                payment_method,
                 quote.amount,
                 quote.currency,
                 provider_reference,
                 merged_payload,
             )
-            logger.info(f"Guest checkout, receipt recorded")
+            if complete_job:
+                await conn.execute(
+                    """
+                    UPDATE guest_checkout_jobs
+                    SET status = 'done', result = $2, last_error = NULL, locked_until = NULL, updated_at = NOW()
+                    WHERE guest_order_id = $1
+                    """,
+                    guest_order_id,
+                    json.dumps({**merged_payload, "order_reference": provider_reference}),
+                )
+                # Status streams hear about the link when the transaction commits
+                public_token = await conn.fetchval(
+                    """
+                    SELECT public_token,
+                           pg_notify(
+                               $2,
+                               json_build_object(
+                                   'public_token', public_token,
+                                   'payment_state', payment_state,
+                                   'order_state', order_state,
+                                   'updated_at', updated_at,
+                                   'payment_link', $3::json
+                               )::text
+                           )
+                    FROM guest_orders
+                    WHERE guest_order_id = $1
+                    """,
+                    guest_order_id,
+                    GUEST_STATUS_CHANNEL,
+                    json.dumps(
+                        {
+                            "status": "ready",
+                            "payment_url": merged_payload.get("payment_url"),
+                            "order_reference": provider_reference,
+                        }
+                    ),
+                )
+    if public_token is not None:
+        _status_cache.invalidate(str(public_token))
+
+
+async def _abandon_guest_order(guest_order_id: int, reason: str) -> None:
+    """Close a reserved order whose payment link could not be created."""
+    try:
+        async with app.state.pool.acquire() as conn:
+            public_token = await conn.fetchval(
+                """
+                WITH updated AS (
+                    UPDATE guest_orders
+                    SET payment_state = 'failed',
+                        order_state = 'cancelled',
+                        payment_details = $2,
+                        updated_at = NOW()
+                    WHERE guest_order_id = $1 AND payment_reference IS NULL AND payment_state = 'pending'
+                    RETURNING public_token, payment_state, order_state, updated_at
+                )
+                SELECT public_token, pg_notify($3, row_to_json(updated)::text) FROM updated
+                """,
+                guest_order_id,
+                json.dumps({"failure_reason": reason, "failed_at": datetime.utcnow().isoformat()}),
+                GUEST_STATUS_CHANNEL,
+            )
+        if public_token is not None:
+            _status_cache.invalidate(str(public_token))
+    except Exception as exc:
+        logger.error(f"Failed to release guest order {guest_order_id}: {exc}")
+
+
+async def recover_stalled_guest_checkouts() -> int:
+    """Cancel reserved orders that never received a payment reference.
+
+    A worker that dies between the reservation and finalization phases of
+    ``guest_checkout`` leaves a pending row without ``payment_reference``; no
+    payment link was handed to the guest for it, so it is safe to cancel.
+    """
+    stall_seconds = float(getattr(app.state, "CHECKOUT_STALL_SECONDS", CHECKOUT_STALL_SECONDS))
+    async with app.state.pool.acquire() as conn:
+        rows = await conn.fetch(
+            """
+            WITH updated AS (
+                UPDATE guest_orders
+                SET payment_state = 'failed',
+                    order_state = 'cancelled',
+                    payment_details = $2,
+                    updated_at = NOW()
+                WHERE payment_reference IS NULL
+                  AND payment_state = 'pending'
+                  AND created_at < NOW() - make_interval(secs => $1)
+                  AND NOT EXISTS (
+                      SELECT 1 FROM guest_checkout_jobs j WHERE j.guest_order_id = guest_orders.guest_order_id
+                  )
+                RETURNING public_token, payment_state, order_state, updated_at
+            )
+            SELECT public_token, pg_notify($3, row_to_json(updated)::text) FROM updated
+            """,
+            stall_seconds,
+            json.dumps({"failure_reason": "checkout_interrupted", "failed_at": datetime.utcnow().isoformat()}),
+            GUEST_STATUS_CHANNEL,
+        )
+    for row in rows:
+        _status_cache.invalidate(str(row["public_token"]))
+    recovered = len(rows)
+    if recovered:
+        logger.warning(f"Cancelled {recovered} guest orders stuck between checkout phases")
+    return recovered
+
+
+async def _checkout_recovery_loop() -> None:
+    while True:
+        try:
+            await recover_stalled_guest_checkouts()
+            await purge_expired_mass_uploads()
+        except asyncio.CancelledError:
+            raise
+        except Exception as exc:
+            logger.error(f"Guest checkout recovery sweep failed: {exc}")
+        await asyncio.sleep(float(getattr(app.state, "CHECKOUT_RECOVERY_INTERVAL_SECONDS", CHECKOUT_RECOVERY_INTERVAL_SECONDS)))
+
+
+async def _ensure_checkout_jobs_table() -> None:
+    async with app.state.pool.acquire() as conn:
+        await conn.execute(
+            """
+            CREATE TABLE IF NOT EXISTS guest_checkout_jobs (
+                guest_order_id BIGINT PRIMARY KEY REFERENCES guest_orders (guest_order_id) ON DELETE CASCADE,
+                public_token TEXT NOT NULL,
+                order_reference TEXT NOT NULL,
+                request JSONB NOT NULL,
+                quote JSONB NOT NULL,
+                status TEXT NOT NULL DEFAULT 'pending',
+                attempts INTEGER NOT NULL DEFAULT 0,
+                next_attempt_at TIMESTAMPTZ NOT NULL DEFAULT NOW(),
+                locked_until TIMESTAMPTZ,
+                last_error TEXT,
+                result JSONB,
+                created_at TIMESTAMPTZ NOT NULL DEFAULT NOW(),
+                updated_at TIMESTAMPTZ NOT NULL DEFAULT NOW()
+            )
+            """
+        )
+        await conn.execute(
+            """
+            CREATE INDEX IF NOT EXISTS guest_checkout_jobs_due_idx
+            ON guest_checkout_jobs (next_attempt_at) WHERE status IN ('pending', 'running')
+            """
+        )
+
+
+class _CheckoutJobWorker:
+    """Creates payment links for ``async_payment_link`` checkouts.
+
+    Jobs live in ``guest_checkout_jobs``. A claimed job holds a lease
+    (``locked_until``); if the process dies the lease expires and another
+    worker picks the job up again, so nothing is lost across restarts. Failed
+    attempts are retried with exponential backoff up to
+    ``CHECKOUT_JOB_MAX_ATTEMPTS``, after which the order is cancelled.
+    """
+
+    def __init__(self) -> None:
+        self.wakeup = asyncio.Event()
+        self.running: set = set()
+
+    def concurrency(self) -> int:
+        return int(getattr(app.state, "CHECKOUT_JOB_CONCURRENCY", CHECKOUT_JOB_CONCURRENCY))
+
+    async def claim(self, limit: int) -> List[Any]:
+        async with app.state.pool.acquire() as conn:
+            return await conn.fetch(
+                """
+                UPDATE guest_checkout_jobs
+                SET status = 'running',
+                    attempts = attempts + 1,
+                    locked_until = NOW() + make_interval(secs => $2),
+                    updated_at = NOW()
+                WHERE guest_order_id IN (
+                    SELECT guest_order_id FROM guest_checkout_jobs
+                    WHERE (status = 'pending' AND next_attempt_at <= NOW())
+                       OR (status = 'running' AND locked_until < NOW())
+                    ORDER BY next_attempt_at
+                    LIMIT $1
+                    FOR UPDATE SKIP LOCKED
+                )
+                RETURNING guest_order_id, public_token, order_reference, request, quote, attempts
+                """,
+                limit,
+                float(getattr(app.state, "CHECKOUT_JOB_LEASE_SECONDS", CHECKOUT_JOB_LEASE_SECONDS)),
+            )
+
+    async def process(self, job: Any) -> None:
+        guest_order_id = int(job["guest_order_id"])
+        try:
+            # Parsed inside the try so a malformed row still counts as a failed attempt
+            request = GuestCheckoutRequest.parse_raw(job["request"])
+            quote = GuestQuoteResponse.parse_raw(job["quote"])
+            provider_payload = await _create_provider_payment(request, quote, job["public_token"], job["order_reference"])
+            provider_reference = _provider_reference(provider_payload, job["order_reference"])
+            merged_payload = dict(provider_payload)
+            merged_payload.setdefault("order_reference", job["order_reference"])
+            await _finalize_guest_checkout(
+                guest_order_id,
+                request.payment_method,
+                quote,
+                provider_reference,
+                merged_payload,
+                complete_job=True,
+            )
+            logger.info(f"Guest checkout job {guest_order_id}: payment link ready")
+        except Exception as exc:
+            await self.fail(guest_order_id, int(job["attempts"]), exc)
+
+    async def fail(self, guest_order_id: int, attempts: int, exc: Exception) -> None:
+        error = str(exc.detail) if isinstance(exc, HTTPException) else str(exc)
+        final = attempts >= int(getattr(app.state, "CHECKOUT_JOB_MAX_ATTEMPTS", CHECKOUT_JOB_MAX_ATTEMPTS))
+        retry_base = float(getattr(app.state, "CHECKOUT_JOB_RETRY_BASE_SECONDS", CHECKOUT_JOB_RETRY_BASE_SECONDS))
+        delay = retry_base * (2 ** max(0, attempts - 1))
+        logger.warning(f"Guest checkout job {guest_order_id} attempt {attempts} failed: {error}")
+        try:
+            async with app.state.pool.acquire() as conn:
+                await conn.execute(
+                    """
+                    UPDATE guest_checkout_jobs
+                    SET status = $2,
+                        next_attempt_at = NOW() + make_interval(secs => $3),
+                        locked_until = NULL,
+                        last_error = $4,
+                        updated_at = NOW()
+                    WHERE guest_order_id = $1
+                    """,
+                    guest_order_id,
+                    "failed" if final else "pending",
+                    delay,
+                    error,
+                )
+        except Exception as db_exc:
+            # The lease expires on its own, so the job will simply be retried later
+            logger.error(f"Failed to record checkout job {guest_order_id} failure: {db_exc}")
+            return
+        if final:
+            await _abandon_guest_order(guest_order_id, error)
+
+    async def run(self) -> None:
+        while True:
+            try:
+                free = self.concurrency() - len(self.running)
+                jobs = await self.claim(free) if free > 0 else []
+            except asyncio.CancelledError:
+                raise
+            except Exception as exc:
+                logger.error(f"Guest checkout job claim failed: {exc}")
+                jobs = []
+            for job in jobs:
+                task = asyncio.create_task(self.process(job))
+                self.running.add(task)
+                task.add_done_callback(self._done)
+            if jobs and len(self.running) < self.concurrency():
+                continue
+            self.wakeup.clear()
+            try:
+                poll_seconds = float(getattr(app.state, "CHECKOUT_JOB_POLL_SECONDS", CHECKOUT_JOB_POLL_SECONDS))
+                await asyncio.wait_for(self.wakeup.wait(), timeout=poll_seconds)
+            except asyncio.TimeoutError:
+                pass
+
+    def _done(self, task: asyncio.Task) -> None:
+        self.running.discard(task)
+        self.wakeup.set()
+
+    async def stop(self) -> None:
+        # In-flight jobs are cancelled; their leases expire and they are retried after restart
+        for task in list(self.running):
+            task.cancel()
+        await asyncio.gather(*self.running, return_exceptions=True)
+
+
+_checkout_jobs = _CheckoutJobWorker()
+
+
+async def _enqueue_checkout_job(
+    conn,
+    record: Dict[str, Any],
+    request: GuestCheckoutRequest,
+    quote: GuestQuoteResponse,
+    order_ref: str,
+) -> None:
+    await conn.execute(
+        """
+        INSERT INTO guest_checkout_jobs (guest_order_id, public_token, order_reference, request, quote)
+        VALUES ($1, $2, $3, $4, $5)
+        """,
+        record["guest_order_id"],
+        record["public_token"],
+        order_ref,
+        request.json(),
+        quote.json(),
+    )
+
+
+async def _ensure_subscription_tables() -> None:
+    async with app.state.pool.acquire() as conn:
+        await conn.execute(
+            """
+            CREATE TABLE IF NOT EXISTS guest_subscription_schedules (
+                guest_order_id BIGINT PRIMARY KEY REFERENCES guest_orders (guest_order_id) ON DELETE CASCADE,
+                service_id TEXT NOT NULL,
+                panel_id INTEGER,
+                quantity_per_period INTEGER NOT NULL,
+                target_url TEXT NOT NULL,
+                renewal_period TEXT NOT NULL,
+                period_seconds INTEGER NOT NULL,
+                total_periods INTEGER NOT NULL,
+                deliveries INTEGER NOT NULL DEFAULT 0,
+                next_run_at TIMESTAMPTZ NOT NULL,
+                status TEXT NOT NULL DEFAULT 'active',
+                created_at TIMESTAMPTZ NOT NULL DEFAULT NOW(),
+                updated_at TIMESTAMPTZ NOT NULL DEFAULT NOW()
+            )
+            """
+        )
+        await conn.execute(
+            """
+            CREATE INDEX IF NOT EXISTS guest_subscription_schedules_due_idx
+            ON guest_subscription_schedules (next_run_at) WHERE status = 'active'
+            """
+        )
+        await conn.execute(
+            """
+            CREATE TABLE IF NOT EXISTS guest_subscription_deliveries (
+                guest_order_id BIGINT NOT NULL REFERENCES guest_subscription_schedules (guest_order_id) ON DELETE CASCADE,
+                period_index INTEGER NOT NULL,
+                quantity INTEGER NOT NULL,
+                scheduled_for TIMESTAMPTZ NOT NULL,
+                status TEXT NOT NULL DEFAULT 'pending',
+                created_at TIMESTAMPTZ NOT NULL DEFAULT NOW(),
+                PRIMARY KEY (guest_order_id, period_index)
+            )
+            """
+        )
+        await conn.execute(
+            """
+            CREATE INDEX IF NOT EXISTS guest_subscription_deliveries_pending_idx
+            ON guest_subscription_deliveries (scheduled_for) WHERE status = 'pending'
+            """
+        )
+
+
+async def _schedule_subscription(conn, guest_order_id: int) -> None:
+    """Start the delivery schedule of a paid subscription order; a no-op for other orders."""
+    try:
+        # Savepoint: a scheduling problem must not undo the payment itself
+        async with conn.transaction():
+            status = await conn.execute(
+                """
+                INSERT INTO guest_subscription_schedules (
+                    guest_order_id, service_id, panel_id, quantity_per_period, target_url,
+                    renewal_period, period_seconds, total_periods, next_run_at
+                )
+                SELECT o.guest_order_id,
+                       p.sp->>'service_id',
+                       (p.sp->>'panel_id')::int,
+                       (p.sp->>'quantity_per_period')::int,
+                       p.sp->>'target_url',
+                       p.sp->>'renewal_period',
+                       m.minutes * 60,
+                       GREATEST(1, COALESCE((p.sp->>'duration_minutes')::int, 60) / m.minutes),
+                       NOW()
+                FROM guest_orders o
+                CROSS JOIN LATERAL (SELECT o.service_payload->'subscription' AS sp) p
+                CROSS JOIN LATERAL (SELECT ($2::jsonb->>(p.sp->>'renewal_period'))::int AS minutes) m
+                WHERE o.guest_order_id = $1
+                  AND o.service_payload->>'order_type' = 'subscription'
+                  AND m.minutes IS NOT NULL
+                ON CONFLICT (guest_order_id) DO NOTHING
+                """,
+                guest_order_id,
+                json.dumps(SUBSCRIPTION_PERIOD_MINUTES),
+            )
+    except Exception as exc:
+        logger.error(f"Failed to schedule subscription deliveries for guest order {guest_order_id}: {exc}")
+        return
+    if status and status.endswith(" 1"):
+        _subscription_scheduler.wakeup.set()
+
+
+class _SubscriptionScheduler:
+    """Emits one ``guest_subscription_deliveries`` row per due subscription period.
+
+    The partial index on ``next_run_at`` is the priority queue: each pass
+    pops only the due schedules, in due order, and then sleeps until the
+    earliest remaining ``next_run_at``, so the cost follows the number of
+    deliveries rather than the number of active subscriptions. A pass
+    advances each schedule and inserts its delivery in one statement, and
+    deliveries are keyed by ``(guest_order_id, period_index)``, so a restart
+    or a second instance can never fire a period twice. Periods missed
+    while no scheduler ran are emitted on the next passes.
+    """
+
+    def __init__(self) -> None:
+        self.wakeup = asyncio.Event()
+        self.stats: Dict[str, int] = {"passes": 0, "emitted": 0}
+
+    def batch_size(self) -> int:
+        return int(getattr(app.state, "SUBSCRIPTION_SCHEDULER_BATCH_SIZE", SUBSCRIPTION_SCHEDULER_BATCH_SIZE))
+
+    async def emit_due(self) -> Tuple[int, Optional[float]]:
+        """Emit one batch of due deliveries; returns how many, and seconds until the next due one."""
+        async with app.state.pool.acquire() as conn:
+            async with conn.transaction():
+                emitted = await conn.fetch(
+                    """
+                    WITH due AS (
+                        SELECT guest_order_id FROM guest_subscription_schedules
+                        WHERE status = 'active' AND next_run_at <= NOW()
+                        ORDER BY next_run_at
+                        LIMIT $1
+                        FOR UPDATE SKIP LOCKED
+                    ), advanced AS (
+                        UPDATE guest_subscription_schedules s
+                        SET deliveries = s.deliveries + 1,
+                            next_run_at = s.next_run_at + make_interval(secs => s.period_seconds),
+                            status = CASE WHEN s.deliveries + 1 >= s.total_periods THEN 'finished' ELSE 'active' END,
+                            updated_at = NOW()
+                        FROM due
+                        WHERE s.guest_order_id = due.guest_order_id
+                        RETURNING s.guest_order_id, s.deliveries AS period_index, s.quantity_per_period,
+                                  s.next_run_at - make_interval(secs => s.period_seconds) AS scheduled_for
+                    )
+                    INSERT INTO guest_subscription_deliveries (guest_order_id, period_index, quantity, scheduled_for)
+                    SELECT guest_order_id, period_index, quantity_per_period, scheduled_for FROM advanced
+                    ON CONFLICT DO NOTHING
+                    RETURNING guest_order_id
+                    """,
+                    self.batch_size(),
+                )
+                if emitted:
+                    await conn.execute(
+                        "SELECT pg_notify($1, $2)",
+                        SUBSCRIPTION_DELIVERY_CHANNEL,
+                        json.dumps({"deliveries": len(emitted)}),
+                    )
+            next_in = await conn.fetchval(
+                """
+                SELECT EXTRACT(EPOCH FROM MIN(next_run_at) - NOW())
+                FROM guest_subscription_schedules
+                WHERE status = 'active'
+                """
+            )
+        self.stats["passes"] += 1
+        self.stats["emitted"] += len(emitted)
+        return len(emitted), (float(next_in) if next_in is not None else None)
+
+    async def run(self) -> None:
+        while True:
+            max_sleep = float(
+                getattr(app.state, "SUBSCRIPTION_SCHEDULER_MAX_SLEEP_SECONDS", SUBSCRIPTION_SCHEDULER_MAX_SLEEP_SECONDS)
+            )
+            delay = max_sleep
+            try:
+                emitted, next_in = await self.emit_due()
+                if emitted >= self.batch_size():
+                    continue
+                if next_in is not None:
+                    delay = min(max_sleep, max(0.0, next_in))
+            except asyncio.CancelledError:
+                raise
+            except Exception as exc:
+                logger.error(f"Subscription delivery pass failed: {exc}")
+            self.wakeup.clear()
+            try:
+                await asyncio.wait_for(self.wakeup.wait(), timeout=delay)
+            except asyncio.TimeoutError:
+                pass
+
+
+_subscription_scheduler = _SubscriptionScheduler()
+
+
+def subscription_scheduler_stats() -> Dict[str, Any]:
+    return dict(_subscription_scheduler.stats)
+
+
+_background_tasks: List[asyncio.Task] = []
+
+
+@router.on_event("startup")
+async def _start_guest_background_tasks() -> None:
+    open_provider_http(
+        {
+            "cryptomus": (CRYPTOMUS_API_BASE_URL, "/"),
+            "paypal": (PAYPAL_API_BASE_URL, "/"),
+            "dodo": (getattr(app.state, "DODO_API_BASE_URL", None) or "https://test.dodopayments.com", "/health"),
+        }
+    )
+    if stripe is not None:
+        _configure_stripe()
+    try:
+        await _ensure_checkout_jobs_table()
+    except Exception as exc:
+        logger.error(f"Could not prepare guest_checkout_jobs: {exc}")
+    try:
+        await _ensure_mass_upload_tables()
+    except Exception as exc:
+        logger.error(f"Could not prepare guest_mass_uploads: {exc}")
+    try:
+        await _ensure_subscription_tables()
+    except Exception as exc:
+        logger.error(f"Could not prepare guest_subscription_schedules: {exc}")
+    _background_tasks.append(asyncio.create_task(_service_catalog.run()))
+    _background_tasks.append(asyncio.create_task(_service_flags.run()))
+    _background_tasks.append(asyncio.create_task(_checkout_recovery_loop()))
+    _background_tasks.append(asyncio.create_task(_checkout_jobs.run()))
+    _background_tasks.append(asyncio.create_task(_status_hub.run()))
+    _background_tasks.append(asyncio.create_task(_subscription_scheduler.run()))
+
+
+@router.on_event("shutdown")
+async def _stop_guest_background_tasks() -> None:
+    global _stripe_executor
+    for task in _background_tasks:
+        task.cancel()
+    await asyncio.gather(*_background_tasks, return_exceptions=True)
+    _background_tasks.clear()
+    await _checkout_jobs.stop()
+    await close_provider_http()
+    if _stripe_executor is not None:
+        _stripe_executor.shutdown(wait=False)
+        _stripe_executor = None
+
+
+@router.post("/checkout")
+async def guest_checkout(request: GuestCheckoutRequest):
+    pricing = await _load_pricing()
+    if request.upload_id:
+        quote = await _load_mass_upload_quote(request.upload_id, pricing["version"])
+    elif request.quote_token:
+        quote = _verify_quote_token(request.quote_token, request.order, pricing["version"])
+    else:
+        quote = await _compute_quote(request.order, pricing)  # type: ignore[arg-type]
+    if quote.currency.lower() != "usd" and request.payment_method == "cryptomus":
+        logger.info(f"Guest checkout, currency is not USD, using Cryptomus : payment_method: {request.payment_method}")
+        raise HTTPException(status_code=400, detail="Cryptomus currently supports USD only")
+
+    # Phase 1: reserve the order. No pool connection is held during the provider round trip.
+    async with app.state.pool.acquire() as conn:
+        async with conn.transaction():
+            logger.info(f"Guest checkout, recording the order")
+            if request.upload_id:
+                record = await _create_upload_order_record(conn, request, quote)
+            else:
+                record = await _create_guest_order_record(conn, request, quote)
+            order_ref = f"{record['public_token']}|{uuid.uuid4().hex}"
+            if request.async_payment_link:
+                await _enqueue_checkout_job(conn, record, request, quote, order_ref)
+
+    if request.async_payment_link:
+        _checkout_jobs.wakeup.set()
+        logger.info(f"Guest checkout, payment link queued for {record['public_token']}")
+        return {
+            "public_token": record["public_token"],
+            "payment_method": request.payment_method,
+            "amount": quote.amount,
+            "currency": quote.currency,
+            "status": "awaiting_payment_link",
+            "payment": None,
+        }
+
+    logger.info(f"Guest checkout, creating the payment receipt")
+    try:
+        provider_payload = await _create_provider_payment(request, quote, record["public_token"], order_ref)
+    except Exception as exc:
+        detail = exc.detail if isinstance(exc, HTTPException) else str(exc)
+        await _abandon_guest_order(record["guest_order_id"], str(detail))
+        raise
+    logger.info(f"Guest checkout, payment receipt created : PROVIDER PAYLOAD: {provider_payload}")
+    provider_reference = _provider_reference(provider_payload, order_ref)
+    logger.info(f"Guest checkout, payment receipt created : PROVIDER REFERENCE: {provider_reference}")
+    merged_payload = dict(provider_payload)
+    merged_payload.setdefault("order_reference", order_ref)
+    logger.info(f"Guest checkout, payment receipt created : MERGED PAYLOAD: {merged_payload}")
+
+    # Phase 2: attach the provider reference and receipt in one short transaction
+    await _finalize_guest_checkout(
+        record["guest_order_id"],
+        request.payment_method,
+        quote,
+        provider_reference,
+        merged_payload,
+    )
+    logger.info(f"Guest checkout, receipt recorded")
     return {
         "public_token": record["public_token"],
         "payment_method": request.payment_method,
@@ -903,6 +2715,66 @@ async def guest_checkout(request: GuestCheckoutRequest):
 
 
 
+class _StatusCache:
+    """Tiny TTL cache of serialized status responses keyed by public token."""
+
+    def __init__(self) -> None:
+        self.entries: "OrderedDict[str, Tuple[float, str, bytes]]" = OrderedDict()
+        self.stats: Dict[str, int] = {"hits": 0, "misses": 0, "invalidations": 0}
+
+    def ttl(self) -> float:
+        return float(getattr(app.state, "STATUS_CACHE_TTL_SECONDS", STATUS_CACHE_TTL_SECONDS))
+
+    def max_entries(self) -> int:
+        return int(getattr(app.state, "STATUS_CACHE_MAX_ENTRIES", STATUS_CACHE_MAX_ENTRIES))
+
+    def get(self, public_token: str) -> Optional[Tuple[str, bytes]]:
+        entry = self.entries.get(public_token)
+        if entry is None or entry[0] <= time.monotonic():
+            self.entries.pop(public_token, None)
+            self.stats["misses"] += 1
+            return None
+        self.entries.move_to_end(public_token)
+        self.stats["hits"] += 1
+        return entry[1], entry[2]
+
+    def put(self, public_token: str, etag: str, body: bytes) -> None:
+        self.entries[public_token] = (time.monotonic() + self.ttl(), etag, body)
+        self.entries.move_to_end(public_token)
+        while len(self.entries) > self.max_entries():
+            self.entries.popitem(last=False)
+
+    def invalidate(self, public_token: Optional[str]) -> None:
+        if public_token and self.entries.pop(public_token, None) is not None:
+            self.stats["invalidations"] += 1
+
+
+_status_cache = _StatusCache()
+
+
+async def _evict_status(public_token: str) -> None:
+    _status_cache.invalidate(public_token)
+
+
+def status_cache_stats() -> Dict[str, Any]:
+    return {**_status_cache.stats, "size": len(_status_cache.entries)}
+
+
+def _canonical_token(public_token: str) -> Optional[str]:
+    """Canonical text of a public token (the form stored and notified), or None if it is not a UUID."""
+    try:
+        return str(uuid.UUID(public_token))
+    except ValueError:
+        return None
+
+
+def _require_token(public_token: str) -> str:
+    token = _canonical_token(public_token)
+    if token is None:
+        raise HTTPException(status_code=404, detail="Guest order not found")
+    return token
+
+
 async def _update_guest_payment(
     conn,
     guest_order_id: int,
@@ -915,21 +2787,27 @@ async def _update_guest_payment(
     # Extract payment_id from payload if available
     payment_id = payload.get("payment_id")
     
+    # The notification is delivered to status streams when the transaction commits
     await conn.execute(
         """
-        UPDATE guest_orders
-        SET payment_state = $2,
-            payment_reference = COALESCE(payment_reference, $3),
-            payment_id = COALESCE(payment_id, $4),
-            payment_details = $5,
-            updated_at = NOW()
-        WHERE guest_order_id = $1
+        WITH updated AS (
+            UPDATE guest_orders
+            SET payment_state = $2,
+                payment_reference = COALESCE(payment_reference, $3),
+                payment_id = COALESCE(payment_id, $4),
+                payment_details = $5,
+                updated_at = NOW()
+            WHERE guest_order_id = $1
+            RETURNING public_token, payment_state, order_state, updated_at
+        )
+        SELECT pg_notify($6, row_to_json(updated)::text) FROM updated
         """,
         guest_order_id,
         payment_state,
         provider_reference,
         payment_id,
         json.dumps(payload),
+        GUEST_STATUS_CHANNEL,
     )
     await conn.execute(
         """
@@ -942,6 +2820,8 @@ async def _update_guest_payment(
         payment_state,
         json.dumps(payload),
     )
+    if is_final:
+        await _schedule_subscription(conn, guest_order_id)
     return {"status": payment_state}
 
 
@@ -953,25 +2833,41 @@ async def complete_guest_payment(
     currency: str,
     payload: Dict[str, Any],
     is_final: bool = True,
+    conn=None,
+    after_commit: Optional[List[Callable[[], Awaitable[None]]]] = None,
 ) -> Dict[str, Any]:
-    async with app.state.pool.acquire() as conn:
-        async with conn.transaction():
-            guest_order = await conn.fetchrow(
-                "SELECT guest_order_id, payment_state FROM guest_orders WHERE public_token = $1 FOR UPDATE",
-                public_token,
-            )
-            if not guest_order:
-                raise HTTPException(status_code=404, detail="Guest order not found")
-            guest_order_id = int(guest_order["guest_order_id"])
-            if guest_order["payment_state"] == "completed":
-                return {"status": "already_completed"}
-            return await _update_guest_payment(
-                conn,
-                guest_order_id,
-                provider_reference,
-                payload,
-                is_final,
+    """Mark a guest order paid; pass ``conn`` to join the caller's transaction.
+
+    A caller that owns the transaction should also pass its ``after_commit``
+    list, so the cached status is only evicted once the change is visible.
+    """
+    if conn is None:
+        async with app.state.pool.acquire() as conn:
+            return await complete_guest_payment(
+                public_token, provider, provider_reference, amount, currency, payload, is_final, conn
             )
+    async with conn.transaction():
+        guest_order = await conn.fetchrow(
+            "SELECT guest_order_id, payment_state FROM guest_orders WHERE public_token = $1 FOR UPDATE",
+            public_token,
+        )
+        if not guest_order:
+            raise HTTPException(status_code=404, detail="Guest order not found")
+        guest_order_id = int(guest_order["guest_order_id"])
+        if guest_order["payment_state"] == "completed":
+            return {"status": "already_completed"}
+        result = await _update_guest_payment(
+            conn,
+            guest_order_id,
+            provider_reference,
+            payload,
+            is_final,
+        )
+    if after_commit is not None:
+        after_commit.append(functools.partial(_evict_status, str(public_token)))
+    else:
+        _status_cache.invalidate(str(public_token))
+    return result
 
 
 async def complete_guest_payment_by_reference(
@@ -996,77 +2892,347 @@ async def complete_guest_payment_by_reference(
                 return {"status": "unknown_reference"}
             guest_order_id = int(receipt["guest_order_id"])
             row = await conn.fetchrow(
-                "SELECT payment_state FROM guest_orders WHERE guest_order_id = $1 FOR UPDATE",
+                "SELECT payment_state, public_token FROM guest_orders WHERE guest_order_id = $1 FOR UPDATE",
                 guest_order_id,
             )
             if not row:
                 return {"status": "order_missing"}
             if row["payment_state"] == "completed":
                 return {"status": "already_completed"}
-            return await _update_guest_payment(
+            result = await _update_guest_payment(
                 conn,
                 guest_order_id,
                 provider_reference,
                 payload,
                 is_final,
             )
+    _status_cache.invalidate(str(row["public_token"]))
+    return result
+
+
+def _payment_link_status(row: Any) -> Optional[Dict[str, Any]]:
+    """Progress of a background payment link; None for orders checked out synchronously."""
+    if row["link_status"] is None:
+        return None
+    if row["link_status"] == "done":
+        result = row["link_result"]
+        result = json.loads(result) if isinstance(result, str) else (result or {})
+        return {
+            "status": "ready",
+            "payment_url": result.get("payment_url"),
+            "order_reference": result.get("order_reference"),
+        }
+    if row["link_status"] == "failed":
+        return {"status": "failed", "error": row["link_error"]}
+    return {"status": "awaiting_payment_link"}
+
+
+@router.post("/status/batch")
+async def guest_status_batch(request: GuestStatusBatchRequest):
+    """Status of many guest orders at once; unknown tokens are listed under ``missing``."""
+    tokens = list(dict.fromkeys(request.public_tokens))
+    max_tokens = int(getattr(app.state, "STATUS_BATCH_MAX_TOKENS", STATUS_BATCH_MAX_TOKENS))
+    if len(tokens) > max_tokens:
+        raise HTTPException(status_code=400, detail=f"At most {max_tokens} tokens per request")
+    # public_token is a uuid column; tokens that are not UUIDs cannot match anything
+    canonical = {token: _canonical_token(token) for token in tokens}
+    canonical = {token: value for token, value in canonical.items() if value is not None}
+    rows: List[Any] = []
+    if canonical:
+        async with app.state.pool.acquire() as conn:
+            rows = await conn.fetch(
+                _STATUS_SELECT + "WHERE o.public_token = ANY($1::uuid[])",
+                [uuid.UUID(value) for value in dict.fromkeys(canonical.values())],
+            )
+    found = {str(row["public_token"]): row for row in rows}
+    return {
+        "orders": [
+            _status_content(found[canonical[token]], request.include_service_payload)
+            for token in tokens
+            if canonical.get(token) in found
+        ],
+        "missing": [token for token in tokens if canonical.get(token) not in found],
+    }
+
+
+def _status_etag(row: Any) -> str:
+    parts = (
+        row["guest_order_id"],
+        row["updated_at"].isoformat() if row["updated_at"] else "",
+        row["receipt_count"],
+        row["link_status"] or "",
+        row["link_updated_at"].isoformat() if row["link_updated_at"] else "",
+    )
+    return '"%s"' % hashlib.sha256("|".join(map(str, parts)).encode()).hexdigest()[:32]
+
+
+def _not_modified(request: Request, etag: str) -> bool:
+    candidates = request.headers.get("if-none-match", "")
+    return any(tag.strip() in (etag, "W/" + etag, "*") for tag in candidates.split(","))
+
+
+_STATUS_SELECT = """
+    SELECT o.guest_order_id, o.public_token, o.service_payload, o.payment_method, o.payment_state,
+           o.order_state, o.payment_reference, o.total_amount, o.currency, o.created_at, o.updated_at,
+           j.status AS link_status, j.result AS link_result, j.last_error AS link_error,
+           j.updated_at AS link_updated_at,
+           COALESCE(r.receipt_count, 0) AS receipt_count, r.receipts
+    FROM guest_orders o
+    LEFT JOIN guest_checkout_jobs j ON j.guest_order_id = o.guest_order_id
+    LEFT JOIN LATERAL (
+        SELECT COUNT(*) AS receipt_count,
+               json_agg(
+                   json_build_object(
+                       'provider', provider,
+                       'provider_reference', provider_reference,
+                       'status', status,
+                       'amount', COALESCE(amount, 0)::float8,
+                       'currency', currency,
+                       'created_at', created_at
+                   )
+                   ORDER BY created_at DESC
+               ) AS receipts
+        FROM guest_payment_receipts
+        WHERE guest_order_id = o.guest_order_id
+    ) r ON TRUE
+"""
+
+
+def _status_content(row: Any, include_service_payload: bool = True) -> Dict[str, Any]:
+    receipts = row["receipts"]
+    content = {
+        "public_token": str(row["public_token"]),
+        "payment_method": row["payment_method"],
+        "payment_state": row["payment_state"],
+        "order_state": row["order_state"],
+        "total_amount": float(row["total_amount"] or 0),
+        "currency": row["currency"],
+        "payment_reference": row["payment_reference"],
+        "service_payload": row["service_payload"],
+        "payment_link": _payment_link_status(row),
+        "created_at": (row["created_at"].isoformat() if row["created_at"] else None),
+        "updated_at": (row["updated_at"].isoformat() if row["updated_at"] else None),
+        "receipts": json.loads(receipts) if receipts else [],
+    }
+    if not include_service_payload:
+        del content["service_payload"]
+    return content
 
 
 @router.get("/status/{public_token}")
-async def guest_status(public_token: str):
+async def guest_status(public_token: str, request: Request):
+    # Cache keys and invalidations both use the canonical uuid text
+    public_token = _require_token(public_token)
+    headers = {"Cache-Control": "no-cache"}
+    cached = _status_cache.get(public_token)
+    if cached is not None:
+        etag, body = cached
+        headers["ETag"] = etag
+        if _not_modified(request, etag):
+            return Response(status_code=304, headers=headers)
+        return Response(content=body, media_type="application/json", headers=headers)
+
+    async with app.state.pool.acquire() as conn:
+        row = await conn.fetchrow(_STATUS_SELECT + "WHERE o.public_token = $1", public_token)
+    if not row:
+        raise HTTPException(status_code=404, detail="Guest order not found")
+
+    etag = _status_etag(row)
+    headers["ETag"] = etag
+    if _not_modified(request, etag):
+        return Response(status_code=304, headers=headers)
+    response = JSONResponse(content=_status_content(row), headers=headers)
+    _status_cache.put(public_token, etag, response.body)
+    return response
+
+
+class _StatusHub:
+    """Fans guest order notifications out to open status streams.
+
+    A single pooled connection LISTENs on ``GUEST_STATUS_CHANNEL``; each open
+    stream only holds a small queue. When the listener (re)connects every
+    stream is told to re-read its order, since notifications sent while it
+    was down are lost.
+    """
+
+    def __init__(self) -> None:
+        self.subscribers: Dict[str, set] = {}
+        self.count = 0
+        self.listening = False
+
+    def subscribe(self, public_token: str) -> asyncio.Queue:
+        max_subscribers = int(getattr(app.state, "STATUS_STREAM_MAX_SUBSCRIBERS", STATUS_STREAM_MAX_SUBSCRIBERS))
+        if self.count >= max_subscribers:
+            raise HTTPException(status_code=503, detail="Too many open status streams")
+        queue: asyncio.Queue = asyncio.Queue(maxsize=8)
+        self.subscribers.setdefault(public_token, set()).add(queue)
+        self.count += 1
+        return queue
+
+    def unsubscribe(self, public_token: str, queue: asyncio.Queue) -> None:
+        queues = self.subscribers.get(public_token)
+        if queues is None or queue not in queues:
+            return
+        queues.discard(queue)
+        self.count -= 1
+        if not queues:
+            del self.subscribers[public_token]
+
+    @staticmethod
+    def _offer(queue: asyncio.Queue, item: Optional[Dict[str, Any]]) -> None:
+        # Only the latest state matters, so a slow reader drops the oldest entry
+        if queue.full():
+            queue.get_nowait()
+        queue.put_nowait(item)
+
+    def _on_notify(self, connection: Any, pid: int, channel: str, payload: str) -> None:
+        try:
+            event = json.loads(payload)
+        except ValueError:
+            return
+        for queue in list(self.subscribers.get(event.get("public_token"), ())):
+            self._offer(queue, event)
+
+    def _resync(self) -> None:
+        for queues in list(self.subscribers.values()):
+            for queue in list(queues):
+                self._offer(queue, None)
+
+    async def run(self) -> None:
+        while True:
+            conn = None
+            try:
+                conn = await app.state.pool.acquire()
+                await conn.add_listener(GUEST_STATUS_CHANNEL, self._on_notify)
+                self.listening = True
+                self._resync()
+                while True:
+                    await asyncio.sleep(STATUS_LISTENER_HEARTBEAT_SECONDS)
+                    await conn.execute("SELECT 1")
+            except asyncio.CancelledError:
+                raise
+            except Exception as exc:
+                logger.warning(f"Guest status listener lost: {exc}")
+            finally:
+                self.listening = False
+                if conn is not None:
+                    try:
+                        await conn.remove_listener(GUEST_STATUS_CHANNEL, self._on_notify)
+                    except Exception:
+                        pass
+                    try:
+                        await app.state.pool.release(conn)
+                    except Exception:
+                        pass
+            await asyncio.sleep(STATUS_LISTENER_RETRY_SECONDS)
+
+
+_status_hub = _StatusHub()
+
+
+async def _status_snapshot(public_token: str) -> Optional[Dict[str, Any]]:
     async with app.state.pool.acquire() as conn:
         row = await conn.fetchrow(
             """
-            SELECT guest_order_id, service_payload, payment_method, payment_state,
-                   order_state, payment_reference, total_amount, currency, created_at, updated_at
-            FROM guest_orders
-            WHERE public_token = $1
+            SELECT o.payment_state, o.order_state, o.updated_at,
+                   j.status AS link_status, j.result AS link_result, j.last_error AS link_error
+            FROM guest_orders o
+            LEFT JOIN guest_checkout_jobs j ON j.guest_order_id = o.guest_order_id
+            WHERE o.public_token = $1
             """,
             public_token,
         )
-        if not row:
-            raise HTTPException(status_code=404, detail="Guest order not found")
-        receipts = await conn.fetch(
-            """
-            SELECT provider, provider_reference, status, amount, currency, created_at
-            FROM guest_payment_receipts
-            WHERE guest_order_id = $1
-            ORDER BY created_at DESC
-            """,
-            row["guest_order_id"],
-        )
-    return JSONResponse(
-        content={
-            "public_token": public_token,
-            "payment_method": row["payment_method"],
-            "payment_state": row["payment_state"],
-            "order_state": row["order_state"],
-            "total_amount": float(row["total_amount"] or 0),
-            "currency": row["currency"],
-            "payment_reference": row["payment_reference"],
-            "service_payload": row["service_payload"],
-            "created_at": (row["created_at"].isoformat() if row["created_at"] else None),
-            "updated_at": (row["updated_at"].isoformat() if row["updated_at"] else None),
-            "receipts": [
-                {
-                    "provider": rec["provider"],
-                    "provider_reference": rec["provider_reference"],
-                    "status": rec["status"],
-                    "amount": float(rec["amount"] or 0),
-                    "currency": rec["currency"],
-                    "created_at": rec["created_at"].isoformat() if rec["created_at"] else None,
-                }
-                for rec in receipts
-            ],
-        }
+    if not row:
+        return None
+    return {
+        "public_token": public_token,
+        "payment_state": row["payment_state"],
+        "order_state": row["order_state"],
+        "updated_at": row["updated_at"].isoformat() if row["updated_at"] else None,
+        "payment_link": _payment_link_status(row),
+    }
+
+
+def _sse(event: str, data: Dict[str, Any]) -> str:
+    return f"event: {event}\ndata: {json.dumps(data)}\n\n"
+
+
+async def _status_events(request: Request, public_token: str, queue: asyncio.Queue, snapshot: Dict[str, Any]):
+    try:
+        yield "retry: 3000\n\n"
+        yield _sse("status", snapshot)
+        last = (snapshot["payment_state"], snapshot["order_state"], snapshot["payment_link"])
+        while not await request.is_disconnected():
+            listening = _status_hub.listening
+            timeout = STATUS_STREAM_KEEPALIVE_SECONDS if listening else STATUS_STREAM_FALLBACK_POLL_SECONDS
+            try:
+                event = await asyncio.wait_for(queue.get(), timeout=timeout)
+            except asyncio.TimeoutError:
+                if listening:
+                    yield ": keepalive\n\n"
+                    continue
+                event = None
+            if event is None:
+                event = await _status_snapshot(public_token)
+                if event is None:
+                    break
+            # Only snapshots and link notifications carry payment_link; payment updates leave it as is
+            state = (event.get("payment_state"), event.get("order_state"), event.get("payment_link", last[2]))
+            if state != last:
+                last = state
+                yield _sse("status", event)
+    finally:
+        _status_hub.unsubscribe(public_token, queue)
+
+
+@router.get("/status/{public_token}/events")
+async def guest_status_events(public_token: str, request: Request):
+    """Server-Sent Events stream of payment_state/order_state changes.
+
+    Every connection starts with a snapshot of the current state, so a client
+    that reconnects after a drop never misses the latest transition.
+    """
+    # NOTIFY payloads carry the canonical uuid text, so subscribe under that
+    public_token = _require_token(public_token)
+    # Subscribe before reading the snapshot so a change in between is not lost
+    queue = _status_hub.subscribe(public_token)
+    try:
+        snapshot = await _status_snapshot(public_token)
+    except Exception:
+        _status_hub.unsubscribe(public_token, queue)
+        raise
+    if snapshot is None:
+        _status_hub.unsubscribe(public_token, queue)
+        raise HTTPException(status_code=404, detail="Guest order not found")
+    return StreamingResponse(
+        _status_events(request, public_token, queue, snapshot),
+        media_type="text/event-stream",
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"},
     )
 
 
 __all__ = [
     "router",
     "guest_quote",
+    "guest_quote_mass_stream",
+    "guest_mass_upload",
+    "purge_expired_mass_uploads",
+    "subscription_scheduler_stats",
     "guest_checkout",
+    "recover_stalled_guest_checkouts",
     "guest_status",
+    "guest_status_events",
+    "guest_status_batch",
     "complete_guest_payment",
     "complete_guest_payment_by_reference",
+    "invalidate_pricing_cache",
+    "pricing_cache_stats",
+    "service_catalog_stats",
+    "invalidate_service_flags",
+    "service_flag_stats",
+    "quote_cache_stats",
+    "price_batch",
+    "catalog_price_listing",
+    "reprice_catalog",
+    "status_cache_stats",
 ]
@@ -0,0 +1,413 @@
+from __future__ import annotations
+
+import asyncio
+import importlib.util
+import logging
+import time
+from collections import deque
+from typing import Any, Deque, Dict, Optional, Tuple
+from urllib.parse import urlparse
+
+import httpx
+
+logger = logging.getLogger(__name__)
+
+CRYPTOMUS_API_BASE_URL = "https://api.cryptomus.com"
+PAYPAL_API_BASE_URL = "https://api-m.paypal.com"
+
+# Default request timeouts (seconds) per provider; callers may still pass timeout= per request
+PROVIDER_TIMEOUTS: Dict[str, float] = {
+    "cryptomus": 15.0,
+    "paypal": 15.0,
+    "wise": 30.0,
+    "dodo": 30.0,
+}
+PROVIDER_MAX_CONNECTIONS = 20
+PROVIDER_MAX_KEEPALIVE = 10
+PROVIDER_KEEPALIVE_EXPIRY = 60.0
+
+# Background provider health probing
+HEALTH_PROBE_INTERVAL_SECONDS = 30.0
+HEALTH_PROBE_TIMEOUT_SECONDS = 5.0
+HEALTH_DEGRADED_LATENCY_SECONDS = 2.0
+HEALTH_DOWN_AFTER_FAILURES = 3
+
+# Per-provider circuit breakers and latency-derived timeouts
+BREAKER_WINDOW_SECONDS = 60.0
+BREAKER_MAX_SAMPLES = 500
+BREAKER_MIN_CALLS = 10
+BREAKER_FAILURE_RATIO = 0.5
+BREAKER_OPEN_SECONDS = 30.0
+BREAKER_TIMEOUT_P99_MULTIPLIER = 3.0
+BREAKER_TIMEOUT_FLOOR_SECONDS = 3.0
+
+# HTTP/2 needs the optional ``h2`` package (pip install httpx[http2])
+HTTP2_AVAILABLE = importlib.util.find_spec("h2") is not None
+
+
+class ProviderCircuitOpen(httpx.TransportError):
+    """Raised instead of calling a provider whose circuit breaker is open."""
+
+
+class CircuitBreaker:
+    """Rolling-window circuit breaker for one payment provider.
+
+    Calls from the last ``BREAKER_WINDOW_SECONDS`` are kept; once at least
+    ``BREAKER_MIN_CALLS`` are recorded and the failure ratio (transport errors,
+    timeouts and 5xx answers) reaches ``BREAKER_FAILURE_RATIO`` the breaker
+    opens and calls fail fast. After ``BREAKER_OPEN_SECONDS`` one trial call is
+    let through (half-open): success closes the breaker, failure re-opens it.
+    The observed p99 latency also drives the request timeout, so a degraded
+    provider cannot hold a checkout for the full configured timeout.
+    """
+
+    def __init__(self, provider: str) -> None:
+        self.provider = provider
+        self.state = "closed"
+        self.opened_at = 0.0
+        self.trial_inflight = False
+        self.calls: Deque[Tuple[float, bool, float]] = deque(maxlen=BREAKER_MAX_SAMPLES)
+        self.rejected = 0
+
+    def _trim(self, now: float) -> None:
+        while self.calls and now - self.calls[0][0] > BREAKER_WINDOW_SECONDS:
+            self.calls.popleft()
+
+    def before_call(self) -> None:
+        if self.state == "closed":
+            return
+        now = time.monotonic()
+        if self.state == "open" and now - self.opened_at >= BREAKER_OPEN_SECONDS:
+            self.state = "half_open"
+        if self.state == "half_open" and not self.trial_inflight:
+            self.trial_inflight = True
+            return
+        self.rejected += 1
+        raise ProviderCircuitOpen(f"{self.provider} circuit breaker is open")
+
+    def release(self) -> None:
+        """Forget a call that was abandoned without an outcome (e.g. cancelled)."""
+        if self.state == "half_open":
+            self.trial_inflight = False
+
+    def record(self, success: bool, latency: float) -> None:
+        now = time.monotonic()
+        if self.state == "half_open":
+            self.trial_inflight = False
+            if success:
+                logger.info(f"Circuit breaker for {self.provider} closed")
+                self.state = "closed"
+                self.calls.clear()
+            else:
+                self._open(now)
+            self.calls.append((now, success, latency))
+            return
+        self.calls.append((now, success, latency))
+        self._trim(now)
+        if self.state == "closed" and len(self.calls) >= BREAKER_MIN_CALLS:
+            failures = sum(1 for _, ok, _ in self.calls if not ok)
+            if failures / len(self.calls) >= BREAKER_FAILURE_RATIO:
+                self._open(now)
+
+    def _open(self, now: float) -> None:
+        if self.state != "open":
+            logger.warning(f"Circuit breaker for {self.provider} opened")
+        self.state = "open"
+        self.opened_at = now
+
+    def p99(self) -> Optional[float]:
+        self._trim(time.monotonic())
+        latencies = sorted(latency for _, ok, latency in self.calls if ok)
+        if len(latencies) < BREAKER_MIN_CALLS:
+            return None
+        return latencies[min(len(latencies) - 1, int(len(latencies) * 0.99))]
+
+    def timeout(self, configured: float) -> float:
+        p99 = self.p99()
+        if p99 is None:
+            return configured
+        return min(configured, max(BREAKER_TIMEOUT_FLOOR_SECONDS, p99 * BREAKER_TIMEOUT_P99_MULTIPLIER))
+
+    def stats(self) -> Dict[str, Any]:
+        self._trim(time.monotonic())
+        total = len(self.calls)
+        failures = sum(1 for _, ok, _ in self.calls if not ok)
+        p99 = self.p99()
+        return {
+            "state": self.state,
+            "calls": total,
+            "error_rate": round(failures / total, 4) if total else 0.0,
+            "p99_ms": round(p99 * 1000, 1) if p99 is not None else None,
+            "timeout_seconds": round(self.timeout(PROVIDER_TIMEOUTS.get(self.provider, 30.0)), 3),
+            "rejected": self.rejected,
+        }
+
+
+class ProviderBreakers:
+    def __init__(self) -> None:
+        self.breakers: Dict[str, CircuitBreaker] = {}
+
+    def get(self, provider: str) -> CircuitBreaker:
+        breaker = self.breakers.get(provider)
+        if breaker is None:
+            breaker = self.breakers[provider] = CircuitBreaker(provider)
+        return breaker
+
+    def stats(self) -> Dict[str, Any]:
+        return {provider: breaker.stats() for provider, breaker in self.breakers.items()}
+
+
+provider_breakers = ProviderBreakers()
+
+
+class _BreakerTransport(httpx.AsyncBaseTransport):
+    """Routes every provider request through its circuit breaker.
+
+    Requests sent with ``extensions={"breaker_bypass": True}`` (health probes)
+    are neither blocked nor recorded.
+    """
+
+    def __init__(self, inner: httpx.AsyncHTTPTransport, breaker: CircuitBreaker) -> None:
+        self.inner = inner
+        self.breaker = breaker
+
+    async def handle_async_request(self, request: httpx.Request) -> httpx.Response:
+        if request.extensions.get("breaker_bypass"):
+            return await self.inner.handle_async_request(request)
+        self.breaker.before_call()
+        timeouts = request.extensions.get("timeout")
+        if isinstance(timeouts, dict):
+            request.extensions["timeout"] = {
+                name: self.breaker.timeout(value) if value is not None else value
+                for name, value in timeouts.items()
+            }
+        started = time.monotonic()
+        try:
+            response = await self.inner.handle_async_request(request)
+        except asyncio.CancelledError:
+            self.breaker.release()
+            raise
+        except Exception:
+            self.breaker.record(False, time.monotonic() - started)
+            raise
+        self.breaker.record(response.status_code < 500, time.monotonic() - started)
+        return response
+
+    async def aclose(self) -> None:
+        await self.inner.aclose()
+
+
+class ProviderClients:
+    """Long-lived ``httpx.AsyncClient`` per payment provider base URL.
+
+    Reusing one client keeps TCP/TLS connections alive between checkouts
+    instead of paying a fresh handshake on every provider call. Clients are
+    created on first use (or by ``open_provider_http``) and closed by
+    ``close_provider_http`` once the last router using them shuts down.
+    """
+
+    def __init__(self) -> None:
+        self.clients: Dict[Tuple[str, str], httpx.AsyncClient] = {}
+        self.requests: Dict[Tuple[str, str], int] = {}
+
+    def get(self, provider: str, base_url: str, timeout: Optional[float] = None) -> httpx.AsyncClient:
+        key = (provider, base_url.rstrip("/"))
+        client = self.clients.get(key)
+        if client is None or client.is_closed:
+            client = self._build(key, timeout)
+            self.clients[key] = client
+        return client
+
+    def _build(self, key: Tuple[str, str], timeout: Optional[float]) -> httpx.AsyncClient:
+        provider, base_url = key
+
+        async def _count_request(request: httpx.Request) -> None:
+            self.requests[key] = self.requests.get(key, 0) + 1
+
+        logger.info(f"Opening shared HTTP client for {provider} ({base_url}), http2={HTTP2_AVAILABLE}")
+        transport = httpx.AsyncHTTPTransport(
+            http2=HTTP2_AVAILABLE,
+            limits=httpx.Limits(
+                max_connections=PROVIDER_MAX_CONNECTIONS,
+                max_keepalive_connections=PROVIDER_MAX_KEEPALIVE,
+                keepalive_expiry=PROVIDER_KEEPALIVE_EXPIRY,
+            ),
+        )
+        return httpx.AsyncClient(
+            base_url=base_url,
+            timeout=timeout if timeout is not None else PROVIDER_TIMEOUTS.get(provider, 30.0),
+            transport=_BreakerTransport(transport, provider_breakers.get(provider)),
+            event_hooks={"request": [_count_request]},
+        )
+
+    async def close(self) -> None:
+        clients, self.clients = self.clients, {}
+        for (provider, base_url), client in clients.items():
+            try:
+                await client.aclose()
+            except Exception as exc:  # pragma: no cover - defensive
+                logger.warning(f"Failed to close HTTP client for {provider} ({base_url}): {exc}")
+
+    def stats(self) -> Dict[str, Any]:
+        result: Dict[str, Any] = {}
+        for key, client in self.clients.items():
+            provider, base_url = key
+            # httpcore does not expose pool usage publicly; read it defensively
+            transport = getattr(client, "_transport", None)
+            pool = getattr(getattr(transport, "inner", transport), "_pool", None)
+            connections = list(getattr(pool, "connections", []) or [])
+            result[f"{provider}:{base_url}"] = {
+                "requests": self.requests.get(key, 0),
+                "connections": len(connections),
+                "idle_connections": sum(1 for conn in connections if getattr(conn, "is_idle", lambda: False)()),
+                "closed": client.is_closed,
+            }
+        return result
+
+
+provider_clients = ProviderClients()
+
+
+class ProviderHealthMonitor:
+    """Probes registered providers on an interval and caches their state.
+
+    States are ``healthy``, ``degraded``, ``down`` or ``unknown`` (not probed
+    yet). DNS goes through the loop's resolver so probing never blocks the event
+    loop; a failed lookup marks the provider down straight away, while HTTP
+    errors, 5xx answers or slow answers mark it degraded until
+    ``HEALTH_DOWN_AFTER_FAILURES`` consecutive failures. Any HTTP answer counts
+    as reachable, since not every provider exposes the probed path.
+    """
+
+    def __init__(self) -> None:
+        self.targets: Dict[str, Tuple[str, str]] = {}
+        self.status: Dict[str, Dict[str, Any]] = {}
+        self.task: Optional[asyncio.Task] = None
+
+    def register(self, provider: str, base_url: str, path: str = "/") -> None:
+        if base_url:
+            self.targets[provider] = (base_url.rstrip("/"), path)
+
+    def state(self, provider: str) -> str:
+        entry = self.status.get(provider)
+        return entry["state"] if entry else "unknown"
+
+    def is_down(self, provider: str) -> bool:
+        return self.state(provider) == "down"
+
+    async def probe(self, provider: str) -> str:
+        base_url, path = self.targets[provider]
+        previous = self.status.get(provider, {})
+        failures = int(previous.get("consecutive_failures", 0))
+        started = time.monotonic()
+        error: Optional[str] = None
+        state = "healthy"
+        try:
+            parsed = urlparse(base_url)
+            await asyncio.wait_for(
+                asyncio.get_running_loop().getaddrinfo(parsed.hostname, parsed.port or 443),
+                timeout=HEALTH_PROBE_TIMEOUT_SECONDS,
+            )
+        except Exception as exc:
+            state, error = "down", f"dns: {exc}"
+        if error is None:
+            try:
+                client = provider_clients.get(provider, base_url)
+                response = await client.get(
+                    path,
+                    follow_redirects=True,
+                    timeout=HEALTH_PROBE_TIMEOUT_SECONDS,
+                    extensions={"breaker_bypass": True},
+                )
+                if response.status_code >= 500:
+                    state, error = "degraded", f"http {response.status_code}"
+            except httpx.HTTPError as exc:
+                state, error = "degraded", f"http: {exc.__class__.__name__}"
+        latency = time.monotonic() - started
+        if error is None and latency > HEALTH_DEGRADED_LATENCY_SECONDS:
+            state = "degraded"
+        failures = failures + 1 if error else 0
+        if failures >= HEALTH_DOWN_AFTER_FAILURES:
+            state = "down"
+        if state != previous.get("state"):
+            log = logger.info if state == "healthy" else logger.warning
+            log(f"Provider {provider} is now {state}" + (f" ({error})" if error else ""))
+        self.status[provider] = {
+            "state": state,
+            "latency_ms": round(latency * 1000, 1),
+            "error": error,
+            "consecutive_failures": failures,
+            "checked_at": time.time(),
+        }
+        return state
+
+    async def _run(self) -> None:
+        while True:
+            for provider in list(self.targets):
+                try:
+                    await self.probe(provider)
+                except asyncio.CancelledError:
+                    raise
+                except Exception as exc:  # pragma: no cover - defensive
+                    logger.error(f"Health probe for {provider} crashed: {exc}")
+            await asyncio.sleep(HEALTH_PROBE_INTERVAL_SECONDS)
+
+    def start(self) -> None:
+        if self.task is None or self.task.done():
+            self.task = asyncio.create_task(self._run())
+
+    async def stop(self) -> None:
+        task, self.task = self.task, None
+        if task is not None:
+            task.cancel()
+            await asyncio.gather(task, return_exceptions=True)
+
+    def stats(self) -> Dict[str, Any]:
+        return {provider: dict(self.status.get(provider, {"state": "unknown"})) for provider in self.targets}
+
+
+provider_health = ProviderHealthMonitor()
+
+_provider_http_users = 0
+
+
+def open_provider_http(targets: Dict[str, Tuple[str, str]]) -> None:
+    """Open shared clients and health probes for ``{provider: (base_url, probe_path)}``.
+
+    Every router using ``provider_clients`` calls this from its startup and
+    ``close_provider_http()`` from its shutdown. Calls are reference counted:
+    clients and probes are only torn down when the last user closes, so one
+    router shutting down never closes clients another router's workers use.
+    """
+    global _provider_http_users
+    _provider_http_users += 1
+    for provider, (base_url, path) in targets.items():
+        if base_url:
+            provider_clients.get(provider, base_url)
+            provider_health.register(provider, base_url, path)
+    provider_health.start()
+
+
+async def close_provider_http() -> None:
+    global _provider_http_users
+    _provider_http_users = max(0, _provider_http_users - 1)
+    if _provider_http_users:
+        return
+    await provider_health.stop()
+    await provider_clients.close()
+
+
+__all__ = [
+    "CRYPTOMUS_API_BASE_URL",
+    "PAYPAL_API_BASE_URL",
+    "PROVIDER_TIMEOUTS",
+    "CircuitBreaker",
+    "ProviderCircuitOpen",
+    "ProviderClients",
+    "ProviderHealthMonitor",
+    "provider_breakers",
+    "provider_clients",
+    "provider_health",
+    "open_provider_http",
+    "close_provider_http",
+]
@@ -1,11 +1,13 @@
 from __future__ import annotations
 
+import asyncio
 import json
 import logging
 import os
 import uuid
 from datetime import datetime
-from typing import Any, Dict, Optional
+from collections import OrderedDict
+from typing import Any, Awaitable, Callable, Dict, List, Optional, Tuple
 
 import httpx
 from fastapi import APIRouter, Depends, HTTPException, Request
@@ -15,6 +17,7 @@ from dependencies import app
 from services.promotions import evaluate_deposit_promotion
 from .affiliate import process_affiliate_deposit_commission
 from .auth import UserAuth, get_user_data_verify
+from .payment_http import close_provider_http, open_provider_http, provider_breakers, provider_clients, provider_health
 
 try:  # pragma: no cover - optional CRUD helpers
     from crud import payment as crud_payment  # type: ignore
@@ -31,41 +34,16 @@ DODO_CANCEL_URL = os.getenv("DODO_CANCEL_URL")
 DODO_TIMEOUT_SECONDS = os.getenv("DODO_TIMEOUT_SECONDS")
 DODO_WEBHOOK_SECRET = os.getenv("DODO_WEBHOOK_SECRET")
 
-
-async def _test_dodo_connectivity() -> bool:
-    """Test basic connectivity to Dodo API"""
-    try:
-        import socket
-        from urllib.parse import urlparse
-        
-        api_url = DodoSettings.api_base_url()
-        parsed = urlparse(api_url)
-        hostname = parsed.hostname
-        
-        logger.info(f"🔍 Testing DNS resolution for: {hostname}")
-        
-        # Test DNS resolution
-        try:
-            ip = socket.gethostbyname(hostname)
-            logger.info(f"✅ DNS resolution successful: {hostname} -> {ip}")
-        except socket.gaierror as e:
-            logger.error(f"❌ DNS resolution failed for {hostname}: {e}")
-            return False
-        
-        # Test basic HTTP connectivity
-        try:
-            async with httpx.AsyncClient(timeout=10.0) as client:
-                response = await client.get(f"{api_url}/health", follow_redirects=True)
-                logger.info(f"✅ HTTP connectivity test: {response.status_code}")
-                return True
-        except httpx.HTTPError as e:
-            logger.warning(f"⚠️ HTTP connectivity test failed (expected for /health): {e}")
-            # This is expected since /health might not exist, but DNS worked
-            return True
-            
-    except Exception as e:
-        logger.error(f"❌ Connectivity test failed: {e}")
-        return False
+# Background webhook queue (DODO_WEBHOOK_QUEUE=true)
+WEBHOOK_WORKERS = 8
+WEBHOOK_MAX_ATTEMPTS = 8
+WEBHOOK_RETRY_BASE_SECONDS = 5.0
+WEBHOOK_LEASE_SECONDS = 120.0
+WEBHOOK_POLL_SECONDS = 2.0
+# Payment events for one order wait this long (queued or inline) so a burst can be folded together
+WEBHOOK_COALESCE_SECONDS = 1.0
+# Webhook ids remembered in memory to short-circuit duplicate deliveries
+WEBHOOK_RECENT_IDS = 10_000
 
 
 logger = logging.getLogger(__name__)
@@ -96,11 +74,9 @@ async def _create_dodo_product(
     """
     DodoSettings.ensure_ready()
     
-    # Test connectivity before attempting API calls
-    logger.info("🔍 Testing Dodo API connectivity before product creation...")
-    connectivity_ok = await _test_dodo_connectivity()
-    if not connectivity_ok:
-        logger.error("❌ Dodo API connectivity test failed - cannot create product")
+    # Connectivity is probed in the background; fail fast only when Dodo is known to be down
+    if provider_health.is_down("dodo"):
+        logger.error("❌ Dodo API is marked down by the health monitor - cannot create product")
         raise HTTPException(status_code=503, detail="Dodo Payments API is not reachable")
     
     # Convert amount to cents (minor currency units)
@@ -117,9 +93,9 @@ async def _create_dodo_product(
             "type": "one_time_price",
             "pay_what_you_want": False,  # Fixed price
             "purchasing_power_parity": False,  # Required field - no PPP for dynamic products
-            "tax_inclusive": True,
+            "tax_inclusive": DODO_PRODUCT_TAX_INCLUSIVE,
         },
-        "tax_category": "digital_products",
+        "tax_category": DODO_PRODUCT_TAX_CATEGORY,
         "metadata": {
             "created_for": "dynamic_payment",
             "amount": str(amount),
@@ -138,22 +114,21 @@ async def _create_dodo_product(
     }
     
     try:
-        async with httpx.AsyncClient(
-            base_url=DodoSettings.api_base_url(),
-            timeout=DodoSettings.timeout_seconds(),
-        ) as client:
-            response = await client.post("/products", json=product_payload, headers=headers)
-            response.raise_for_status()
-            product_data = response.json()
-            
-            product_id = product_data.get("product_id")
-            if not product_id:
-                logger.error(f"Dodo product creation response missing product_id: {product_data}")
-                raise HTTPException(status_code=500, detail="Failed to create product - no product_id returned")
-            
-            logger.info(f"✓ Created Dodo product: {product_id} - {name} - ${amount} {currency}")
-            return product_id
-            
+        client = provider_clients.get("dodo", DodoSettings.api_base_url())
+        response = await client.post(
+            "/products", json=product_payload, headers=headers, timeout=DodoSettings.timeout_seconds()
+        )
+        response.raise_for_status()
+        product_data = response.json()
+        
+        product_id = product_data.get("product_id")
+        if not product_id:
+            logger.error(f"Dodo product creation response missing product_id: {product_data}")
+            raise HTTPException(status_code=500, detail="Failed to create product - no product_id returned")
+        
+        logger.info(f"✓ Created Dodo product: {product_id} - {name} - ${amount} {currency}")
+        return product_id
+        
     except httpx.HTTPStatusError as exc:
         logger.error(f"Dodo product creation API error: {exc.response.text}")
         raise HTTPException(status_code=503, detail="Failed to create payment product")
@@ -162,6 +137,106 @@ async def _create_dodo_product(
         raise HTTPException(status_code=503, detail="Failed to reach Dodo Payments API")
 
 
+# Dodo products are reused across payments that share the same price point.
+# Products are created with these tax settings, so they are part of the reuse key.
+DODO_PRODUCT_TAX_CATEGORY = "digital_products"
+DODO_PRODUCT_TAX_INCLUSIVE = True
+
+_dodo_product_ids: Dict[Tuple[int, str, str, str, bool], str] = {}
+_dodo_product_locks: Dict[Tuple[int, str, str, str, bool], asyncio.Lock] = {}
+_dodo_products_table_ready = False
+
+
+async def _ensure_dodo_products_table(conn) -> None:
+    global _dodo_products_table_ready
+    if _dodo_products_table_ready:
+        return
+    await conn.execute(
+        """
+        CREATE TABLE IF NOT EXISTS dodo_products (
+            price_minor INTEGER NOT NULL,
+            currency TEXT NOT NULL,
+            name TEXT NOT NULL,
+            tax_category TEXT NOT NULL,
+            tax_inclusive BOOLEAN NOT NULL,
+            product_id TEXT NOT NULL,
+            created_at TIMESTAMPTZ NOT NULL DEFAULT NOW(),
+            PRIMARY KEY (price_minor, currency, name, tax_category, tax_inclusive)
+        )
+        """
+    )
+    _dodo_products_table_ready = True
+
+
+async def resolve_dodo_product(
+    amount: float,
+    currency: str,
+    name: str,
+    create: Callable[[], Awaitable[str]],
+) -> str:
+    """
+    Return a Dodo product_id for this price point, creating it only once.
+
+    Products are keyed by (price in minor units, currency, name, tax settings)
+    and persisted in ``dodo_products`` so every worker reuses them. ``create``
+    is only awaited on a miss; concurrent misses in one process share it.
+    """
+    key = (
+        int(round(amount * 100)),
+        currency.upper(),
+        name,
+        DODO_PRODUCT_TAX_CATEGORY,
+        DODO_PRODUCT_TAX_INCLUSIVE,
+    )
+    product_id = _dodo_product_ids.get(key)
+    if product_id:
+        return product_id
+
+    lock = _dodo_product_locks.setdefault(key, asyncio.Lock())
+    async with lock:
+        product_id = _dodo_product_ids.get(key)
+        if product_id:
+            return product_id
+        try:
+            async with app.state.pool.acquire() as conn:  # type: ignore[attr-defined]
+                await _ensure_dodo_products_table(conn)
+                product_id = await conn.fetchval(
+                    """
+                    SELECT product_id FROM dodo_products
+                    WHERE price_minor = $1 AND currency = $2 AND name = $3
+                      AND tax_category = $4 AND tax_inclusive = $5
+                    """,
+                    *key,
+                )
+        except Exception as exc:
+            logger.warning(f"Dodo product cache lookup failed: {exc}")
+            product_id = None
+        if product_id:
+            _dodo_product_ids[key] = product_id
+            return product_id
+
+        product_id = await create()
+        try:
+            async with app.state.pool.acquire() as conn:  # type: ignore[attr-defined]
+                # Another worker may have stored the same price point meanwhile; keep the first one
+                stored = await conn.fetchval(
+                    """
+                    INSERT INTO dodo_products (price_minor, currency, name, tax_category, tax_inclusive, product_id)
+                    VALUES ($1, $2, $3, $4, $5, $6)
+                    ON CONFLICT (price_minor, currency, name, tax_category, tax_inclusive)
+                    DO UPDATE SET price_minor = dodo_products.price_minor
+                    RETURNING product_id
+                    """,
+                    *key,
+                    product_id,
+                )
+                product_id = stored or product_id
+        except Exception as exc:
+            logger.warning(f"Failed to persist Dodo product {product_id}: {exc}")
+        _dodo_product_ids[key] = product_id
+        return product_id
+
+
 class DodoSettings:
     @staticmethod
     def api_key() -> str:
@@ -183,18 +258,37 @@ class DodoSettings:
 
     @staticmethod
     def timeout_seconds() -> float:
-        return float(getattr(app.state, "DODO_TIMEOUT_SECONDS", 30.0))
+        # Capped by the breaker's latency-derived timeout once enough calls are observed
+        configured = float(getattr(app.state, "DODO_TIMEOUT_SECONDS", 30.0))
+        return provider_breakers.get("dodo").timeout(configured)
 
     @staticmethod
     def webhook_secret() -> str:
         return getattr(app.state, "DODO_WEBHOOK_SECRET", None) or os.getenv("DODO_WEBHOOK_SECRET", "")
 
+    @staticmethod
+    def webhook_queue_enabled() -> bool:
+        value = getattr(app.state, "DODO_WEBHOOK_QUEUE", None)
+        if value is None:
+            value = os.getenv("DODO_WEBHOOK_QUEUE", "")
+        return str(value).strip().lower() in ("1", "true", "yes", "on")
+
     @staticmethod
     def ensure_ready() -> None:
         if not DodoSettings.api_key():
             raise HTTPException(status_code=500, detail="Dodo Payments provider is not configured")
 
 
+@router.on_event("startup")
+async def _open_dodo_client() -> None:
+    open_provider_http({"dodo": (DodoSettings.api_base_url(), "/health")})
+
+
+@router.on_event("shutdown")
+async def _close_provider_clients() -> None:
+    await close_provider_http()
+
+
 class DodoCreateLinkRequest(BaseModel):
     amount: float = Field(..., gt=0, description="Amount in major currency units (e.g. 10.50)")
     currency: str = Field(..., min_length=3, max_length=3)
@@ -390,16 +484,24 @@ async def create_payment_link(
 
     order_id = f"dodo_{auth.user_id}_{int(datetime.utcnow().timestamp())}"
 
-    # Step 1: Create a unique product for this transaction with fixed price
-    product_name = f"Digital Software - {order_id}"
-    product_description = payload.description or f"Digital Software ${payload.amount:.2f} {payload.currency}"
+    # Step 1: Reuse (or create once) the product for this price point.
+    # The order identity travels in the checkout metadata, not in the product.
+    # The product always comes from the amount being credited: a client-chosen
+    # product_id could charge a different price than the deposit recorded below.
+    product_name = "Digital Software"
+    product_description = f"Digital Software ${payload.amount:.2f} {payload.currency}"
     
     try:
-        product_id = await _create_dodo_product(
-            amount=payload.amount,
-            currency=payload.currency,
-            name=product_name,
-            description=product_description,
+        product_id = await resolve_dodo_product(
+            payload.amount,
+            payload.currency,
+            product_name,
+            lambda: _create_dodo_product(
+                amount=payload.amount,
+                currency=payload.currency,
+                name=product_name,
+                description=product_description,
+            ),
         )
     except HTTPException:
         raise
@@ -420,12 +522,11 @@ async def create_payment_link(
     }
 
     try:
-        async with httpx.AsyncClient(
-            base_url=DodoSettings.api_base_url(),
-            timeout=DodoSettings.timeout_seconds(),
-        ) as client:
-            response = await client.post("/checkouts", json=request_body, headers=headers)
-            response.raise_for_status()
+        client = provider_clients.get("dodo", DodoSettings.api_base_url())
+        response = await client.post(
+            "/checkouts", json=request_body, headers=headers, timeout=DodoSettings.timeout_seconds()
+        )
+        response.raise_for_status()
     except httpx.HTTPStatusError as exc:  # pragma: no cover - network failure handling
         logger.error("Dodo Payments API error: %s", exc.response.text)
         raise HTTPException(status_code=exc.response.status_code, detail="Dodo Payments API request failed")
@@ -473,22 +574,34 @@ async def create_payment_link(
     return result
 
 
-async def _complete_transaction(order_id: str, amount: float, user_id: int) -> None:
-    async with app.state.pool.acquire() as conn:  # type: ignore[attr-defined]
-        await conn.execute(
-            """
+async def _apply_deposit(conn, order_id: str):
+    """
+    Complete a pending Dodo deposit and credit the wallet in one statement.
+    The ``status = 'pending'`` guard makes it apply exactly once: a concurrent
+    duplicate waits on the row lock, then matches nothing and gets ``None``.
+    Returns the credited ``user_id``, ``amount`` and new ``balance``.
+    """
+    return await conn.fetchrow(
+        """
+        WITH completed AS (
             UPDATE wallet_transactions
             SET status = 'completed'
-            WHERE order_id = $1 AND payment_method = 'dodo'
-            """,
-            order_id,
-        )
-        await conn.execute(
-            "UPDATE users SET balance = COALESCE(balance, 0) + $1 WHERE user_id = $2",
-            amount,
-            user_id,
+            WHERE order_id = $1 AND payment_method = 'dodo' AND status = 'pending'
+            RETURNING user_id, amount
+        ), credit AS (
+            SELECT user_id, SUM(amount) AS amount FROM completed GROUP BY user_id
         )
+        UPDATE users u
+        SET balance = COALESCE(u.balance, 0) + credit.amount
+        FROM credit
+        WHERE u.user_id = credit.user_id
+        RETURNING u.user_id, credit.amount, u.balance
+        """,
+        order_id,
+    )
 
+
+async def _run_deposit_rewards(user_id: int, amount: float) -> None:
     try:
         await process_affiliate_deposit_commission(user_id, amount)
     except Exception as exc:  # pragma: no cover - defensive
@@ -502,93 +615,90 @@ async def _complete_transaction(order_id: str, amount: float, user_id: int) -> N
 # Webhook integration for Dodo Payments
 # Dodo Payments uses Standard Webhooks specification
 # See: https://docs.dodopayments.com/developer-resources/webhooks/
+#
+# Handlers run on the caller's connection, inside the transaction that also
+# claims the webhook id, so a failing handler leaves nothing half-applied.
+# Work that talks to other services is deferred to ``after_commit``.
+
+AfterCommit = List[Callable[[], Awaitable[None]]]
 
-async def _handle_payment_succeeded(order_id: str) -> None:
+
+async def _handle_payment_succeeded(conn, order_id: str, after_commit: AfterCommit) -> None:
     """Handle successful payment webhook"""
-    async with app.state.pool.acquire() as conn:  # type: ignore[attr-defined]
-        row = await conn.fetchrow(
-            """
-            SELECT user_id, amount FROM wallet_transactions
-            WHERE order_id = $1 AND payment_method = 'dodo' AND status = 'pending'
-            """,
-            order_id
-        )
-        
-        if row:
-            await _complete_transaction(order_id, row["amount"], row["user_id"])
-            logger.info(f"✓ Payment succeeded for order {order_id} - User {row['user_id']} - ${row['amount']}")
-        else:
-            logger.warning(f"⚠ Payment succeeded webhook received for unknown order: {order_id}")
+    row = await _apply_deposit(conn, order_id)
+    
+    if row:
+        after_commit.append(lambda: _run_deposit_rewards(row["user_id"], row["amount"]))
+        logger.info(f"✓ Payment succeeded for order {order_id} - User {row['user_id']} - ${row['amount']}")
+    else:
+        logger.warning(f"⚠ Payment succeeded webhook received for unknown or already completed order: {order_id}")
 
 
-async def _handle_payment_failed(order_id: str, reason: str = "unknown") -> None:
+async def _handle_payment_failed(conn, order_id: str, reason: str = "unknown") -> None:
     """Handle failed payment webhook"""
-    async with app.state.pool.acquire() as conn:  # type: ignore[attr-defined]
-        await conn.execute(
-            """
-            UPDATE wallet_transactions
-            SET status = 'failed',
-                payment_details = payment_details || $2::jsonb
-            WHERE order_id = $1 AND payment_method = 'dodo' AND status = 'pending'
-            """,
-            order_id,
-            json.dumps({"failure_reason": reason, "failed_at": datetime.utcnow().isoformat()})
-        )
+    await conn.execute(
+        """
+        UPDATE wallet_transactions
+        SET status = 'failed',
+            payment_details = payment_details || $2::jsonb
+        WHERE order_id = $1 AND payment_method = 'dodo' AND status = 'pending'
+        """,
+        order_id,
+        json.dumps({"failure_reason": reason, "failed_at": datetime.utcnow().isoformat()})
+    )
     logger.info(f"✗ Payment failed for order {order_id} - Reason: {reason}")
 
 
-async def _handle_payment_cancelled(order_id: str) -> None:
+async def _handle_payment_cancelled(conn, order_id: str) -> None:
     """Handle cancelled payment webhook"""
-    async with app.state.pool.acquire() as conn:  # type: ignore[attr-defined]
-        await conn.execute(
-            """
-            UPDATE wallet_transactions
-            SET status = 'cancelled',
-                payment_details = payment_details || $2::jsonb
-            WHERE order_id = $1 AND payment_method = 'dodo' AND status = 'pending'
-            """,
-            order_id,
-            json.dumps({"cancelled_at": datetime.utcnow().isoformat()})
-        )
+    await conn.execute(
+        """
+        UPDATE wallet_transactions
+        SET status = 'cancelled',
+            payment_details = payment_details || $2::jsonb
+        WHERE order_id = $1 AND payment_method = 'dodo' AND status = 'pending'
+        """,
+        order_id,
+        json.dumps({"cancelled_at": datetime.utcnow().isoformat()})
+    )
     logger.info(f"⊘ Payment cancelled for order {order_id}")
 
 
-async def _handle_refund_succeeded(order_id: str, refund_amount: float) -> None:
+async def _handle_refund_succeeded(conn, order_id: str, refund_amount: float) -> None:
     """Handle successful refund webhook"""
-    async with app.state.pool.acquire() as conn:  # type: ignore[attr-defined]
-        # Find the original transaction
-        row = await conn.fetchrow(
+    # Find the original transaction
+    row = await conn.fetchrow(
+        """
+        SELECT user_id, amount FROM wallet_transactions
+        WHERE order_id = $1 AND payment_method = 'dodo' AND status = 'completed'
+        """,
+        order_id
+    )
+    
+    if row:
+        # Deduct refund amount from user balance
+        await conn.execute(
+            "UPDATE users SET balance = GREATEST(0, COALESCE(balance, 0) - $1) WHERE user_id = $2",
+            refund_amount,
+            row["user_id"]
+        )
+        
+        # Create refund transaction record
+        await conn.execute(
             """
-            SELECT user_id, amount FROM wallet_transactions
-            WHERE order_id = $1 AND payment_method = 'dodo' AND status = 'completed'
+            INSERT INTO wallet_transactions (
+                user_id, order_id, amount, currency, type, status, payment_method, payment_details
+            ) VALUES ($1, $2, $3, 'USD', 'refund', 'completed', 'dodo', $4)
             """,
-            order_id
+            row["user_id"],
+            f"refund_{order_id}",
+            -refund_amount,
+            json.dumps({
+                "original_order_id": order_id,
+                "refunded_at": datetime.utcnow().isoformat()
+            })
         )
-        
-        if row:
-            # Deduct refund amount from user balance
-            await conn.execute(
-                "UPDATE users SET balance = GREATEST(0, COALESCE(balance, 0) - $1) WHERE user_id = $2",
-                refund_amount,
-                row["user_id"]
-            )
-            
-            # Create refund transaction record
-            await conn.execute(
-                """
-                INSERT INTO wallet_transactions (
-                    user_id, order_id, amount, currency, type, status, payment_method, payment_details
-                ) VALUES ($1, $2, $3, 'USD', 'refund', 'completed', 'dodo', $4)
-                """,
-                row["user_id"],
-                f"refund_{order_id}",
-                -refund_amount,
-                json.dumps({
-                    "original_order_id": order_id,
-                    "refunded_at": datetime.utcnow().isoformat()
-                })
-            )
-            logger.info(f"↩ Refund succeeded for order {order_id} - User {row['user_id']} - ${refund_amount}")
+        logger.info(f"↩ Refund succeeded for order {order_id} - User {row['user_id']} - ${refund_amount}")
 
 
 async def _handle_refund_failed(order_id: str, reason: str = "unknown") -> None:
@@ -668,44 +778,70 @@ async def _verify_webhook_signature(payload: bytes, headers: Dict[str, str]) ->
         return False
 
 
-async def _check_webhook_idempotency(webhook_id: str, event_type: str) -> bool:
-    """
-    Check if webhook has already been processed.
-    Returns True if this is a new webhook, False if already processed.
+class _RecentWebhookIds:
+    """Bounded LRU of webhook ids already handled by this process.
+
+    Lets the retry storms Dodo sends after an outage be answered without a
+    database round trip. Ids are only added once their handling committed.
     """
+
+    def __init__(self, capacity: int) -> None:
+        self.capacity = capacity
+        self.ids: "OrderedDict[str, None]" = OrderedDict()
+
+    def seen(self, webhook_id: str) -> bool:
+        if webhook_id in self.ids:
+            self.ids.move_to_end(webhook_id)
+            return True
+        return False
+
+    def add(self, webhook_id: str) -> None:
+        self.ids[webhook_id] = None
+        self.ids.move_to_end(webhook_id)
+        while len(self.ids) > self.capacity:
+            self.ids.popitem(last=False)
+
+
+_recent_webhooks = _RecentWebhookIds(WEBHOOK_RECENT_IDS)
+
+
+async def _ensure_processed_webhooks_index() -> None:
+    # _claim_webhook names this index's columns as its conflict target, so if
+    # the index is missing claims fail loudly instead of admitting duplicates
     async with app.state.pool.acquire() as conn:  # type: ignore[attr-defined]
-        # Check if webhook_id already exists
-        existing = await conn.fetchval(
+        await conn.execute(
+            """
+            CREATE UNIQUE INDEX IF NOT EXISTS processed_webhooks_provider_webhook_id_key
+            ON processed_webhooks (provider, webhook_id)
             """
-            SELECT 1 FROM processed_webhooks 
-            WHERE webhook_id = $1 AND provider = 'dodo'
-            """,
-            webhook_id
         )
-        
-        if existing:
-            logger.warning(f"⚠ Duplicate webhook detected: {webhook_id}")
-            return False
-        
-        # Store webhook_id to prevent reprocessing
-        try:
-            await conn.execute(
-                """
-                INSERT INTO processed_webhooks (webhook_id, provider, event_type, processed_at)
-                VALUES ($1, 'dodo', $2, NOW())
-                """,
-                webhook_id,
-                event_type
-            )
-        except Exception:
-            # Unique constraint violation - webhook already processed
-            logger.warning(f"⚠ Webhook {webhook_id} already processed (race condition)")
-            return False
-        
-        return True
 
 
-async def _handle_guest_payment_succeeded(public_token: str, amount: float) -> None:
+async def _claim_webhook(conn, webhook_id: str, event_type: Optional[str]) -> bool:
+    """
+    Atomically record the webhook as processed on ``conn``.
+    Returns True if this is a new webhook, False if already processed.
+    Run it inside the handler's transaction: if the handler fails the claim
+    rolls back with it and the event can be delivered again.
+    """
+    claimed = await conn.fetchval(
+        """
+        INSERT INTO processed_webhooks (webhook_id, provider, event_type, processed_at)
+        VALUES ($1, 'dodo', $2, NOW())
+        ON CONFLICT (provider, webhook_id) DO NOTHING
+        RETURNING 1
+        """,
+        webhook_id,
+        event_type
+    )
+    if not claimed:
+        logger.warning(f"⚠ Duplicate webhook detected: {webhook_id}")
+    return bool(claimed)
+
+
+async def _handle_guest_payment_succeeded(
+    conn, public_token: str, amount: float, after_commit: AfterCommit
+) -> None:
     """Handle successful payment for guest orders"""
     from routers.guest_actions import complete_guest_payment
     
@@ -717,7 +853,9 @@ async def _handle_guest_payment_succeeded(public_token: str, amount: float) -> N
             amount=amount,
             currency="USD",
             payload={"completed_at": datetime.utcnow().isoformat()},
-            is_final=True
+            is_final=True,
+            conn=conn,
+            after_commit=after_commit,
         )
         logger.info(f"✓ Guest payment succeeded: {public_token} - ${amount}")
     except Exception as exc:
@@ -725,6 +863,468 @@ async def _handle_guest_payment_succeeded(public_token: str, amount: float) -> N
         raise
 
 
+async def _dispatch_webhook_event(
+    conn,
+    event_type: Optional[str],
+    data: Dict[str, Any],
+    order_id: Optional[str],
+    public_token: Optional[str],
+    after_commit: AfterCommit,
+) -> Dict[str, Any]:
+    """Run the handler for one Dodo event on ``conn``. Raises if the handler fails."""
+    # Extract payment amount from webhook data (Dodo sends amounts in cents)
+    webhook_amount = float(data.get("amount", 0)) / 100.0 if data.get("amount") else None
+    
+    # Handle based on order type
+    is_guest_order = bool(public_token and not order_id)
+    
+    if event_type in ["payment.succeeded", "charge.succeeded"]:
+        if is_guest_order:
+            await _handle_guest_payment_succeeded(conn, public_token, webhook_amount or 0, after_commit)
+        elif order_id:
+            await _handle_payment_succeeded(conn, order_id, after_commit)
+        else:
+            logger.warning(f"⚠ Payment succeeded webhook without order_id or public_token")
+            return {"status": "received", "warning": "no_identifier"}
+        
+    elif event_type in ["payment.failed", "charge.failed"]:
+        if order_id:
+            reason = data.get("failure_reason") or data.get("error_message", "unknown")
+            await _handle_payment_failed(conn, order_id, reason)
+        else:
+            logger.info(f"ℹ Payment failed for guest order {public_token}")
+        
+    elif event_type in ["payment.cancelled", "charge.cancelled"]:
+        if order_id:
+            await _handle_payment_cancelled(conn, order_id)
+        else:
+            logger.info(f"ℹ Payment cancelled for guest order {public_token}")
+        
+    elif event_type == "payment.processing":
+        logger.info(f"ℹ Payment processing for order {order_id or public_token}")
+        
+    elif event_type == "refund.succeeded":
+        if order_id:
+            refund_amount = float(data.get("refund_amount", 0))
+            await _handle_refund_succeeded(conn, order_id, refund_amount)
+        
+    elif event_type == "refund.failed":
+        if order_id:
+            reason = data.get("failure_reason") or data.get("error_message", "unknown")
+            await _handle_refund_failed(order_id, reason)
+        
+    else:
+        logger.warning(f"⚠ Unhandled webhook event type: {event_type}")
+        return {"status": "received", "warning": "unhandled_event_type"}
+    
+    return {"status": "processed", "event_type": event_type}
+
+
+# Queue-backed ingestion: the endpoint only verifies and stores the event,
+# a worker pool drains dodo_webhook_events in per-order order.
+
+_webhook_events_table_ready = False
+
+
+async def _ensure_webhook_events_table() -> None:
+    global _webhook_events_table_ready
+    if _webhook_events_table_ready:
+        return
+    async with app.state.pool.acquire() as conn:  # type: ignore[attr-defined]
+        await conn.execute(
+            """
+            CREATE TABLE IF NOT EXISTS dodo_webhook_events (
+                event_id BIGSERIAL PRIMARY KEY,
+                webhook_id TEXT NOT NULL UNIQUE,
+                event_type TEXT,
+                order_key TEXT,
+                payload JSONB NOT NULL,
+                status TEXT NOT NULL DEFAULT 'pending',
+                attempts INTEGER NOT NULL DEFAULT 0,
+                next_attempt_at TIMESTAMPTZ NOT NULL DEFAULT NOW(),
+                locked_until TIMESTAMPTZ,
+                last_error TEXT,
+                received_at TIMESTAMPTZ NOT NULL DEFAULT NOW(),
+                processed_at TIMESTAMPTZ,
+                coalesced_into BIGINT
+            )
+            """
+        )
+        await conn.execute(
+            "ALTER TABLE dodo_webhook_events ADD COLUMN IF NOT EXISTS coalesced_into BIGINT"
+        )
+        await conn.execute(
+            """
+            CREATE INDEX IF NOT EXISTS dodo_webhook_events_open_idx
+            ON dodo_webhook_events (order_key, event_id) WHERE status IN ('pending', 'processing')
+            """
+        )
+    _webhook_events_table_ready = True
+
+
+async def _enqueue_webhook_event(
+    webhook_id: str,
+    event_type: Optional[str],
+    order_key: Optional[str],
+    payload: Dict[str, Any],
+) -> bool:
+    """Store the event durably. Returns False if this webhook_id was already received."""
+    await _ensure_webhook_events_table()
+    async with app.state.pool.acquire() as conn:  # type: ignore[attr-defined]
+        event_id = await conn.fetchval(
+            """
+            INSERT INTO dodo_webhook_events (webhook_id, event_type, order_key, payload, next_attempt_at)
+            VALUES ($1, $2, $3, $4, NOW() + make_interval(secs => $5))
+            ON CONFLICT (webhook_id) DO NOTHING
+            RETURNING event_id
+            """,
+            webhook_id,
+            event_type,
+            order_key,
+            json.dumps(payload),
+            float(getattr(app.state, "DODO_WEBHOOK_COALESCE_SECONDS", WEBHOOK_COALESCE_SECONDS)),
+        )
+    return event_id is not None
+
+
+# Payment lifecycle events that can be folded into one state transition,
+# ranked so that a later, weaker event never overrides a stronger one.
+_PAYMENT_STATE_RANK = {
+    "payment.processing": 0,
+    "payment.failed": 1,
+    "charge.failed": 1,
+    "payment.cancelled": 1,
+    "charge.cancelled": 1,
+    "payment.succeeded": 2,
+    "charge.succeeded": 2,
+}
+
+
+def _fold_payment_events(event_types: List[Optional[str]]) -> Tuple[int, int]:
+    """
+    Fold the leading run of payment lifecycle events for one order.
+    Returns ``(run_length, effective_index)``: the highest ranked event wins,
+    the latest one on ties, and the rest of the run is superseded by it.
+    """
+    run = 0
+    effective = 0
+    for index, event_type in enumerate(event_types):
+        rank = _PAYMENT_STATE_RANK.get(event_type or "")
+        if rank is None:
+            break
+        run = index + 1
+        if rank >= _PAYMENT_STATE_RANK[event_types[effective] or ""]:
+            effective = index
+    return run, effective
+
+
+class _WebhookEventWorker:
+    """
+    Drains ``dodo_webhook_events``.
+
+    Only the oldest open event of an order is ever claimable, so events for one
+    order are handled strictly in arrival order while different orders run in
+    parallel. New events wait ``WEBHOOK_COALESCE_SECONDS`` before becoming
+    claimable; when the head is a payment lifecycle event, the pending
+    lifecycle events queued behind it are folded into a single handler run
+    and kept as ``coalesced`` rows for audit. Claims carry a lease so events held by a crashed worker are
+    picked up again. Failures are retried with exponential backoff; after
+    ``WEBHOOK_MAX_ATTEMPTS`` the event is parked as ``dead`` (see
+    ``/webhook/dead-letters``) and later events for that order proceed.
+    """
+
+    def __init__(self) -> None:
+        self.wakeup = asyncio.Event()
+        self.running: set = set()
+        self.task: Optional[asyncio.Task] = None
+
+    async def claim(self, limit: int) -> list:
+        async with app.state.pool.acquire() as conn:  # type: ignore[attr-defined]
+            async with conn.transaction():
+                await conn.execute(
+                    """
+                    UPDATE dodo_webhook_events
+                    SET status = 'pending', locked_until = NULL
+                    WHERE status = 'processing' AND locked_until < NOW()
+                    """
+                )
+                return await conn.fetch(
+                    """
+                    UPDATE dodo_webhook_events
+                    SET status = 'processing',
+                        attempts = attempts + 1,
+                        locked_until = NOW() + make_interval(secs => $2)
+                    WHERE event_id IN (
+                        SELECT p.event_id FROM dodo_webhook_events p
+                        WHERE p.status = 'pending' AND p.next_attempt_at <= NOW()
+                          AND NOT EXISTS (
+                              SELECT 1 FROM dodo_webhook_events q
+                              WHERE q.order_key = p.order_key
+                                AND q.event_id < p.event_id
+                                AND q.status IN ('pending', 'processing')
+                          )
+                        ORDER BY p.event_id
+                        LIMIT $1
+                        FOR UPDATE SKIP LOCKED
+                    )
+                    RETURNING event_id, webhook_id, event_type, order_key, payload, attempts
+                    """,
+                    limit,
+                    WEBHOOK_LEASE_SECONDS,
+                )
+
+    async def process(self, event: Any) -> None:
+        event_id = int(event["event_id"])
+        event_type = event["event_type"]
+        after_commit: AfterCommit = []
+        try:
+            async with app.state.pool.acquire() as conn:  # type: ignore[attr-defined]
+                async with conn.transaction():
+                    batch = [event]
+                    if event["order_key"] and event_type in _PAYMENT_STATE_RANK:
+                        # Nothing else can claim these while the head is open
+                        batch += await conn.fetch(
+                            """
+                            SELECT event_id, webhook_id, event_type, payload
+                            FROM dodo_webhook_events
+                            WHERE order_key = $1 AND event_id > $2 AND status = 'pending'
+                            ORDER BY event_id
+                            FOR UPDATE
+                            """,
+                            event["order_key"],
+                            event_id,
+                        )
+                    run, effective = _fold_payment_events([row["event_type"] for row in batch])
+                    batch = batch[:max(run, 1)]
+                    chosen = batch[effective]
+                    payload = chosen["payload"]
+                    payload = json.loads(payload) if isinstance(payload, str) else payload
+                    data = payload.get("data", {})
+                    metadata = data.get("metadata", {})
+                    result = await _dispatch_webhook_event(
+                        conn,
+                        payload.get("event_type") or payload.get("type"),
+                        data,
+                        metadata.get("order_id"),
+                        metadata.get("public_token"),
+                        after_commit,
+                    )
+                    await conn.execute(
+                        """
+                        UPDATE dodo_webhook_events
+                        SET status = CASE WHEN event_id = $2 THEN 'done' ELSE 'coalesced' END,
+                            coalesced_into = CASE WHEN event_id = $2 THEN NULL ELSE $2 END,
+                            locked_until = NULL,
+                            last_error = CASE WHEN event_id = $2 THEN $3 END,
+                            processed_at = NOW()
+                        WHERE event_id = ANY($1::bigint[])
+                        """,
+                        [int(row["event_id"]) for row in batch],
+                        int(chosen["event_id"]),
+                        result.get("warning"),
+                    )
+            if len(batch) > 1:
+                logger.info(
+                    f"ℹ Coalesced {len(batch)} Dodo events for {event['order_key']} into {chosen['event_type']}"
+                )
+        except Exception as exc:
+            attempts = int(event["attempts"])
+            dead = attempts >= WEBHOOK_MAX_ATTEMPTS
+            delay = WEBHOOK_RETRY_BASE_SECONDS * (2 ** max(0, attempts - 1))
+            log = logger.error if dead else logger.warning
+            log(f"❌ Dodo webhook {event['webhook_id']} ({event_type}) attempt {attempts} failed: {exc}")
+            try:
+                async with app.state.pool.acquire() as conn:  # type: ignore[attr-defined]
+                    await conn.execute(
+                        """
+                        UPDATE dodo_webhook_events
+                        SET status = $2,
+                            next_attempt_at = NOW() + make_interval(secs => $3),
+                            locked_until = NULL,
+                            last_error = $4
+                        WHERE event_id = $1
+                        """,
+                        event_id,
+                        "dead" if dead else "pending",
+                        delay,
+                        str(exc),
+                    )
+            except Exception as db_exc:
+                # The lease expires on its own, so the event will be retried later
+                logger.error(f"Failed to record webhook event {event_id} failure: {db_exc}")
+            return
+        for callback in after_commit:
+            await callback()
+
+    async def run(self) -> None:
+        while True:
+            concurrency = int(getattr(app.state, "DODO_WEBHOOK_WORKERS", WEBHOOK_WORKERS))
+            try:
+                free = concurrency - len(self.running)
+                events = await self.claim(free) if free > 0 else []
+            except asyncio.CancelledError:
+                raise
+            except Exception as exc:
+                logger.error(f"Dodo webhook queue claim failed: {exc}")
+                events = []
+            for event in events:
+                task = asyncio.create_task(self.process(event))
+                self.running.add(task)
+                task.add_done_callback(self._done)
+            if events and len(self.running) < concurrency:
+                continue
+            self.wakeup.clear()
+            try:
+                await asyncio.wait_for(self.wakeup.wait(), timeout=WEBHOOK_POLL_SECONDS)
+            except asyncio.TimeoutError:
+                pass
+
+    def _done(self, task: asyncio.Task) -> None:
+        self.running.discard(task)
+        self.wakeup.set()
+
+    def start(self) -> None:
+        if self.task is None or self.task.done():
+            self.task = asyncio.create_task(self.run())
+
+    async def stop(self) -> None:
+        tasks = list(self.running)
+        if self.task is not None:
+            tasks.append(self.task)
+            self.task = None
+        for task in tasks:
+            task.cancel()
+        await asyncio.gather(*tasks, return_exceptions=True)
+
+
+_webhook_worker = _WebhookEventWorker()
+
+
+class _PendingWebhook:
+    __slots__ = ("webhook_id", "event_type", "data", "order_id", "public_token", "future")
+
+    def __init__(self, webhook_id: str, event_type: Optional[str], data: Dict[str, Any], order_id, public_token) -> None:
+        self.webhook_id = webhook_id
+        self.event_type = event_type
+        self.data = data
+        self.order_id = order_id
+        self.public_token = public_token
+        self.future: "asyncio.Future[Dict[str, Any]]" = asyncio.get_running_loop().create_future()
+
+
+class _InlinePaymentFolder:
+    """
+    Folds bursts of payment lifecycle webhooks per order when the queue is off.
+
+    The first lifecycle event for an order opens a ``WEBHOOK_COALESCE_SECONDS``
+    window that later deliveries for the same order join. When it closes,
+    every delivery is claimed and only the effective event (see
+    ``_fold_payment_events``) is handled, all in one transaction; each waiting
+    request then answers with that outcome. Nothing is acknowledged before the
+    commit, so a failure makes Dodo redeliver the whole burst. Windows are per
+    process, so deliveries spread over several workers fold per worker.
+    """
+
+    def __init__(self) -> None:
+        self.windows: Dict[str, List[_PendingWebhook]] = {}
+        self.tasks: set = set()
+
+    async def submit(self, order_key: str, pending: _PendingWebhook, delay: float) -> Dict[str, Any]:
+        window = self.windows.get(order_key)
+        if window is None:
+            window = self.windows[order_key] = []
+            task = asyncio.create_task(self._flush(order_key, window, delay))
+            self.tasks.add(task)
+            task.add_done_callback(self.tasks.discard)
+        window.append(pending)
+        # Shielded so a client hanging up does not cancel the outcome for the others
+        return await asyncio.shield(pending.future)
+
+    async def _flush(self, order_key: str, window: List[_PendingWebhook], delay: float) -> None:
+        try:
+            await asyncio.sleep(delay)
+            del self.windows[order_key]
+            await self._handle(order_key, window)
+        finally:
+            if self.windows.get(order_key) is window:
+                del self.windows[order_key]
+            # Failed or cancelled: nothing was committed, so every delivery is redelivered
+            for pending in window:
+                if not pending.future.done():
+                    pending.future.set_exception(HTTPException(status_code=500, detail="Webhook processing failed"))
+
+    async def _handle(self, order_key: str, window: List[_PendingWebhook]) -> None:
+        after_commit: AfterCommit = []
+        try:
+            async with app.state.pool.acquire() as conn:  # type: ignore[attr-defined]
+                async with conn.transaction():
+                    claimed = [
+                        pending for pending in window
+                        if await _claim_webhook(conn, pending.webhook_id, pending.event_type)
+                    ]
+                    chosen = None
+                    if claimed:
+                        _, effective = _fold_payment_events([pending.event_type for pending in claimed])
+                        chosen = claimed[effective]
+                        result = await _dispatch_webhook_event(
+                            conn,
+                            chosen.event_type,
+                            chosen.data,
+                            chosen.order_id,
+                            chosen.public_token,
+                            after_commit,
+                        )
+        except Exception as exc:
+            logger.error(f"❌ Error processing Dodo webhooks for {order_key}: {exc}")
+            return
+        if len(claimed) > 1:
+            logger.info(f"ℹ Coalesced {len(claimed)} Dodo events for {order_key} into {chosen.event_type}")
+        for pending in window:
+            _recent_webhooks.add(pending.webhook_id)
+        for pending in window:
+            if pending.future.done():
+                continue
+            if pending not in claimed:
+                outcome = {"status": "already_processed", "webhook_id": pending.webhook_id}
+            elif pending is chosen:
+                outcome = dict(result)
+                if outcome.get("status") == "processed":
+                    outcome["webhook_id"] = pending.webhook_id
+            else:
+                outcome = {
+                    "status": "coalesced",
+                    "event_type": pending.event_type,
+                    "webhook_id": pending.webhook_id,
+                    "coalesced_into": chosen.webhook_id,
+                }
+            pending.future.set_result(outcome)
+        for callback in after_commit:
+            await callback()
+
+
+_inline_payment_folder = _InlinePaymentFolder()
+
+
+@router.on_event("startup")
+async def _start_webhook_worker() -> None:
+    try:
+        await _ensure_processed_webhooks_index()
+    except Exception as exc:
+        logger.error(f"Could not index processed_webhooks: {exc}")
+    if not DodoSettings.webhook_queue_enabled():
+        return
+    try:
+        await _ensure_webhook_events_table()
+    except Exception as exc:
+        logger.error(f"Could not prepare dodo_webhook_events: {exc}")
+    _webhook_worker.start()
+
+
+@router.on_event("shutdown")
+async def _stop_webhook_worker() -> None:
+    await _webhook_worker.stop()
+
+
 @router.post("/webhook")
 async def dodo_webhook(request: Request):
     """
@@ -746,6 +1346,11 @@ async def dodo_webhook(request: Request):
     - webhook-id (or svix-id)
     - webhook-signature (or svix-signature)
     - webhook-timestamp (or svix-timestamp)
+    
+    When DODO_WEBHOOK_QUEUE is enabled the event is only stored and
+    acknowledged here; handlers run in the background webhook worker.
+    Otherwise payment lifecycle events for one order are folded in process
+    for DODO_WEBHOOK_COALESCE_SECONDS before being handled.
     """
     # Get raw body for signature verification
     raw_body = await request.body()
@@ -777,63 +1382,89 @@ async def dodo_webhook(request: Request):
     logger.info(f"📄 Webhook data: {json.dumps(data, indent=2)}")
     logger.info(f"📄 Webhook metadata: {json.dumps(metadata, indent=2)}")
     
-    # Check idempotency
-    if not await _check_webhook_idempotency(webhook_id, event_type):
-        logger.info(f"ℹ Webhook {webhook_id} already processed - returning success")
+    # Retries of recently handled events are answered from memory
+    if _recent_webhooks.seen(webhook_id):
+        logger.info(f"ℹ Webhook {webhook_id} already processed (cached) - returning success")
         return {"status": "already_processed", "webhook_id": webhook_id}
     
+    if DodoSettings.webhook_queue_enabled():
+        # The unique webhook_id on the queue table doubles as the idempotency check
+        if not await _enqueue_webhook_event(webhook_id, event_type, order_id or public_token, payload):
+            _recent_webhooks.add(webhook_id)
+            logger.info(f"ℹ Webhook {webhook_id} already received - returning success")
+            return {"status": "already_processed", "webhook_id": webhook_id}
+        _recent_webhooks.add(webhook_id)
+        _webhook_worker.wakeup.set()
+        return {"status": "queued", "event_type": event_type, "webhook_id": webhook_id}
+    
+    order_key = order_id or public_token
+    coalesce_seconds = float(getattr(app.state, "DODO_WEBHOOK_COALESCE_SECONDS", WEBHOOK_COALESCE_SECONDS))
+    if order_key and event_type in _PAYMENT_STATE_RANK and coalesce_seconds > 0:
+        return await _inline_payment_folder.submit(
+            order_key,
+            _PendingWebhook(webhook_id, event_type, data, order_id, public_token),
+            coalesce_seconds,
+        )
+    
+    after_commit: AfterCommit = []
     try:
-        # Extract payment amount from webhook data (Dodo sends amounts in cents)
-        webhook_amount = float(data.get("amount", 0)) / 100.0 if data.get("amount") else None
-        
-        # Handle based on order type
-        is_guest_order = bool(public_token and not order_id)
-        
-        if event_type in ["payment.succeeded", "charge.succeeded"]:
-            if is_guest_order:
-                await _handle_guest_payment_succeeded(public_token, webhook_amount or 0)
-            elif order_id:
-                await _handle_payment_succeeded(order_id)
-            else:
-                logger.warning(f"⚠ Payment succeeded webhook without order_id or public_token")
-                return {"status": "received", "warning": "no_identifier"}
-            
-        elif event_type in ["payment.failed", "charge.failed"]:
-            if order_id:
-                reason = data.get("failure_reason") or data.get("error_message", "unknown")
-                await _handle_payment_failed(order_id, reason)
-            else:
-                logger.info(f"ℹ Payment failed for guest order {public_token}")
-            
-        elif event_type in ["payment.cancelled", "charge.cancelled"]:
-            if order_id:
-                await _handle_payment_cancelled(order_id)
-            else:
-                logger.info(f"ℹ Payment cancelled for guest order {public_token}")
-            
-        elif event_type == "payment.processing":
-            logger.info(f"ℹ Payment processing for order {order_id or public_token}")
-            
-        elif event_type == "refund.succeeded":
-            if order_id:
-                refund_amount = float(data.get("refund_amount", 0))
-                await _handle_refund_succeeded(order_id, refund_amount)
-            
-        elif event_type == "refund.failed":
-            if order_id:
-                reason = data.get("failure_reason") or data.get("error_message", "unknown")
-                await _handle_refund_failed(order_id, reason)
-            
-        else:
-            logger.warning(f"⚠ Unhandled webhook event type: {event_type}")
-            return {"status": "received", "warning": "unhandled_event_type"}
-        
-        return {"status": "processed", "event_type": event_type, "webhook_id": webhook_id}
-        
+        async with app.state.pool.acquire() as conn:  # type: ignore[attr-defined]
+            async with conn.transaction():
+                # Claim idempotency and apply the effects atomically
+                if not await _claim_webhook(conn, webhook_id, event_type):
+                    _recent_webhooks.add(webhook_id)
+                    logger.info(f"ℹ Webhook {webhook_id} already processed - returning success")
+                    return {"status": "already_processed", "webhook_id": webhook_id}
+                result = await _dispatch_webhook_event(
+                    conn, event_type, data, order_id, public_token, after_commit
+                )
     except HTTPException:
         raise
     except Exception as exc:
         logger.error(f"❌ Error processing Dodo webhook {event_type}: {exc}")
-        # Return 200 to prevent webhook retries for application errors
-        return {"status": "error", "message": str(exc), "webhook_id": webhook_id}
+        # Nothing was committed, including the idempotency claim, so let Dodo redeliver
+        raise HTTPException(status_code=500, detail="Webhook processing failed")
+    
+    _recent_webhooks.add(webhook_id)
+    for callback in after_commit:
+        await callback()
+    if result.get("status") == "processed":
+        result["webhook_id"] = webhook_id
+    return result
+
 
+@router.get("/webhook/dead-letters")
+async def list_dead_webhook_events(
+    limit: int = 100,
+    auth: UserAuth = Depends(get_user_data_verify),
+):
+    """Dodo events that exhausted their retries (admin only)."""
+    async with app.state.pool.acquire() as conn:  # type: ignore[attr-defined]
+        role = await conn.fetchval("SELECT role_custom FROM users WHERE user_id = $1", auth.user_id)
+        if role != "admin":
+            raise HTTPException(status_code=403, detail="Admin access required")
+        rows = await conn.fetch(
+            """
+            SELECT event_id, webhook_id, event_type, order_key, attempts, last_error, received_at, payload
+            FROM dodo_webhook_events
+            WHERE status = 'dead'
+            ORDER BY event_id DESC
+            LIMIT $1
+            """,
+            max(1, min(limit, 1000)),
+        )
+    return {
+        "events": [
+            {
+                "event_id": int(row["event_id"]),
+                "webhook_id": row["webhook_id"],
+                "event_type": row["event_type"],
+                "order_key": row["order_key"],
+                "attempts": int(row["attempts"]),
+                "last_error": row["last_error"],
+                "received_at": row["received_at"].isoformat() if row["received_at"] else None,
+                "payload": json.loads(row["payload"]) if isinstance(row["payload"], str) else row["payload"],
+            }
+            for row in rows
+        ]
+    }
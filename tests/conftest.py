@@ -0,0 +1,86 @@
+"""Load the router modules at the repo root the way the backend imports them.
+
+``guest_actions.py``, ``payments_dodo.py`` and ``payment_http.py`` live in the
+backend's ``routers`` package and import its siblings (``dependencies``,
+``routers.smm_panel``, ``routers.auth``, ...). Only those three files are in
+this tree, so the ``routers`` package is pointed at the repo root and any
+backend module that cannot be imported is registered as a minimal stand-in.
+Inside the full backend the real modules are found first and nothing is
+replaced. Third-party packages (fastapi, pydantic, httpx) are not replaced:
+without them the tests skip via ``pytest.importorskip``.
+"""
+
+import importlib.util
+import sys
+import types
+from pathlib import Path
+
+REPO_ROOT = Path(__file__).resolve().parent.parent
+
+
+def _missing(name: str) -> bool:
+    if name in sys.modules:
+        return False
+    try:
+        return importlib.util.find_spec(name) is None
+    except ModuleNotFoundError:
+        return True
+
+
+def _register(name: str, **attrs) -> None:
+    module = types.ModuleType(name)
+    module.__dict__.update(attrs)
+    sys.modules[name] = module
+    parent, _, child = name.rpartition(".")
+    if parent:
+        setattr(sys.modules[parent], child, module)
+
+
+def _backend_only(name: str):
+    def unavailable(*args, **kwargs):
+        raise NotImplementedError(f"{name} is part of the backend and not available in this tree")
+
+    unavailable.__name__ = name.rpartition(".")[2]
+    return unavailable
+
+
+def _install_backend_stand_ins() -> None:
+    if importlib.util.find_spec("fastapi") is None:
+        return
+    from fastapi import FastAPI
+    from pydantic import BaseModel
+
+    if _missing("routers"):
+        package = types.ModuleType("routers")
+        package.__path__ = [str(REPO_ROOT)]
+        sys.modules["routers"] = package
+    if _missing("dependencies"):
+        _register("dependencies", app=FastAPI())
+    if _missing("routers.smm_panel"):
+        _register(
+            "routers.smm_panel",
+            _load_services_settings=_backend_only("routers.smm_panel._load_services_settings"),
+            _build_exception_index=_backend_only("routers.smm_panel._build_exception_index"),
+            _compute_price=_backend_only("routers.smm_panel._compute_price"),
+        )
+    if _missing("routers.auth"):
+
+        class UserAuth(BaseModel):
+            user_id: int = 0
+
+        _register("routers.auth", UserAuth=UserAuth, get_user_data_verify=_backend_only("routers.auth.get_user_data_verify"))
+    if _missing("routers.affiliate"):
+        _register(
+            "routers.affiliate",
+            process_affiliate_deposit_commission=_backend_only("routers.affiliate.process_affiliate_deposit_commission"),
+        )
+    if _missing("services"):
+        _register("services")
+    if _missing("services.promotions"):
+        _register(
+            "services.promotions",
+            evaluate_deposit_promotion=_backend_only("services.promotions.evaluate_deposit_promotion"),
+        )
+
+
+_install_backend_stand_ins()
@@ -0,0 +1,127 @@
+import asyncio
+import json
+
+import pytest
+
+pytest.importorskip("fastapi")
+payments_dodo = pytest.importorskip("routers.payments_dodo")
+
+
+class _FakeConn:
+    def __init__(self, processed):
+        self.processed = processed
+
+    def transaction(self):
+        class _Transaction:
+            async def __aenter__(self):
+                return None
+
+            async def __aexit__(self, *exc):
+                return False
+
+        return _Transaction()
+
+    async def fetchval(self, query, webhook_id, event_type):
+        # processed_webhooks claim: ON CONFLICT (provider, webhook_id) DO NOTHING RETURNING 1
+        if webhook_id in self.processed:
+            return None
+        self.processed.add(webhook_id)
+        return 1
+
+
+class _FakePool:
+    def __init__(self):
+        self.processed = {"wh-old"}
+
+    def acquire(self):
+        pool = self
+
+        class _Acquire:
+            async def __aenter__(self):
+                return _FakeConn(pool.processed)
+
+            async def __aexit__(self, *exc):
+                return False
+
+        return _Acquire()
+
+
+def _request(webhook_id, event_type, order_id="order-1"):
+    body = json.dumps({"type": event_type, "data": {"metadata": {"order_id": order_id}}}).encode()
+    scope = {
+        "type": "http",
+        "method": "POST",
+        "path": "/api/payments/dodo/webhook",
+        "headers": [(b"webhook-id", webhook_id.encode())],
+        "query_string": b"",
+    }
+
+    async def receive():
+        return {"type": "http.request", "body": body, "more_body": False}
+
+    return payments_dodo.Request(scope, receive)
+
+
+@pytest.fixture
+def inline_mode(monkeypatch):
+    async def verified(payload, headers):
+        return True
+
+    monkeypatch.setattr(payments_dodo, "_verify_webhook_signature", verified)
+    monkeypatch.setattr(payments_dodo, "_recent_webhooks", payments_dodo._RecentWebhookIds(100))
+    monkeypatch.setattr(payments_dodo, "_inline_payment_folder", payments_dodo._InlinePaymentFolder())
+    monkeypatch.setattr(payments_dodo.app.state, "pool", _FakePool(), raising=False)
+    monkeypatch.setattr(payments_dodo.app.state, "DODO_WEBHOOK_QUEUE", "false", raising=False)
+    monkeypatch.setattr(payments_dodo.app.state, "DODO_WEBHOOK_COALESCE_SECONDS", 0.05, raising=False)
+    dispatched = []
+
+    async def dispatch(conn, event_type, data, order_id, public_token, after_commit):
+        dispatched.append((event_type, order_id))
+        if event_type == "payment.failed" and order_id == "order-broken":
+            raise RuntimeError("database went away")
+        return {"status": "processed", "event_type": event_type}
+
+    monkeypatch.setattr(payments_dodo, "_dispatch_webhook_event", dispatch)
+    return dispatched
+
+
+def test_inline_burst_for_one_order_runs_one_handler(inline_mode):
+    deliveries = [
+        ("wh-1", "payment.processing"),
+        ("wh-2", "payment.succeeded"),
+        ("wh-3", "payment.failed"),
+        ("wh-2", "payment.succeeded"),
+        ("wh-old", "payment.processing"),
+    ]
+
+    async def scenario():
+        return await asyncio.gather(
+            *(payments_dodo.dodo_webhook(_request(webhook_id, event_type)) for webhook_id, event_type in deliveries)
+        )
+
+    results = asyncio.run(scenario())
+
+    assert inline_mode == [("payment.succeeded", "order-1")]
+    assert [result["status"] for result in results] == [
+        "coalesced",
+        "processed",
+        "coalesced",
+        "already_processed",
+        "already_processed",
+    ]
+    assert results[0]["coalesced_into"] == "wh-2" and results[1]["webhook_id"] == "wh-2"
+
+
+def test_inline_fold_failure_fails_every_delivery_so_they_are_redelivered(inline_mode):
+    async def scenario():
+        return await asyncio.gather(
+            payments_dodo.dodo_webhook(_request("wh-a", "payment.failed", "order-broken")),
+            payments_dodo.dodo_webhook(_request("wh-b", "payment.processing", "order-broken")),
+            return_exceptions=True,
+        )
+
+    results = asyncio.run(scenario())
+
+    assert [getattr(result, "status_code", None) for result in results] == [500, 500]
+    assert not payments_dodo._inline_payment_folder.windows
+    assert not payments_dodo._recent_webhooks.seen("wh-a")
@@ -0,0 +1,123 @@
+import asyncio
+import json
+import uuid
+from types import SimpleNamespace
+
+import pytest
+
+pytest.importorskip("fastapi")
+guest_actions = pytest.importorskip("routers.guest_actions")
+
+TOKEN = uuid.UUID("3a0c4f7e-8d2b-4b61-9f0e-1c2d3e4f5a6b")
+
+
+class _FakeConn:
+    def __init__(self):
+        self.committed = False
+        self.statements = []
+        self.evicted_before_commit = None
+
+    def transaction(self):
+        conn = self
+
+        class _Transaction:
+            async def __aenter__(self):
+                return None
+
+            async def __aexit__(self, *exc):
+                conn.committed = exc[0] is None
+                return False
+
+        return _Transaction()
+
+    async def execute(self, query, *args):
+        self.statements.append((query, args))
+
+    async def fetchval(self, query, *args):
+        self.statements.append((query, args))
+        self.evicted_before_commit = str(TOKEN) not in guest_actions._status_cache.entries
+        return TOKEN
+
+    async def fetch(self, query, *args):
+        self.statements.append((query, args))
+        return []
+
+
+class _FakePool:
+    def __init__(self, conn):
+        self.conn = conn
+
+    def acquire(self):
+        pool = self
+
+        class _Acquire:
+            async def __aenter__(self):
+                return pool.conn
+
+            async def __aexit__(self, *exc):
+                return False
+
+        return _Acquire()
+
+
+@pytest.fixture
+def conn(monkeypatch):
+    conn = _FakeConn()
+    monkeypatch.setattr(guest_actions.app.state, "pool", _FakePool(conn), raising=False)
+    monkeypatch.setattr(guest_actions, "_status_cache", guest_actions._StatusCache())
+    return conn
+
+
+def test_completed_job_notifies_and_evicts_status_after_commit(conn):
+    guest_actions._status_cache.put(str(TOKEN), '"stale"', b"{}")
+    quote = guest_actions.GuestQuoteResponse(amount=10.0, currency="EUR", items=[], order_type="single")
+
+    asyncio.run(
+        guest_actions._finalize_guest_checkout(
+            7, "stripe", quote, "cs_123", {"payment_url": "https://pay.test/cs_123"}, complete_job=True
+        )
+    )
+
+    query, args = conn.statements[-1]
+    assert "pg_notify" in query
+    assert args[:2] == (7, guest_actions.GUEST_STATUS_CHANNEL)
+    assert json.loads(args[2]) == {"status": "ready", "payment_url": "https://pay.test/cs_123", "order_reference": "cs_123"}
+    assert conn.committed
+    assert conn.evicted_before_commit is False
+    assert str(TOKEN) not in guest_actions._status_cache.entries
+
+
+def test_job_lease_follows_app_state_override(conn, monkeypatch):
+    monkeypatch.setattr(guest_actions.app.state, "CHECKOUT_JOB_LEASE_SECONDS", 15.0, raising=False)
+
+    asyncio.run(guest_actions._CheckoutJobWorker().claim(4))
+
+    assert conn.statements[-1][1] == (4, 15.0)
+
+
+def test_status_stream_emits_when_payment_link_becomes_ready(monkeypatch):
+    monkeypatch.setattr(guest_actions, "_status_hub", guest_actions._StatusHub())
+    guest_actions._status_hub.listening = True
+    snapshot = {
+        "public_token": str(TOKEN),
+        "payment_state": "pending",
+        "order_state": "pending",
+        "updated_at": None,
+        "payment_link": {"status": "awaiting_payment_link"},
+    }
+    ready = {**snapshot, "payment_link": {"status": "ready", "payment_url": "https://pay.test", "order_reference": "r"}}
+    paid = {"public_token": str(TOKEN), "payment_state": "completed", "order_state": "pending", "updated_at": None}
+
+    async def scenario():
+        queue = asyncio.Queue()
+        for event in (ready, ready, paid):
+            queue.put_nowait(event)
+        disconnects = iter([False, False, False, True])
+        request = SimpleNamespace(is_disconnected=lambda: asyncio.sleep(0, next(disconnects)))
+        return [chunk async for chunk in guest_actions._status_events(request, str(TOKEN), queue, snapshot)]
+
+    chunks = asyncio.run(scenario())
+    events = [json.loads(chunk.split("data: ", 1)[1]) for chunk in chunks if chunk.startswith("event: status")]
+
+    assert [event.get("payment_link", {}).get("status") for event in events] == ["awaiting_payment_link", "ready", None]
+    assert events[-1]["payment_state"] == "completed"
@@ -0,0 +1,112 @@
+import asyncio
+import json
+
+import pytest
+
+pytest.importorskip("fastapi")
+guest_actions = pytest.importorskip("routers.guest_actions")
+
+
+class _FakePool:
+    def acquire(self):
+        class _Acquire:
+            async def __aenter__(self):
+                return object()
+
+            async def __aexit__(self, *exc):
+                return False
+
+        return _Acquire()
+
+
+async def _price_all(conn, items, pricing):
+    return [
+        guest_actions.GuestQuoteLine(label=item.service_id, quantity=item.quantity, unit_price=0.01, total=item.quantity * 0.01)
+        for item in items
+    ]
+
+
+def _line(service_id, quantity=100):
+    return json.dumps({"service_id": service_id, "quantity": quantity, "target_url": "https://example.com/p"})
+
+
+async def _serve(parts, price_items, monkeypatch, complete=True):
+    """Run the endpoint's ASGI response against a server that delivers the body in parts."""
+    monkeypatch.setattr(guest_actions.app.state, "pool", _FakePool(), raising=False)
+    monkeypatch.setattr(guest_actions, "_price_mass_items", price_items)
+
+    async def load_pricing():
+        return {}
+
+    monkeypatch.setattr(guest_actions, "_load_pricing", load_pricing)
+    messages = [
+        {"type": "http.request", "body": part, "more_body": not complete or index < len(parts) - 1}
+        for index, part in enumerate(parts)
+    ]
+    sent = []
+    first_record_before_body_end = []
+
+    async def receive():
+        if not messages:
+            return {"type": "http.disconnect"}
+        # Yield so a concurrent reader would get the chance to steal this message
+        await asyncio.sleep(0)
+        return messages.pop(0)
+
+    async def send(message):
+        if message["type"] == "http.response.body" and message["body"] and not first_record_before_body_end:
+            first_record_before_body_end.append(bool(messages))
+        sent.append(message)
+
+    scope = {"type": "http", "method": "POST", "path": "/quote/mass/stream", "headers": [], "query_string": b""}
+    request = guest_actions.Request(scope, receive)
+    response = await guest_actions.guest_quote_mass_stream(request, "EUR")
+    await response(scope, receive, send)
+    body = b"".join(message.get("body", b"") for message in sent if message["type"] == "http.response.body")
+    records = [json.loads(line) for line in body.decode().splitlines()]
+    return records, any(first_record_before_body_end)
+
+
+def test_lines_are_answered_while_the_body_is_still_arriving(monkeypatch):
+    monkeypatch.setattr(guest_actions, "MASS_STREAM_BATCH_SIZE", 2)
+    body = "\n".join(_line(str(number)) for number in range(1, 7)) + "\n"
+    # Split mid-line to exercise reassembly across body messages
+    parts = [body[index:index + 40].encode() for index in range(0, len(body), 40)]
+
+    records, answered_early = asyncio.run(_serve(parts, _price_all, monkeypatch))
+
+    assert answered_early
+    assert [record["line"] for record in records[:-1]] == [1, 2, 3, 4, 5, 6]
+    assert records[-1]["summary"] and records[-1]["priced"] == 6 and records[-1]["amount"] == 6.0
+
+
+def test_flag_refresh_failure_is_reported_inline_and_summary_is_sent(monkeypatch):
+    async def failing_price(conn, items, pricing):
+        raise guest_actions.HTTPException(status_code=503, detail="Service availability check failed")
+
+    body = _line("1") + "\n" + _line("2")
+    records, _ = asyncio.run(_serve([body[:10].encode(), body[10:].encode(), b"\nnot json\n"], failing_price, monkeypatch))
+
+    assert records[0]["line"] == 3 and "error" in records[0]
+    assert [record["error"] for record in records[1:3]] == ["Service availability check failed"] * 2
+    assert records[-1] == {
+        "summary": True,
+        "amount": 0.0,
+        "currency": "EUR",
+        "order_type": "mass",
+        "lines": 3,
+        "priced": 0,
+        "errors": 3,
+    }
+
+
+def test_client_disconnect_mid_upload_ends_the_stream_quietly(monkeypatch):
+    # Every part claims more body is coming, so the receive() after the last reports the disconnect
+    parts = [(_line("1") + "\n").encode(), _line("2")[:15].encode()]
+
+    async def price(conn, items, pricing):
+        raise AssertionError("nothing should be priced after a disconnect")
+
+    records, _ = asyncio.run(_serve(parts, price, monkeypatch, complete=False))
+
+    assert records == []
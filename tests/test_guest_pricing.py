@@ -0,0 +1,132 @@
+import random
+import time
+from collections import OrderedDict
+
+import pytest
+
+pytest.importorskip("fastapi")
+guest_actions = pytest.importorskip("routers.guest_actions")
+
+
+def _stub_compute_price(key, provider_rate, overrides, multiplier, groups_by_key, min_price_per_1k, min_price_excluded):
+    if key in overrides:
+        return float(overrides[key])
+    price = provider_rate * groups_by_key.get(key, multiplier)
+    if key not in min_price_excluded:
+        price = max(price, min_price_per_1k)
+    return price
+
+
+def _pricing_context():
+    return {
+        "version": "test",
+        "multiplier": 1.35,
+        "overrides": {"1:7": 0.9, "2:11": 4.2},
+        "groups_by_key": {"1:3": 2.0, "3:5": 1.1},
+        "min_price_per_1k": 0.25,
+        "min_price_excluded": ["1:3"],
+        "price_memo": OrderedDict(),
+    }
+
+
+def _services(count, seed=7):
+    rng = random.Random(seed)
+    return [
+        {
+            "service_id": str(rng.randint(1, count // 4 or 1)),
+            "panel_id": rng.choice([None, 1, 2, 3]),
+            "rate": rng.choice([None, 0.0, round(rng.uniform(0.01, 25.0), 4)]),
+        }
+        for _ in range(count)
+    ]
+
+
+def _scalar_price(service, pricing):
+    key = f"{service.get('panel_id') or 0}:{service.get('service_id')}"
+    return round(
+        float(
+            _stub_compute_price(
+                key,
+                float(service.get("rate") or 0.0),
+                pricing["overrides"],
+                pricing["multiplier"],
+                pricing["groups_by_key"],
+                pricing["min_price_per_1k"],
+                pricing["min_price_excluded"],
+            )
+        ),
+        6,
+    )
+
+
+def test_batch_prices_match_scalar_path(monkeypatch):
+    monkeypatch.setattr(guest_actions, "_compute_price", _stub_compute_price)
+    services = _services(5_000)
+    pricing = _pricing_context()
+
+    expected = [_scalar_price(service, pricing) for service in services]
+
+    assert guest_actions._compute_unit_prices(services, pricing) == expected
+    # Second pass is served from the context's price table
+    assert guest_actions._compute_unit_prices(services, pricing) == expected
+    assert [guest_actions._compute_unit_price(service, pricing) for service in services[:200]] == expected[:200]
+
+
+def test_price_table_evicts_least_recently_used(monkeypatch):
+    monkeypatch.setattr(guest_actions, "_compute_price", _stub_compute_price)
+    monkeypatch.setattr(guest_actions.app.state, "PRICE_MEMO_MAX_ENTRIES", 3, raising=False)
+    pricing = _pricing_context()
+
+    guest_actions.price_batch(["0:1", "0:2", "0:3"], [1.0, 2.0, 3.0], pricing)
+    guest_actions.price_batch(["0:1", "0:4"], [1.0, 4.0], pricing)
+
+    assert list(pricing["price_memo"]) == [("0:3", 3.0), ("0:1", 1.0), ("0:4", 4.0)]
+
+
+def test_batch_pricing_100k_services_evaluates_each_pair_once(monkeypatch):
+    calls = []
+
+    def counting_compute_price(key, provider_rate, *rules):
+        calls.append((key, provider_rate))
+        return _stub_compute_price(key, provider_rate, *rules)
+
+    monkeypatch.setattr(guest_actions, "_compute_price", counting_compute_price)
+    services = _services(100_000)
+    keys = [f"{service.get('panel_id') or 0}:{service.get('service_id')}" for service in services]
+    rates = [float(service.get("rate") or 0.0) for service in services]
+    pricing = _pricing_context()
+
+    cold = guest_actions.price_batch(keys, rates, pricing)
+    distinct = len(set(zip(keys, rates)))
+    assert len(calls) == distinct < len(services)
+
+    warm = guest_actions.price_batch(keys, rates, pricing)
+    assert len(calls) == distinct
+    assert warm == cold == [_scalar_price(service, pricing) for service in services]
+
+
+def test_warm_batch_pricing_beats_cold_pricing(monkeypatch):
+    monkeypatch.setattr(guest_actions, "_compute_price", _stub_compute_price)
+    services = _services(100_000)
+    keys = [f"{service.get('panel_id') or 0}:{service.get('service_id')}" for service in services]
+    rates = [float(service.get("rate") or 0.0) for service in services]
+
+    def best_of(runs, measure):
+        return min(measure() for _ in range(runs))
+
+    def cold_seconds():
+        pricing = _pricing_context()
+        started = time.perf_counter()
+        guest_actions.price_batch(keys, rates, pricing)
+        return time.perf_counter() - started
+
+    warm_pricing = _pricing_context()
+    guest_actions.price_batch(keys, rates, warm_pricing)
+
+    def warm_seconds():
+        started = time.perf_counter()
+        guest_actions.price_batch(keys, rates, warm_pricing)
+        return time.perf_counter() - started
+
+    # Measured around 2.4x with this cheap stub rule; real rules make the table worth more
+    assert best_of(3, warm_seconds) * 1.5 < best_of(3, cold_seconds)
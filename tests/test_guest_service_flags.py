@@ -0,0 +1,90 @@
+import asyncio
+from datetime import datetime, timedelta, timezone
+
+import pytest
+
+pytest.importorskip("fastapi")
+guest_actions = pytest.importorskip("routers.guest_actions")
+
+
+class _FlagConn:
+    def __init__(self, rows):
+        self.rows = rows
+        self.fetches = 0
+
+    async def fetch(self, query):
+        self.fetches += 1
+        if self.rows is None:
+            raise OSError("database unavailable")
+        return list(self.rows)
+
+
+class _FakePool:
+    def __init__(self, conn):
+        self.conn = conn
+
+    def acquire(self):
+        pool = self
+
+        class _Acquire:
+            async def __aenter__(self):
+                return pool.conn
+
+            async def __aexit__(self, *exc):
+                return False
+
+        return _Acquire()
+
+
+def test_quotes_do_not_scan_flags_once_loaded():
+    index = guest_actions._ServiceFlagIndex()
+    past = datetime.now(timezone.utc) - timedelta(minutes=1)
+    loaded = _FlagConn(
+        [
+            {"panel_id": 2, "service_id": "9", "flagged_until": None},
+            {"panel_id": None, "service_id": "4", "flagged_until": past},
+        ]
+    )
+
+    async def scenario():
+        await index.ensure_loaded(loaded)
+        # A later quote never pays for a reload, even with the database down
+        await index.ensure_loaded(_FlagConn(None))
+
+    asyncio.run(scenario())
+    assert loaded.fetches == 1
+    assert index.is_flagged(2, "9")
+    assert not index.is_flagged(0, "4")
+
+
+def test_quote_is_refused_without_any_snapshot():
+    index = guest_actions._ServiceFlagIndex()
+    with pytest.raises(guest_actions.HTTPException) as excinfo:
+        asyncio.run(index.ensure_loaded(_FlagConn(None)))
+    assert excinfo.value.status_code == 503
+
+
+def test_background_refresh_reloads_on_invalidate(monkeypatch):
+    index = guest_actions._ServiceFlagIndex()
+    conn = _FlagConn([])
+    monkeypatch.setattr(guest_actions.app.state, "pool", _FakePool(conn), raising=False)
+    monkeypatch.setattr(guest_actions.app.state, "FLAG_REFRESH_SECONDS", 3600.0, raising=False)
+
+    async def scenario():
+        task = asyncio.create_task(index.run())
+        try:
+            while not index.loaded:
+                await asyncio.sleep(0)
+            conn.rows = [{"panel_id": 1, "service_id": "7", "flagged_until": None}]
+            index.invalidate()
+            for _ in range(100):
+                if index.is_flagged(1, "7"):
+                    break
+                await asyncio.sleep(0)
+        finally:
+            task.cancel()
+            await asyncio.gather(task, return_exceptions=True)
+
+    asyncio.run(scenario())
+    assert conn.fetches == 2
+    assert index.is_flagged(1, "7")
@@ -0,0 +1,161 @@
+import asyncio
+import json
+import uuid
+from datetime import datetime, timezone
+from types import SimpleNamespace
+
+import pytest
+
+pytest.importorskip("fastapi")
+guest_actions = pytest.importorskip("routers.guest_actions")
+
+KNOWN_TOKEN = uuid.UUID("6f1c2a7e-2b4c-4c1e-9a51-0d3f6b8e4a10")
+UNKNOWN_TOKEN = "0b9e8c55-7a3d-4f61-8c2b-5e4d3a2f1b00"
+
+
+def _order_row(token: uuid.UUID):
+    created = datetime(2026, 1, 2, 3, 4, 5, tzinfo=timezone.utc)
+    return {
+        "guest_order_id": 42,
+        "public_token": token,
+        "service_payload": json.dumps({"order_type": "single"}),
+        "payment_method": "stripe",
+        "payment_state": "completed",
+        "order_state": "pending",
+        "payment_reference": "cs_test",
+        "total_amount": 12.5,
+        "currency": "EUR",
+        "created_at": created,
+        "updated_at": created,
+        "link_status": None,
+        "link_result": None,
+        "link_error": None,
+        "link_updated_at": None,
+        "receipt_count": 1,
+        "receipts": json.dumps(
+            [
+                {
+                    "provider": "stripe",
+                    "provider_reference": "cs_test",
+                    "status": "completed",
+                    "amount": 12.5,
+                    "currency": "EUR",
+                    "created_at": created.isoformat(),
+                }
+            ]
+        ),
+    }
+
+
+class _FakeConn:
+    def __init__(self, rows):
+        self.rows = {row["public_token"]: row for row in rows}
+        self.queries = []
+
+    async def fetchrow(self, query, token):
+        self.queries.append((query, token))
+        return self.rows.get(uuid.UUID(str(token)))
+
+    async def fetch(self, query, tokens):
+        self.queries.append((query, tokens))
+        return [self.rows[token] for token in tokens if token in self.rows]
+
+
+class _FakePool:
+    def __init__(self, conn):
+        self.conn = conn
+
+    def acquire(self):
+        pool = self
+
+        class _Acquire:
+            async def __aenter__(self):
+                return pool.conn
+
+            async def __aexit__(self, *exc):
+                return False
+
+        return _Acquire()
+
+
+@pytest.fixture
+def conn(monkeypatch):
+    conn = _FakeConn([_order_row(KNOWN_TOKEN)])
+    monkeypatch.setattr(guest_actions.app.state, "pool", _FakePool(conn), raising=False)
+    monkeypatch.setattr(guest_actions, "_status_cache", guest_actions._StatusCache())
+    return conn
+
+
+def test_single_status_serializes_uuid_token(conn):
+    request = SimpleNamespace(headers={})
+    response = asyncio.run(guest_actions.guest_status(str(KNOWN_TOKEN), request))
+
+    body = json.loads(response.body)
+    assert body["public_token"] == str(KNOWN_TOKEN)
+    assert body["payment_state"] == "completed"
+    assert body["receipts"][0]["provider_reference"] == "cs_test"
+    assert response.headers["ETag"]
+
+    # A repeat poll with the ETag is answered from the cache without a query
+    etagged = SimpleNamespace(headers={"if-none-match": response.headers["ETag"]})
+    assert asyncio.run(guest_actions.guest_status(str(KNOWN_TOKEN), etagged)).status_code == 304
+    assert len(conn.queries) == 1
+
+
+def test_single_status_caches_under_canonical_token(conn):
+    request = SimpleNamespace(headers={})
+    response = asyncio.run(guest_actions.guest_status(KNOWN_TOKEN.hex.upper(), request))
+
+    assert json.loads(response.body)["public_token"] == str(KNOWN_TOKEN)
+    assert conn.queries[0][1] == str(KNOWN_TOKEN)
+    assert list(guest_actions._status_cache.entries) == [str(KNOWN_TOKEN)]
+    # Payment completion evicts by the database's uuid text, which must hit the same entry
+    guest_actions._status_cache.invalidate(str(KNOWN_TOKEN))
+    assert not guest_actions._status_cache.entries
+
+
+def test_single_status_rejects_malformed_token_with_404(conn):
+    with pytest.raises(guest_actions.HTTPException) as excinfo:
+        asyncio.run(guest_actions.guest_status("not-a-token", SimpleNamespace(headers={})))
+    assert excinfo.value.status_code == 404
+    assert not conn.queries
+
+
+def test_bulk_status_binds_uuid_tokens_and_reports_missing(conn):
+    request = guest_actions.GuestStatusBatchRequest(
+        public_tokens=[str(KNOWN_TOKEN), "not-a-token", UNKNOWN_TOKEN, str(KNOWN_TOKEN)],
+        include_service_payload=False,
+    )
+    result = asyncio.run(guest_actions.guest_status_batch(request))
+
+    query, bound = conn.queries[0]
+    assert "::uuid[]" in query
+    assert bound == [KNOWN_TOKEN, uuid.UUID(UNKNOWN_TOKEN)]
+    assert [order["public_token"] for order in result["orders"]] == [str(KNOWN_TOKEN)]
+    assert "service_payload" not in result["orders"][0]
+    assert result["missing"] == ["not-a-token", UNKNOWN_TOKEN]
+    json.dumps(result)
+
+
+def test_status_stream_subscribes_under_canonical_token(conn, monkeypatch):
+    hub = guest_actions._StatusHub()
+    monkeypatch.setattr(guest_actions, "_status_hub", hub)
+
+    response = asyncio.run(guest_actions.guest_status_events(KNOWN_TOKEN.hex.upper(), SimpleNamespace()))
+
+    assert response.media_type == "text/event-stream"
+    assert list(hub.subscribers) == [str(KNOWN_TOKEN)]
+    assert conn.queries[0][1] == str(KNOWN_TOKEN)
+    # The notification for this order reaches the stream's queue
+    hub._on_notify(None, 0, guest_actions.GUEST_STATUS_CHANNEL, json.dumps({"public_token": str(KNOWN_TOKEN)}))
+    assert next(iter(hub.subscribers[str(KNOWN_TOKEN)])).qsize() == 1
+
+
+def test_status_stream_rejects_malformed_token_without_subscribing(conn, monkeypatch):
+    hub = guest_actions._StatusHub()
+    monkeypatch.setattr(guest_actions, "_status_hub", hub)
+
+    with pytest.raises(guest_actions.HTTPException) as excinfo:
+        asyncio.run(guest_actions.guest_status_events("not-a-token", SimpleNamespace()))
+    assert excinfo.value.status_code == 404
+    assert hub.count == 0 and not conn.queries
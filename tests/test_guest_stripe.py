@@ -0,0 +1,59 @@
+import asyncio
+import time
+from concurrent.futures import ThreadPoolExecutor
+from types import SimpleNamespace
+
+import pytest
+
+pytest.importorskip("fastapi")
+guest_actions = pytest.importorskip("routers.guest_actions")
+
+STRIPE_LATENCY_SECONDS = 0.2
+MAX_LOOP_LAG_SECONDS = 0.05
+
+
+def _blocking_session_create(**params):
+    time.sleep(STRIPE_LATENCY_SECONDS)
+    return {"url": "https://checkout.stripe.test/session", "id": f"cs_{params['metadata']['guest_token']}"}
+
+
+async def _probe_loop_lag(stop: asyncio.Event, interval: float = 0.005) -> float:
+    loop = asyncio.get_running_loop()
+    worst = 0.0
+    while not stop.is_set():
+        started = loop.time()
+        await asyncio.sleep(interval)
+        worst = max(worst, loop.time() - started - interval)
+    return worst
+
+
+def test_concurrent_stripe_checkouts_do_not_block_the_event_loop(monkeypatch):
+    fake_stripe = SimpleNamespace(checkout=SimpleNamespace(Session=SimpleNamespace(create=_blocking_session_create)))
+    monkeypatch.setattr(guest_actions, "stripe", fake_stripe)
+    monkeypatch.setattr(guest_actions, "_stripe_api_key", "sk_test")
+    executor = ThreadPoolExecutor(max_workers=8)
+    monkeypatch.setattr(guest_actions, "_stripe_executor", executor)
+
+    async def scenario():
+        stop = asyncio.Event()
+        probe = asyncio.create_task(_probe_loop_lag(stop))
+        started = time.monotonic()
+        results = await asyncio.gather(
+            *(
+                guest_actions._create_stripe_checkout(10.0, "usd", f"token{i}", None, None)
+                for i in range(6)
+            )
+        )
+        elapsed = time.monotonic() - started
+        stop.set()
+        return results, elapsed, await probe
+
+    try:
+        results, elapsed, worst_lag = asyncio.run(scenario())
+    finally:
+        executor.shutdown(wait=True)
+
+    assert [result["session_id"] for result in results] == [f"cs_token{i}" for i in range(6)]
+    # Run serially on the loop this would take 6 x latency and stall the probe for each call
+    assert elapsed < 3 * STRIPE_LATENCY_SECONDS
+    assert worst_lag < MAX_LOOP_LAG_SECONDS
@@ -0,0 +1,38 @@
+import asyncio
+
+import pytest
+
+pytest.importorskip("httpx")
+payment_http = pytest.importorskip("routers.payment_http")
+
+
+def test_shared_clients_stay_open_until_the_last_router_closes(monkeypatch):
+    clients = payment_http.ProviderClients()
+    health = payment_http.ProviderHealthMonitor()
+
+    async def idle_probes():
+        await asyncio.Event().wait()
+
+    monkeypatch.setattr(health, "_run", idle_probes)
+    monkeypatch.setattr(payment_http, "provider_clients", clients)
+    monkeypatch.setattr(payment_http, "provider_health", health)
+    monkeypatch.setattr(payment_http, "_provider_http_users", 0)
+
+    async def scenario():
+        payment_http.open_provider_http({"dodo": ("https://dodo.test", "/health")})
+        payment_http.open_provider_http(
+            {"paypal": ("https://paypal.test", "/"), "dodo": ("https://dodo.test", "/health")}
+        )
+        dodo = clients.get("dodo", "https://dodo.test")
+        assert len(clients.clients) == 2
+        assert set(health.targets) == {"dodo", "paypal"}
+
+        await payment_http.close_provider_http()
+        assert not dodo.is_closed
+        assert health.task is not None and not health.task.done()
+
+        await payment_http.close_provider_http()
+        assert dodo.is_closed
+        assert health.task is None and not clients.clients
+
+    asyncio.run(scenario())